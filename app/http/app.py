@@ -32,5 +32,9 @@ app = Http(__name__,
 
 celery = app.extensions["celery"]
 
+# 预加载模式下应用构建完成后再执行fork前的预热
+if app.config.get("PRELOAD_APP"):
+    app.preload()
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -40,8 +40,70 @@ class Config:
             "result_backend": f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/{int(_get_env('CELERY_RESULT_BACKEND_DB'))}",
             "task_ignore_result": _get_bool_env("CELERY_TASK_IGNORE_RESULT"),
             "result_expires": int(_get_env("CELERY_RESULT_EXPIRES")),
-            "broker_connection_retry_on_startup": _get_bool_env("CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP")
+            "broker_connection_retry_on_startup": _get_bool_env("CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP"),
+            "beat_schedule": {
+                "resume-stalled-documents": {
+                    "task": "internal.task.document_task.resume_stalled_documents",
+                    "schedule": int(_get_env("INDEXING_SWEEP_INTERVAL")),
+                },
+                "sync-search-vectors": {
+                    "task": "internal.task.dataset_task.sync_search_vectors",
+                    "schedule": int(_get_env("INDEXING_SWEEP_INTERVAL")),
+                },
+            },
         }
 
         # 辅助Agent应用id
-        self.ASSISTANT_AGENT_ID = _get_env("ASSISTANT_AGENT_ID")
\ No newline at end of file
+        self.ASSISTANT_AGENT_ID = _get_env("ASSISTANT_AGENT_ID")
+
+        # 配置知识库向量化
+        self.EMBEDDING_BATCH_SIZE = int(_get_env("EMBEDDING_BATCH_SIZE"))
+        self.EMBEDDING_MIN_BATCH_SIZE = int(_get_env("EMBEDDING_MIN_BATCH_SIZE"))
+        self.EMBEDDING_MAX_BATCH_SIZE = int(_get_env("EMBEDDING_MAX_BATCH_SIZE"))
+        self.EMBEDDING_STORE_TARGET_LATENCY = float(_get_env("EMBEDDING_STORE_TARGET_LATENCY"))
+        self.EMBEDDING_CACHE_EXPIRE = int(_get_env("EMBEDDING_CACHE_EXPIRE"))
+
+
+        # 配置知识库文档构建流水线
+        self.INDEXING_QUEUE_SIZE = int(_get_env("INDEXING_QUEUE_SIZE"))
+        self.INDEXING_PARSE_CONCURRENCY = int(_get_env("INDEXING_PARSE_CONCURRENCY"))
+        self.INDEXING_SPLIT_CONCURRENCY = int(_get_env("INDEXING_SPLIT_CONCURRENCY"))
+        self.INDEXING_INDEX_CONCURRENCY = int(_get_env("INDEXING_INDEX_CONCURRENCY"))
+        self.INDEXING_STORE_CONCURRENCY = int(_get_env("INDEXING_STORE_CONCURRENCY"))
+        self.INDEXING_STREAMING_FILE_SIZE = int(_get_env("INDEXING_STREAMING_FILE_SIZE"))
+        self.INDEXING_STREAMING_WINDOW_SIZE = int(_get_env("INDEXING_STREAMING_WINDOW_SIZE"))
+        self.INDEXING_STREAMING_CONCURRENCY = int(_get_env("INDEXING_STREAMING_CONCURRENCY"))
+        self.INDEXING_STALLED_TIMEOUT = int(_get_env("INDEXING_STALLED_TIMEOUT"))
+
+        # 配置关键词倒排记录进程内缓存
+        self.KEYWORD_TABLE_CACHE_MAX_POSTINGS = int(_get_env("KEYWORD_TABLE_CACHE_MAX_POSTINGS"))
+
+        # 配置关键词提取进程池
+        self.JIEBA_WORKER_COUNT = int(_get_env("JIEBA_WORKER_COUNT"))
+        self.JIEBA_BATCH_MIN_SIZE = int(_get_env("JIEBA_BATCH_MIN_SIZE"))
+        self.JIEBA_CACHE_FILE = _get_env("JIEBA_CACHE_FILE")
+        self.PRELOAD_APP = _get_bool_env("PRELOAD_APP")
+
+        # 配置query向量缓存
+        self.QUERY_EMBEDDING_CACHE_MAX_SIZE = int(_get_env("QUERY_EMBEDDING_CACHE_MAX_SIZE"))
+        self.QUERY_EMBEDDING_CACHE_EXPIRE = int(_get_env("QUERY_EMBEDDING_CACHE_EXPIRE"))
+
+        # 配置文档启用状态的生效方式
+        self.DOCUMENT_ENABLED_MODE = _get_env("DOCUMENT_ENABLED_MODE")
+        self.DISABLED_DOCUMENTS_CACHE_EXPIRE = int(_get_env("DISABLED_DOCUMENTS_CACHE_EXPIRE"))
+
+        # 配置全文检索后端
+        self.FULL_TEXT_RETRIEVAL_BACKEND = _get_env("FULL_TEXT_RETRIEVAL_BACKEND")
+        self.FULL_TEXT_MAX_CANDIDATES = int(_get_env("FULL_TEXT_MAX_CANDIDATES"))
+
+        # 配置混合检索
+        self.HYBRID_SEMANTIC_RETRIEVAL_TIMEOUT = float(_get_env("HYBRID_SEMANTIC_RETRIEVAL_TIMEOUT"))
+        self.HYBRID_FULL_TEXT_RETRIEVAL_TIMEOUT = float(_get_env("HYBRID_FULL_TEXT_RETRIEVAL_TIMEOUT"))
+
+        # 配置检索结果缓存
+        self.RETRIEVAL_CACHE_EXPIRE = int(_get_env("RETRIEVAL_CACHE_EXPIRE"))
+
+        # 配置向量数据库后端
+        self.VECTOR_DATABASE_BACKEND = _get_env("VECTOR_DATABASE_BACKEND")
+        self.VECTOR_DATABASE_LOCAL_PATH = _get_env("VECTOR_DATABASE_LOCAL_PATH")
+        self.VECTOR_DATABASE_LOCAL_MAX_RECORDS = int(_get_env("VECTOR_DATABASE_LOCAL_MAX_RECORDS"))
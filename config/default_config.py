@@ -28,4 +28,68 @@ DEFAULT_CONFIG = {
 
     # 辅助Agent智能体应用id
     "ASSISTANT_AGENT_ID": "eb74137a-06b6-4f4d-8c40-d10621b55666",
+
+    # 知识库向量化配置
+    "EMBEDDING_BATCH_SIZE": 256,
+    "EMBEDDING_MIN_BATCH_SIZE": 32,
+    "EMBEDDING_MAX_BATCH_SIZE": 1024,
+    "EMBEDDING_STORE_TARGET_LATENCY": 5,
+    "EMBEDDING_CACHE_EXPIRE": 7 * 24 * 3600,
+
+    # 知识库文档构建流水线配置
+    "INDEXING_QUEUE_SIZE": 2,
+    "INDEXING_PARSE_CONCURRENCY": 2,
+    "INDEXING_SPLIT_CONCURRENCY": 1,
+    "INDEXING_INDEX_CONCURRENCY": 1,
+    "INDEXING_STORE_CONCURRENCY": 1,
+    "INDEXING_STREAMING_FILE_SIZE": 50 * 1024 * 1024,
+    "INDEXING_STREAMING_WINDOW_SIZE": 100,
+    "INDEXING_STREAMING_CONCURRENCY": 2,
+    "INDEXING_STALLED_TIMEOUT": 1800,
+    "INDEXING_SWEEP_INTERVAL": 300,
+
+    # 关键词倒排记录进程内缓存配置, 上限为缓存的倒排记录总条数
+    "KEYWORD_TABLE_CACHE_MAX_POSTINGS": 1000000,
+
+    # 关键词提取进程池配置, 进程数为0时不启用进程池, 批量提取的文本数达到阈值才会分发到进程池
+    "JIEBA_WORKER_COUNT": 2,
+    "JIEBA_BATCH_MIN_SIZE": 64,
+
+    # jieba序列化词典缓存文件路径, 为空时使用jieba默认的临时目录
+    "JIEBA_CACHE_FILE": "",
+
+    # 是否在fork工作进程前预加载应用(gunicorn --preload或celery prefork), 开启后构建应用时预热jieba并冻结GC
+    "PRELOAD_APP": "False",
+
+    # query向量缓存配置, 进程内缓存上限为缓存的向量条数, redis缓存过期时间单位为秒
+    "QUERY_EMBEDDING_CACHE_MAX_SIZE": 10000,
+    "QUERY_EMBEDDING_CACHE_EXPIRE": 7 * 24 * 3600,
+
+    # 文档启用状态的生效方式, stored为写入向量与关键词表, exclusion为检索时排除缓存的禁用文档集合,
+    # exclusion下向量中的document_enabled不再维护, 切换回stored前需要重新同步文档启用状态
+    "DOCUMENT_ENABLED_MODE": "stored",
+    "DISABLED_DOCUMENTS_CACHE_EXPIRE": 3600,
+
+    # 全文检索后端, keyword_table为关键词倒排表+BM25, postgres为片段tsvector+GIN索引
+    "FULL_TEXT_RETRIEVAL_BACKEND": "keyword_table",
+
+    # 关键词全文检索单次最多交由数据库过滤启用状态的候选片段数
+    "FULL_TEXT_MAX_CANDIDATES": 1000,
+
+    # 混合检索中向量检索器与全文检索器各自的超时时间, 单位为秒, 超时的检索器结果会被丢弃,
+    # 全文检索器的数据库查询同时使用该时间作为语句超时时间
+    "HYBRID_SEMANTIC_RETRIEVAL_TIMEOUT": 5,
+    "HYBRID_FULL_TEXT_RETRIEVAL_TIMEOUT": 5,
+
+    # 检索结果缓存的过期时间, 单位为秒, 为0时不缓存检索结果
+    "RETRIEVAL_CACHE_EXPIRE": 600,
+
+    # 向量数据库后端, weaviate为Weaviate云服务, local为本地磁盘上的嵌入式向量库
+    "VECTOR_DATABASE_BACKEND": "weaviate",
+
+    # 本地向量库的存储目录, 为空时使用项目目录下的storage/vector_database
+    "VECTOR_DATABASE_LOCAL_PATH": "",
+
+    # 本地向量库单个知识库的最大记录数, 本地向量库没有近似近邻索引, 每次检索都会扫描知识库的全部向量
+    "VECTOR_DATABASE_LOCAL_MAX_RECORDS": 200000,
 }
\ No newline at end of file
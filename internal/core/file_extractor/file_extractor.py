@@ -1,7 +1,7 @@
 import os
 import tempfile
 from pathlib import Path
-from typing import Union
+from typing import Union, Iterator
 import requests
 from injector import inject
 from dataclasses import dataclass
@@ -17,8 +17,11 @@ from langchain_community.document_loaders import (
     UnstructuredPowerPointLoader,
     UnstructuredXMLLoader,
     UnstructuredFileLoader,
-    TextLoader
+    TextLoader,
+    CSVLoader,
+    PyPDFLoader,
 )
+from langchain_core.document_loaders import BaseLoader
 
 @inject
 @dataclass
@@ -38,6 +41,13 @@ class FileExtractor:
             self.cos_service.download(upload_file.key, file_path)
             return self.load_from_file(file_path, return_text, is_unstructured)
 
+    def lazy_load(self, upload_file: UploadFile, is_unstructured: bool = True) -> Iterator[LCDocument]:
+        """流式加载传入的upload_file记录, 逐个返回LangChain文档, 适用于超大文件"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, os.path.basename(upload_file.key))
+            self.cos_service.download(upload_file.key, file_path)
+            yield from self.lazy_load_from_file(file_path, is_unstructured)
+
     @classmethod
     def load_from_url(cls, url: str, return_text: bool = False) -> Union[list[LCDocument], str]:
         """从传入的URL中去加载数据库, 返回LangChain文档列表或者字符串"""
@@ -58,6 +68,27 @@ class FileExtractor:
     ) -> Union[list[LCDocument], str]:
         """从本地文件中加载数据, 返回LangChain文档列表或字符串"""
         delimiter = "\n\n"
+        loader = cls._get_loader(file_path, is_unstructured)
+
+        return delimiter.join([document.page_content for document in loader.load()]) if return_text else loader.load()
+
+    @classmethod
+    def lazy_load_from_file(cls, file_path: str, is_unstructured: bool = True) -> Iterator[LCDocument]:
+        """从本地文件中流式加载数据, PDF按页、CSV按行逐个返回LangChain文档, 其余类型使用对应加载器的lazy_load"""
+        file_extension = Path(file_path).suffix.lower()
+
+        if file_extension == ".pdf":
+            loader = PyPDFLoader(file_path)
+        elif file_extension == ".csv":
+            loader = CSVLoader(file_path)
+        else:
+            loader = cls._get_loader(file_path, is_unstructured)
+
+        yield from loader.lazy_load()
+
+    @classmethod
+    def _get_loader(cls, file_path: str, is_unstructured: bool = True) -> BaseLoader:
+        """根据文件扩展名获取对应的文档加载器"""
         file_extension = Path(file_path).suffix.lower()
 
         if file_extension in [".xlsx", ".xls"]:
@@ -77,4 +108,4 @@ class FileExtractor:
         else:
             loader = UnstructuredFileLoader(file_path) if is_unstructured else TextLoader(file_path)
 
-        return delimiter.join([document.page_content for document in loader.load()]) if return_text else loader.load()
\ No newline at end of file
+        return loader
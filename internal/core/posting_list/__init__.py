@@ -0,0 +1,3 @@
+from .posting_list import PostingList
+
+__all__ = ["PostingList"]
@@ -0,0 +1,100 @@
+from typing import Optional
+
+import numpy as np
+
+# 压缩数组可选的整数宽度, 按数组最大值选取能容纳的最窄宽度
+ARRAY_DTYPES = [np.dtype("<u1"), np.dtype("<u2"), np.dtype("<u4"), np.dtype("<u8")]
+
+
+def _encode_array(values: np.ndarray, delta: bool = False) -> bytes:
+    """将非负整数数组压缩为字节串, 首字节为整数宽度, delta为True时存储相邻元素的差值(数组需升序)"""
+    if len(values) == 0:
+        return b""
+    if delta:
+        values = np.diff(values, prepend=0)
+    max_value = int(values.max())
+    dtype = next(dtype for dtype in ARRAY_DTYPES if max_value <= np.iinfo(dtype).max)
+    return bytes([dtype.itemsize]) + values.astype(dtype).tobytes()
+
+
+def _decode_array(data: Optional[bytes], delta: bool = False) -> np.ndarray:
+    """将压缩的字节串还原为int64数组"""
+    if not data:
+        return np.zeros(0, dtype=np.int64)
+    dtype = next(dtype for dtype in ARRAY_DTYPES if dtype.itemsize == data[0])
+    values = np.frombuffer(data, dtype=dtype, offset=1).astype(np.int64)
+    return np.cumsum(values) if delta else values
+
+
+class PostingList:
+    """关键词倒排列表, 以升序的片段序号数组存储命中的片段, 并按相同顺序记录词频与片段长度,
+    集合运算直接在数组上完成, 持久化时片段序号差分编码, 所有数组按最大值选取最窄的整数宽度"""
+    ordinals: np.ndarray
+    frequencies: np.ndarray
+    segment_lengths: np.ndarray
+
+    def __init__(
+            self,
+            ordinals: np.ndarray = None,
+            frequencies: np.ndarray = None,
+            segment_lengths: np.ndarray = None,
+    ):
+        """构造函数, 传递的片段序号需要升序且不重复"""
+        self.ordinals = np.zeros(0, dtype=np.int64) if ordinals is None else np.asarray(ordinals, dtype=np.int64)
+        self.frequencies = (
+            np.ones(len(self.ordinals), dtype=np.int64) if frequencies is None
+            else np.asarray(frequencies, dtype=np.int64)
+        )
+        self.segment_lengths = (
+            np.zeros(len(self.ordinals), dtype=np.int64) if segment_lengths is None
+            else np.asarray(segment_lengths, dtype=np.int64)
+        )
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    @classmethod
+    def from_bytes(cls, ordinals: bytes, frequencies: bytes, segment_lengths: bytes) -> "PostingList":
+        """从持久化的字节串还原倒排列表"""
+        return cls(
+            _decode_array(ordinals, delta=True),
+            _decode_array(frequencies),
+            _decode_array(segment_lengths),
+        )
+
+    def to_bytes(self) -> tuple[bytes, bytes, bytes]:
+        """将倒排列表压缩为(片段序号, 词频, 片段长度)三个字节串"""
+        return (
+            _encode_array(self.ordinals, delta=True),
+            _encode_array(self.frequencies),
+            _encode_array(self.segment_lengths),
+        )
+
+    def union(self, other: "PostingList") -> "PostingList":
+        """求并集, 两个倒排列表都命中的片段使用other中的词频与片段长度"""
+        if len(self) == 0:
+            return other
+        if len(other) == 0:
+            return self
+        ordinals, indexes = np.unique(np.concatenate((other.ordinals, self.ordinals)), return_index=True)
+        return PostingList(
+            ordinals,
+            np.concatenate((other.frequencies, self.frequencies))[indexes],
+            np.concatenate((other.segment_lengths, self.segment_lengths))[indexes],
+        )
+
+    def intersection(self, ordinals: np.ndarray) -> "PostingList":
+        """只保留传递的片段序号命中的记录"""
+        mask = np.isin(self.ordinals, ordinals, assume_unique=True)
+        return self._select(mask)
+
+    def difference(self, ordinals: np.ndarray) -> "PostingList":
+        """移除传递的片段序号命中的记录"""
+        mask = np.isin(self.ordinals, ordinals, assume_unique=True, invert=True)
+        return self._select(mask)
+
+    def _select(self, mask: np.ndarray) -> "PostingList":
+        """根据布尔掩码筛选记录, 全部保留时直接返回自身"""
+        if mask.all():
+            return self
+        return PostingList(self.ordinals[mask], self.frequencies[mask], self.segment_lengths[mask])
@@ -1,4 +1,6 @@
 from .semantic_retriever import SemanticRetriever
 from .full_text_retriever import FullTextRetriever
+from .postgres_full_text_retriever import PostgresFullTextRetriever
+from .hybrid_retriever import HybridRetriever
 
-__all__ = ["SemanticRetriever", "FullTextRetriever"]
\ No newline at end of file
+__all__ = ["SemanticRetriever", "FullTextRetriever", "PostgresFullTextRetriever", "HybridRetriever"]
\ No newline at end of file
@@ -1,20 +1,27 @@
 from typing import List
 from uuid import UUID
-from collections import Counter
+import numpy as np
+from flask import current_app
 from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document as LCDocument
 from langchain_core.retrievers import BaseRetriever
 from langchain_core.pydantic_v1 import Field
 from pkg.sqlalchemy import SQLAlchemy
-from internal.service import JiebaService
-from internal.model import KeywordTable, Segment, Document
+from internal.core.posting_list import PostingList
+from internal.service import JiebaService, KeywordTableService
+
+# BM25的词频饱和参数与片段长度归一化参数
+BM25_K1 = 1.5
+BM25_B = 0.75
 
 
 class FullTextRetriever(BaseRetriever):
-    """全文检索器"""
+    """全文检索器, 基于关键词倒排列表计算BM25得分"""
     db: SQLAlchemy
     dataset_ids: list[UUID]
     jieba_service: JiebaService
+    keyword_table_service: KeywordTableService
+    statement_timeout: float = 0
     search_kwargs: dict = Field(default_factory=dict)
 
     def _get_relevant_documents(
@@ -23,39 +30,32 @@ class FullTextRetriever(BaseRetriever):
         """根据传递的query执行关键词检索"""
         keywords = self.jieba_service.extract_keywords(query, 10)
 
-        keyword_tables = [
-            keyword_table for keyword_table, in self.db.session.query(KeywordTable).with_entities(KeywordTable.keyword_table).filter(
-            KeywordTable.dataset_id.in_(self.dataset_ids)
-        ).all()]
+        # 倒排列表与片段的查询超过语句超时时间时由数据库取消, 避免超时后仍占用连接
+        if self.statement_timeout > 0:
+            self.db.set_statement_timeout(self.statement_timeout)
 
-        all_ids = []
-        for keyword_table in keyword_tables:
-            for keyword, segment_ids in keyword_table.items():
-                if keyword in keywords:
-                    all_ids.extend(segment_ids)
+        # 1.只获取query关键词对应的倒排列表与知识库的片段数、分词总数, 优先命中进程内缓存
+        postings, segment_count, token_count = self.keyword_table_service.search_postings(self.dataset_ids, keywords)
 
-        if all_ids is None:
+        if not any(postings.values()):
             return []
 
-        id_counter = Counter(all_ids)
+        # 2.在候选片段上向量化计算BM25得分, 按得分排序后取前若干条候选
         k = self.search_kwargs.get("k", 4)
-        top_k_ids = id_counter.most_common(k)
-
-        segments = (self.db.session.query(Segment)
-                    .join(Document, Segment.document_id == Document.id)
-                    .filter(
-            Segment.id.in_([id for id, _ in top_k_ids]),
-            Segment.enabled==True,
-            Document.enabled==True
-        ).all())
+        segment_keys, scores = self._bm25_scores(list(postings.values()), segment_count, token_count)
+        max_candidates = max(k, current_app.config.get("FULL_TEXT_MAX_CANDIDATES"))
+        candidate_indexes = np.argsort(-scores, kind="stable")[:max_candidates]
+        dataset_ids = list(postings.keys())
+        candidates = [
+            (dataset_ids[int(segment_keys[index] >> 32)], int(segment_keys[index] & 0xFFFFFFFF))
+            for index in candidate_indexes
+        ]
 
-        if not segments:
-            return []
-
-        segment_dict = {
-            str(segment.id): segment for segment in segments
-        }
-        sorted_segments = [segment_dict[str(id)] for id,freq in top_k_ids if id in segment_dict]
+        # 3.在一条SQL中按得分顺序跳过未启用的片段/文档, 候选足够时总能返回k条
+        sorted_segments = [
+            (segment, float(scores[candidate_indexes[position]]))
+            for segment, position in self.keyword_table_service.get_enabled_segments_by_ordinals(candidates, k)
+        ]
 
         lc_documents = [LCDocument(
             page_content=segment.content,
@@ -67,8 +67,53 @@ class FullTextRetriever(BaseRetriever):
                 "node_id": str(segment.node_id),
                 "document_enabled": True,
                 "segment_enabled": True,
-                "score": 0,
+                "score": score,
             }
-        ) for segment in sorted_segments]
+        ) for segment, score in sorted_segments]
+
+        return lc_documents
+
+    @classmethod
+    def _bm25_scores(
+            cls,
+            postings: list[dict[str, PostingList]],
+            segment_count: int,
+            token_count: int,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """根据每个知识库的{关键词: 倒排列表}计算每个候选片段的BM25得分,
+        返回片段键数组(知识库下标左移32位后加上片段序号)与得分数组"""
+        keywords = sorted(set(keyword for dataset_postings in postings for keyword in dataset_postings.keys()))
+        keyword_positions = {keyword: i for i, keyword in enumerate(keywords)}
+        posting_lists = [
+            (dataset_index, keyword_positions[keyword], posting_list)
+            for dataset_index, dataset_postings in enumerate(postings)
+            for keyword, posting_list in dataset_postings.items()
+        ]
+
+        # 1.将所有倒排列表拼接为扁平数组, 片段键在多个知识库之间保持唯一
+        keyword_indexes = np.concatenate([
+            np.full(len(posting_list), keyword_index, dtype=np.int64) for _, keyword_index, posting_list in posting_lists
+        ])
+        segment_keys = np.concatenate([
+            (dataset_index << 32) + posting_list.ordinals for dataset_index, _, posting_list in posting_lists
+        ])
+        frequencies = np.concatenate([posting_list.frequencies for _, _, posting_list in posting_lists]).astype(np.float64)
+        segment_lengths = np.concatenate([
+            posting_list.segment_lengths for _, _, posting_list in posting_lists
+        ]).astype(np.float64)
+        unique_segment_keys, segment_indexes = np.unique(segment_keys, return_inverse=True)
+
+        # 2.文档频率为各知识库中关键词倒排列表的长度之和, 统计信息落后于倒排列表时使用候选集兜底
+        document_frequencies = np.bincount(keyword_indexes, minlength=len(keywords))
+        total = max(segment_count, len(unique_segment_keys))
+        average_length = token_count / segment_count if segment_count > 0 else segment_lengths.mean()
+        average_length = max(float(average_length), 1.0)
+        idf = np.log(1 + (total - document_frequencies + 0.5) / (document_frequencies + 0.5))
+
+        # 3.计算每条倒排记录的得分并按片段累加
+        posting_scores = idf[keyword_indexes] * frequencies * (BM25_K1 + 1) / (
+                frequencies + BM25_K1 * (1 - BM25_B + BM25_B * segment_lengths / average_length)
+        )
+        scores = np.bincount(segment_indexes, weights=posting_scores, minlength=len(unique_segment_keys))
 
-        return lc_documents
\ No newline at end of file
+        return unique_segment_keys, scores
@@ -0,0 +1,78 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Any, List
+
+from flask import Flask
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document as LCDocument
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.pydantic_v1 import Field
+
+# 倒数排名融合的平滑常数, 值越大排名靠后的文档与靠前文档的差距越小
+RRF_K = 60
+
+
+class HybridRetriever(BaseRetriever):
+    """混合检索器, 并发执行多个检索器并使用加权倒数排名融合(RRF)合并结果,
+    每个检索器有独立的超时时间, 单个检索器超时或异常时只使用其他检索器的结果, 整体耗时约等于最慢检索器的耗时而不是总和"""
+    flask_app: Any
+    retrievers: list[BaseRetriever]
+    weights: list[float] = Field(default_factory=list)
+    timeout: float = 10
+    timeouts: list[float] = Field(default_factory=list)
+    search_kwargs: dict = Field(default_factory=dict)
+
+    def _get_relevant_documents(
+            self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[LCDocument]:
+        """根据传递的query并发执行所有检索器, 融合排名后返回前k条文档"""
+        k = self.search_kwargs.get("k", 4)
+        weights = self.weights or [1 / len(self.retrievers)] * len(self.retrievers)
+        timeouts = self.timeouts or [self.timeout] * len(self.retrievers)
+
+        # 1.每个检索器在独立的线程与应用上下文中执行, 从同一时刻开始计算各自的超时时间,
+        # 超时的检索器不再等待, 检索器需要自行限制查询耗时(如数据库语句超时)以便线程尽快退出
+        executor = ThreadPoolExecutor(max_workers=len(self.retrievers))
+        try:
+            futures = [
+                executor.submit(self._invoke, self.flask_app, retriever, query)
+                for retriever in self.retrievers
+            ]
+            start = time.monotonic()
+            results = []
+            for retriever, future, timeout in zip(self.retrievers, futures, timeouts):
+                try:
+                    results.append(future.result(timeout=max(0.0, start + timeout - time.monotonic())))
+                except TimeoutError:
+                    logging.warning(f"混合检索中{retriever.__class__.__name__}超时, 将只使用其他检索器的结果")
+                    results.append([])
+                except Exception as e:
+                    logging.exception(f"混合检索中{retriever.__class__.__name__}出现异常, 错误信息: {str(e)}")
+                    results.append([])
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return self._reciprocal_rank_fusion(results, weights)[:k]
+
+    @classmethod
+    def _invoke(cls, flask_app: Flask, retriever: BaseRetriever, query: str) -> list[LCDocument]:
+        """在应用上下文中执行检索器, 检索器需要访问数据库会话与应用配置"""
+        with flask_app.app_context():
+            return retriever.invoke(query)
+
+    @classmethod
+    def _reciprocal_rank_fusion(cls, results: list[list[LCDocument]], weights: list[float]) -> list[LCDocument]:
+        """使用加权倒数排名融合合并多个检索器的结果, 同一片段只保留第一次出现的文档, 按融合得分降序返回"""
+        documents: dict[str, LCDocument] = {}
+        fused_scores: dict[str, float] = {}
+        for lc_documents, weight in zip(results, weights):
+            for rank, lc_document in enumerate(lc_documents):
+                segment_id = lc_document.metadata["segment_id"]
+                documents.setdefault(segment_id, lc_document)
+                fused_scores[segment_id] = fused_scores.get(segment_id, 0) + weight / (RRF_K + rank + 1)
+
+        return [
+            documents[segment_id]
+            for segment_id in sorted(fused_scores, key=lambda segment_id: fused_scores[segment_id], reverse=True)
+        ]
@@ -0,0 +1,58 @@
+from typing import List
+from uuid import UUID
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document as LCDocument
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.pydantic_v1 import Field
+from sqlalchemy import cast, func
+from sqlalchemy.dialects.postgresql import TSQUERY
+from pkg.sqlalchemy import SQLAlchemy
+from internal.service import JiebaService
+from internal.model import Segment, Document
+
+
+class PostgresFullTextRetriever(BaseRetriever):
+    """Postgres全文检索器, 在片段预先分词的tsvector上通过GIN索引匹配query分词, 并使用ts_rank排序"""
+    db: SQLAlchemy
+    dataset_ids: list[UUID]
+    jieba_service: JiebaService
+    statement_timeout: float = 0
+    search_kwargs: dict = Field(default_factory=dict)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[LCDocument]:
+        """根据传递的query执行全文检索"""
+        # 1.query分词与片段使用相同的规则, 直接构建为tsquery字面量, 任一分词命中即可召回
+        search_query = self.jieba_service.build_search_query(query)
+        if not search_query:
+            return []
+        ts_query = cast(search_query, TSQUERY)
+        score = func.ts_rank(Segment.search_vector, ts_query)
+
+        # 2.匹配、启用状态过滤、排序与截断在同一条SQL中完成, 超过语句超时时间的查询由数据库取消
+        if self.statement_timeout > 0:
+            self.db.set_statement_timeout(self.statement_timeout)
+        k = self.search_kwargs.get("k", 4)
+        segments = self.db.session.query(Segment, score).join(
+            Document, Segment.document_id == Document.id,
+        ).filter(
+            Segment.dataset_id.in_(self.dataset_ids),
+            Segment.search_vector.op("@@")(ts_query),
+            Segment.enabled == True,
+            Document.enabled == True,
+        ).order_by(score.desc()).limit(k).all()
+
+        return [LCDocument(
+            page_content=segment.content,
+            metadata={
+                "account_id": str(segment.account_id),
+                "dataset_id": str(segment.dataset_id),
+                "document_id": str(segment.document_id),
+                "segment_id": str(segment.id),
+                "node_id": str(segment.node_id),
+                "document_enabled": True,
+                "segment_enabled": True,
+                "score": float(score),
+            }
+        ) for segment, score in segments]
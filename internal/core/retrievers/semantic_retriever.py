@@ -1,36 +1,32 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
 from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document as LCDocument
 from langchain_core.retrievers import BaseRetriever
-from langchain_weaviate import WeaviateVectorStore
 from langchain_core.pydantic_v1 import Field
-from weaviate.classes.query import Filter
+from internal.service import VectorDatabaseService
 
 class SemanticRetriever(BaseRetriever):
     """相似性检索器/向量检索器"""
     dataset_ids: list[UUID]
-    vector_store: WeaviateVectorStore
+    vector_database_service: VectorDatabaseService
+    excluded_document_ids: Optional[list[str]] = None
     search_kwargs: dict = Field(default_factory=dict)
 
     def _get_relevant_documents(
             self, query: str, *, run_manager: CallbackManagerForRetrieverRun
     ) -> List[LCDocument]:
-        """根据传递的query执行相似性检索"""
+        """根据传递的query执行相似性检索, 知识库与启用状态的过滤由向量数据库后端执行,
+        传递了排除的文档id列表时按文档id排除禁用文档"""
         k = self.search_kwargs.pop("k", 4)
 
-        search_result = self.vector_store.similarity_search_with_relevance_scores(
+        search_result = self.vector_database_service.similarity_search(
             query=query,
+            dataset_ids=[str(dataset_id) for dataset_id in self.dataset_ids],
             k=k,
-            **{
-                "filters": Filter.all_of([
-                    Filter.by_property("dataset_id").contains_any([str(dataset_id) for dataset_id in self.dataset_ids]),
-                    Filter.by_property("document_enabled").equal(True),
-                    Filter.by_property("segment_enabled").equal(True),
-                ]),
-                **self.search_kwargs,
-            }
+            excluded_document_ids=self.excluded_document_ids,
+            **self.search_kwargs,
         )
 
         if search_result is None or len(search_result) == 0:
@@ -41,4 +37,3 @@ class SemanticRetriever(BaseRetriever):
             lc_document.metadata["score"] = score
 
         return list(lc_documents)
-
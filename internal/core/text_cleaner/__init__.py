@@ -0,0 +1,3 @@
+from .text_cleaner import TextCleaner
+
+__all__ = ["TextCleaner"]
@@ -0,0 +1,102 @@
+import re
+
+# 需要直接删除的控制字符与非法字符
+REMOVED_CHARACTERS = r"\x00-\x08\x0B\x0C\x0E-\x1F\x7F\xEF\xBF\xBE\uFFFE"
+
+# 空白字符(不含换行), `\f`属于控制字符, 会先被删除, 不参与连续空白的合并
+WHITESPACE_CHARACTERS = r"\t\r\x20\u00a0\u1680\u180e\u2000-\u200a\u202f\u205f\u3000"
+
+# 单个字符集形式的触发条件
+CHARACTER_SET_PATTERN = re.compile(r"\[[^\[\]]+\]")
+
+# 邮箱用户名允许的字符
+EMAIL_LOCAL_CHARACTERS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_.+-")
+
+# 完整的邮箱与控制字符正则, 用于判断URL路径在删除邮箱后是否还有剩余内容
+EMAIL_PATTERN = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
+REMOVED_CHARACTERS_PATTERN = re.compile(rf"[{REMOVED_CHARACTERS}]+")
+
+# 固定执行的清洗规则, 格式为(规则名, 正则, 替换内容, 触发条件), 防止文本中出现控制字符与特殊token
+# 触发条件为规则命中位置必须满足的前缀正则, 所有规则的触发条件会合并成合并正则的前瞻
+EXTRA_TEXT_RULES = [
+    ("remove_control_characters", rf"[{REMOVED_CHARACTERS}]+", "", rf"[{REMOVED_CHARACTERS}]"),
+    ("replace_special_token_start", r"<\|", "<", "[<]"),
+    ("replace_special_token_end", r"\|>", ">", r"[\|]"),
+]
+
+# 预处理规则id对应的清洗规则列表, 控制字符会被删除, 所以连续换行/空白之间允许夹杂控制字符
+PRE_PROCESS_RULES = {
+    "remove_extra_space": [
+        ("remove_extra_newline", rf"\n(?:[{REMOVED_CHARACTERS}]*\n){{2,}}", "\n\n", r"[\n]"),
+        (
+            "remove_extra_whitespace",
+            rf"[{WHITESPACE_CHARACTERS}](?:[{REMOVED_CHARACTERS}]*[{WHITESPACE_CHARACTERS}])+",
+            " ",
+            rf"[{WHITESPACE_CHARACTERS}][{REMOVED_CHARACTERS}{WHITESPACE_CHARACTERS}]",
+        ),
+    ],
+    "remove_url_and_email": [
+        # 邮箱的首字符几乎覆盖所有字母, 所以以`@`为锚点匹配域名, 命中后再向前回溯用户名
+        ("remove_email", r"(?<=[a-zA-Z0-9_.+-])@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", "", "[@]"),
+        # 控制字符会先被删除, 所以URL中间夹杂的控制字符(包括属于空白的\x0B、\x0C等)不会截断URL
+        ("remove_url", rf"https?://(?:[{REMOVED_CHARACTERS}]*[^\s{REMOVED_CHARACTERS}])+", "", r"https?:"),
+    ],
+}
+
+
+class TextCleaner:
+    """文本清洗器, 将预处理规则编译成一个合并正则, 单次扫描即可完成清洗"""
+    _pattern: re.Pattern
+    _replacements: dict[str, str]
+
+    def __init__(self, pre_process_rules: list[dict] = None):
+        """构造函数, 根据启用的预处理规则编译合并正则"""
+        rules = list(EXTRA_TEXT_RULES)
+        for pre_process_rule in pre_process_rules or []:
+            if pre_process_rule.get("enabled"):
+                rules.extend(PRE_PROCESS_RULES.get(pre_process_rule["id"], []))
+
+        # 1.每条规则对应一个命名分组, 匹配后根据分组名找到替换内容
+        self._replacements = {name: replacement for name, _, replacement, _ in rules}
+
+        # 2.将所有规则的触发条件合并为前瞻(单字符集触发条件合并为一个字符集), 快速跳过不可能命中任何规则的位置
+        characters = [trigger[1:-1] for _, _, _, trigger in rules if CHARACTER_SET_PATTERN.fullmatch(trigger)]
+        triggers = [trigger for _, _, _, trigger in rules if not CHARACTER_SET_PATTERN.fullmatch(trigger)]
+        self._pattern = re.compile(
+            "(?=" + "|".join([f"[{''.join(characters)}]", *triggers]) + ")(?:"
+            + "|".join(f"(?P<{name}>{pattern})" for name, pattern, _, _ in rules)
+            + ")"
+        )
+
+    def clean(self, text: str) -> str:
+        """清洗传递的文本, 使用合并正则单次扫描完成所有替换"""
+        parts = []
+        last = 0
+        position = 0
+        while (match := self._pattern.search(text, position)) is not None:
+            start, end = match.span()
+            name = match.lastgroup
+
+            # 1.邮箱只匹配了`@`及域名部分, 需要向前回溯用户名(不越过上一次替换的位置),
+            # 没有用户名时不是邮箱, 从`@`的下一个字符继续扫描, 避免跳过域名部分中的其他规则
+            if name == "remove_email":
+                while start > last and text[start - 1] in EMAIL_LOCAL_CHARACTERS:
+                    start -= 1
+                if start == match.start():
+                    position = start + 1
+                    continue
+
+            # 2.旧的清洗顺序先删除邮箱再删除URL, URL路径只由邮箱组成时删除邮箱后只剩下协议头, 协议头会被保留
+            replacement = self._replacements[name]
+            if name == "remove_url":
+                path_start = text.index("://", start) + 3
+                if not EMAIL_PATTERN.sub("", REMOVED_CHARACTERS_PATTERN.sub("", text[path_start:end])):
+                    replacement = text[start:path_start]
+
+            # 3.保留两次匹配之间的原始文本并追加替换内容
+            parts.append(text[last:start])
+            parts.append(replacement)
+            last = position = end
+
+        parts.append(text[last:])
+        return "".join(parts)
@@ -0,0 +1,3 @@
+from .token_offset_text_splitter import TokenOffsetTextSplitter
+
+__all__ = ["TokenOffsetTextSplitter"]
@@ -0,0 +1,192 @@
+import logging
+import re
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import accumulate
+from typing import Any, Callable, Optional
+
+import numpy as np
+import regex
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_text_splitters.character import _split_text_with_regex
+from tiktoken import Encoding
+
+
+@lru_cache(maxsize=None)
+def _get_token_character_tables(encoding: Encoding) -> tuple[np.ndarray, np.ndarray]:
+    """获取编码器每个token对应的字符数, 以及token是否以UTF-8续字节开头, 同一个编码器只会构建一次"""
+    character_counts = np.zeros(encoding.n_vocab, dtype=np.int64)
+    starts_with_continuation = np.zeros(encoding.n_vocab, dtype=np.int64)
+    for token in range(encoding.n_vocab):
+        try:
+            token_bytes = encoding.decode_single_token_bytes(token)
+        except KeyError:
+            continue
+        character_counts[token] = sum(1 for byte in token_bytes if not 0x80 <= byte < 0xC0)
+        starts_with_continuation[token] = int(0x80 <= token_bytes[0] < 0xC0) if token_bytes else 0
+    return character_counts, starts_with_continuation
+
+
+class TokenOffsetIndex:
+    """单个页面的token偏移索引, 整页只编码一次, 通过预分词边界与token偏移计算任意片段的token数"""
+    text: str
+    offsets: list[int]
+    boundaries: np.ndarray
+
+    def __init__(self, text: str, offsets: list[int], boundaries: np.ndarray):
+        self.text = text
+        self.offsets = offsets
+        self.boundaries = boundaries
+
+    @classmethod
+    def build(cls, text: str, encoding: Encoding, piece_pattern: regex.Pattern) -> Optional["TokenOffsetIndex"]:
+        """构建传递文本的token偏移索引, 无法保证与逐片段编码结果一致时返回None"""
+        # 1.包含特殊token的文本在编码时会抛出异常, 交由原始分割逻辑处理
+        if any(special_token in text for special_token in encoding.special_tokens_set):
+            return None
+
+        # 2.计算每个token在文本中的起始字符位置, 算法与Encoding.decode_with_offsets一致
+        tokens = np.array(encoding.encode_ordinary(text), dtype=np.int64)
+        character_counts, starts_with_continuation = _get_token_character_tables(encoding)
+        token_character_counts = character_counts[tokens]
+        ends = np.cumsum(token_character_counts)
+        if len(ends) > 0 and ends[-1] != len(text):
+            return None
+        offsets = np.maximum(0, ends - token_character_counts - starts_with_continuation[tokens])
+
+        # 3.计算预分词的边界, token不会跨越预分词边界, 两个边界之间的token数即为该片段单独编码的token数
+        piece_lengths = np.fromiter(map(len, piece_pattern.findall(text)), dtype=np.int64)
+        positions = np.concatenate(([0], np.cumsum(piece_lengths)))
+        if positions[-1] != len(text):
+            return None
+        boundaries = np.zeros(len(text) + 1, dtype=bool)
+        boundaries[positions] = True
+
+        return cls(text, offsets.tolist(), boundaries)
+
+    def get_token_count(self, start: int, end: int) -> Optional[int]:
+        """获取文本[start:end]片段的token数, 片段不在预分词边界上时返回None"""
+        if not (self.boundaries[start] and self.boundaries[end]):
+            return None
+
+        # 片段以空白结尾且后面紧跟非空白时, 单独编码会把末尾空白合并成一个预分词, 结果可能不一致
+        if end < len(self.text) and self.text[end - 1].isspace():
+            return None
+
+        return bisect_left(self.offsets, end) - bisect_left(self.offsets, start)
+
+
+class TokenOffsetTextSplitter(RecursiveCharacterTextSplitter):
+    """基于token偏移的递归字符分割器, 每个页面只编码一次并在token偏移上计算分割片段的长度,
+    分割结果与使用相同编码器计算长度的RecursiveCharacterTextSplitter一致"""
+
+    def __init__(
+            self,
+            encoding: Encoding,
+            length_function: Callable[[str], int] = None,
+            **kwargs: Any,
+    ) -> None:
+        """构造函数, length_function用于计算无法通过token偏移得到长度的片段, 需要与encoding保持一致"""
+        super().__init__(
+            length_function=length_function or (lambda text: len(encoding.encode(text))),
+            **kwargs,
+        )
+        self._encoding = encoding
+        self._piece_pattern = regex.compile(encoding._pat_str)
+
+    def split_text(self, text: str) -> list[str]:
+        """分割传递的文本, 丢弃分隔符时片段无法映射回原文位置, 退化为原始分割逻辑"""
+        index = TokenOffsetIndex.build(text, self._encoding, self._piece_pattern) if self._keep_separator else None
+        if index is None:
+            return super().split_text(text)
+        return self._split_text_with_index(text, 0, self._separators, index)
+
+    def _split_text_with_index(
+            self,
+            text: str,
+            start: int,
+            separators: list[str],
+            index: TokenOffsetIndex,
+    ) -> list[str]:
+        """递归分割文本, text为原文从start开始的片段, 流程与RecursiveCharacterTextSplitter._split_text一致"""
+        final_chunks = []
+
+        # 1.获取合适的分隔符
+        separator = separators[-1]
+        new_separators = []
+        for i, _s in enumerate(separators):
+            _separator = _s if self._is_separator_regex else re.escape(_s)
+            if _s == "":
+                separator = _s
+                break
+            if re.search(_separator, text):
+                separator = _s
+                new_separators = separators[i + 1:]
+                break
+
+        _separator = separator if self._is_separator_regex else re.escape(separator)
+        splits = _split_text_with_regex(text, _separator, self._keep_separator)
+
+        # 2.分割结果能拼接回原文时, 按位置从索引中获取各片段的token数, 否则逐个片段编码
+        positions = None
+        if "".join(splits) == text:
+            positions = list(accumulate((len(s) for s in splits[:-1]), initial=0))
+        lengths = []
+        for i, s in enumerate(splits):
+            length = index.get_token_count(start + positions[i], start + positions[i] + len(s)) if positions else None
+            lengths.append(self._length_function(s) if length is None else length)
+
+        # 3.合并小片段, 递归分割超长片段
+        _good_splits = []
+        _good_lengths = []
+        _separator = "" if self._keep_separator else separator
+        for i, (s, length) in enumerate(zip(splits, lengths)):
+            if length < self._chunk_size:
+                _good_splits.append(s)
+                _good_lengths.append(length)
+            else:
+                if _good_splits:
+                    final_chunks.extend(self._merge_splits_with_lengths(_good_splits, _good_lengths, _separator))
+                    _good_splits = []
+                    _good_lengths = []
+                if not new_separators:
+                    final_chunks.append(s)
+                elif positions:
+                    final_chunks.extend(self._split_text_with_index(s, start + positions[i], new_separators, index))
+                else:
+                    final_chunks.extend(self._split_text(s, new_separators))
+        if _good_splits:
+            final_chunks.extend(self._merge_splits_with_lengths(_good_splits, _good_lengths, _separator))
+        return final_chunks
+
+    def _merge_splits_with_lengths(self, splits: list[str], lengths: list[int], separator: str) -> list[str]:
+        """使用已计算的片段长度合并小片段, 流程与TextSplitter._merge_splits一致"""
+        separator_len = self._length_function(separator)
+
+        docs = []
+        current_doc: list[str] = []
+        current_lengths: list[int] = []
+        total = 0
+        for d, _len in zip(splits, lengths):
+            if total + _len + (separator_len if len(current_doc) > 0 else 0) > self._chunk_size:
+                if total > self._chunk_size:
+                    logging.warning(f"分割出的片段长度为{total}, 超过了设置的最大长度{self._chunk_size}")
+                if len(current_doc) > 0:
+                    doc = self._join_docs(current_doc, separator)
+                    if doc is not None:
+                        docs.append(doc)
+                    # 持续移除头部片段, 直到剩余长度不超过重叠长度且能放下当前片段
+                    while total > self._chunk_overlap or (
+                            total + _len + (separator_len if len(current_doc) > 0 else 0) > self._chunk_size
+                            and total > 0
+                    ):
+                        total -= current_lengths[0] + (separator_len if len(current_doc) > 1 else 0)
+                        current_doc = current_doc[1:]
+                        current_lengths = current_lengths[1:]
+            current_doc.append(d)
+            current_lengths.append(_len)
+            total += _len + (separator_len if len(current_doc) > 1 else 0)
+        doc = self._join_docs(current_doc, separator)
+        if doc is not None:
+            docs.append(doc)
+        return docs
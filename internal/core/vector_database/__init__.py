@@ -0,0 +1,5 @@
+from .base_vector_database import BaseVectorDatabase
+from .weaviate_vector_database import WeaviateVectorDatabase
+from .local_vector_database import LocalVectorDatabase
+
+__all__ = ["BaseVectorDatabase", "WeaviateVectorDatabase", "LocalVectorDatabase"]
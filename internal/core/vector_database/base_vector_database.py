@@ -0,0 +1,65 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import numpy as np
+from langchain_core.documents import Document as LCDocument
+
+
+def normalize_relevance_score(score: float) -> float:
+    """将后端返回的原始得分归一化为相关性得分, 与此前langchain_weaviate默认的归一化函数一致,
+    保证应用中已经配置的得分阈值在切换检索实现后依然按原来的尺度过滤"""
+    return float(1 - 1 / (1 + np.exp(np.clip(score, -709, 709))))
+
+
+class BaseVectorDatabase(ABC):
+    """向量数据库后端基类, 记录以节点id为主键, 属性中至少包含dataset_id、document_id、
+    document_enabled与segment_enabled, 检索时只返回指定知识库下文档与片段均启用的记录"""
+
+    @abstractmethod
+    def add_documents(self, documents: list[LCDocument], vectors: list[list[float]], ids: list[str]) -> list[str]:
+        """携带预计算的向量批量写入文档(已存在的id会被覆盖), 返回写入失败的id列表"""
+        raise NotImplementedError("向量数据库add_documents函数未实现")
+
+    @abstractmethod
+    def update_document(self, dataset_id: str, id: str, text: str, vector: list[float]) -> None:
+        """更新单条记录的文本与向量, 其他属性保持不变"""
+        raise NotImplementedError("向量数据库update_document函数未实现")
+
+    @abstractmethod
+    def update_properties(self, dataset_id: str, ids: list[str], properties: dict) -> dict[str, str]:
+        """批量更新记录的属性, 返回更新失败的{id: 错误信息}"""
+        raise NotImplementedError("向量数据库update_properties函数未实现")
+
+    @abstractmethod
+    def delete_by_ids(self, dataset_id: str, ids: list[str]) -> None:
+        """根据id列表删除记录"""
+        raise NotImplementedError("向量数据库delete_by_ids函数未实现")
+
+    @abstractmethod
+    def delete_by_document_id(self, dataset_id: str, document_id: str) -> None:
+        """删除文档下的所有记录"""
+        raise NotImplementedError("向量数据库delete_by_document_id函数未实现")
+
+    @abstractmethod
+    def delete_by_dataset_id(self, dataset_id: str) -> None:
+        """删除知识库下的所有记录"""
+        raise NotImplementedError("向量数据库delete_by_dataset_id函数未实现")
+
+    @abstractmethod
+    def similarity_search(
+            self,
+            query: str,
+            query_vector: list[float],
+            dataset_ids: list[str],
+            k: int = 4,
+            score_threshold: float = 0,
+            excluded_document_ids: Optional[list[str]] = None,
+    ) -> list[tuple[LCDocument, float]]:
+        """在指定知识库中检索与query最相关且文档、片段均启用的k条记录, 返回(文档, 相关性得分)列表,
+        相关性得分为原始得分经过normalize_relevance_score归一化后的值, score_threshold按归一化后的得分过滤,
+        传递了排除的文档id列表时不再使用记录中的document_enabled, 改为排除这些文档下的记录"""
+        raise NotImplementedError("向量数据库similarity_search函数未实现")
+
+    def close(self) -> None:
+        """释放后端持有的连接等资源, 默认无需释放"""
+        pass
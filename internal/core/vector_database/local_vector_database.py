@@ -0,0 +1,414 @@
+import fcntl
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from typing import Iterator, Optional
+
+import numpy as np
+from langchain_core.documents import Document as LCDocument
+
+from .base_vector_database import BaseVectorDatabase, normalize_relevance_score
+
+# 单次参与矩阵乘法的向量行数, 控制检索时的内存占用
+SEARCH_CHUNK_SIZE = 8192
+
+# 废弃向量行数超过总行数的该比例时压缩向量文件
+COMPACT_RATIO = 0.5
+
+# 向量文件行数不超过该值时不压缩
+COMPACT_MIN_ROWS = 10000
+
+# IN条件单次绑定的参数个数, 低于sqlite的参数数量上限(旧版本默认为999)
+SQL_VARIABLE_CHUNK_SIZE = 500
+
+# 进程内缓存: 知识库id -> 过滤状态, 知识库重建或向量文件代数、行数、记录版本号变化后重新加载
+_filter_cache: dict[str, "FilterState"] = {}
+_filter_cache_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS record (
+    row INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    document_id TEXT,
+    document_enabled INTEGER NOT NULL DEFAULT 1,
+    segment_enabled INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS record_document_id_idx ON record (document_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class FilterState:
+    """知识库向量行的过滤状态, 按行号存储记录是否存在、片段与文档的启用状态以及文档编号,
+    检索时直接在数组上计算候选行, 不再逐行读取sqlite"""
+    key: tuple[int, int, int, int]
+    alive: np.ndarray
+    document_enabled: np.ndarray
+    segment_enabled: np.ndarray
+    document_codes: np.ndarray
+    document_ids: dict[str, int]
+
+    def __init__(self, key: tuple[int, int, int, int], row_count: int, records: list[tuple]):
+        self.key = key
+        self.alive = np.zeros(row_count, dtype=bool)
+        self.document_enabled = np.zeros(row_count, dtype=bool)
+        self.segment_enabled = np.zeros(row_count, dtype=bool)
+        self.document_codes = np.full(row_count, -1, dtype=np.int32)
+        self.document_ids = {}
+        for row, document_id, document_enabled, segment_enabled in records:
+            self.alive[row] = True
+            self.document_enabled[row] = document_enabled
+            self.segment_enabled[row] = segment_enabled
+            if document_id is not None:
+                self.document_codes[row] = self.document_ids.setdefault(document_id, len(self.document_ids))
+
+    def get_candidate_mask(self, excluded_document_ids: Optional[list[str]]) -> np.ndarray:
+        """获取文档与片段均启用的行, 传递了排除的文档id列表时按文档排除, 不再使用记录中的document_enabled"""
+        if excluded_document_ids is None:
+            return self.alive & self.segment_enabled & self.document_enabled
+
+        excluded_codes = [
+            self.document_ids[str(document_id)] for document_id in excluded_document_ids
+            if str(document_id) in self.document_ids
+        ]
+        return self.alive & self.segment_enabled & ~np.isin(self.document_codes, excluded_codes)
+
+
+class LocalVectorDatabase(BaseVectorDatabase):
+    """嵌入式本地向量数据库后端, 每个知识库对应一个目录, 记录与过滤属性存储在sqlite中,
+    归一化后的float32向量按行追加到向量文件并通过内存映射执行精确检索, 写入与检索通过文件锁跨进程互斥,
+    检索时对知识库的所有向量行做暴力扫描(没有近似近邻索引), 耗时与知识库记录数成正比,
+    因此单个知识库的记录数受max_records限制, 更大的知识库需要使用Weaviate后端"""
+    path: str
+    max_records: int
+
+    def __init__(self, path: str, max_records: int):
+        self.path = path
+        self.max_records = max_records
+        os.makedirs(path, exist_ok=True)
+
+    def add_documents(self, documents: list[LCDocument], vectors: list[list[float]], ids: list[str]) -> list[str]:
+        """携带预计算的向量批量写入文档(已存在的id会被覆盖), 按知识库分组写入, 返回写入失败的id列表"""
+        groups: dict[str, list[int]] = {}
+        for index, document in enumerate(documents):
+            groups.setdefault(str(document.metadata["dataset_id"]), []).append(index)
+
+        failed_ids = []
+        for dataset_id, indexes in groups.items():
+            try:
+                self._upsert(
+                    dataset_id,
+                    [ids[index] for index in indexes],
+                    [documents[index] for index in indexes],
+                    np.asarray([vectors[index] for index in indexes], dtype=np.float32),
+                )
+            except Exception:
+                failed_ids.extend(ids[index] for index in indexes)
+
+        return failed_ids
+
+    def update_document(self, dataset_id: str, id: str, text: str, vector: list[float]) -> None:
+        """更新单条记录的文本与向量, 新向量追加到向量文件末尾, 旧向量行成为废弃行"""
+        with self._open(dataset_id, exclusive=True) as connection:
+            record = connection.execute("SELECT metadata FROM record WHERE id = ?", (id,)).fetchone()
+            if record is None:
+                raise ValueError(f"向量数据库记录不存在: {id}")
+            document = LCDocument(page_content=text, metadata=json.loads(record[0]))
+            self._write(connection, dataset_id, [id], [document], np.asarray([vector], dtype=np.float32))
+
+    def update_properties(self, dataset_id: str, ids: list[str], properties: dict) -> dict[str, str]:
+        """批量更新记录的属性, 过滤属性同步更新对应列, 返回更新失败的{id: 错误信息}"""
+        with self._open(dataset_id, exclusive=True) as connection:
+            records = dict(self._fetch_in(connection, "SELECT id, metadata FROM record WHERE id IN ({})", ids))
+
+            rows = []
+            for id, metadata in records.items():
+                metadata = {**json.loads(metadata), **properties}
+                rows.append((json.dumps(metadata), *self._get_filter_values(metadata), id))
+            connection.executemany(
+                "UPDATE record SET metadata = ?, document_id = ?, document_enabled = ?, segment_enabled = ? "
+                "WHERE id = ?",
+                rows,
+            )
+            self._bump_version(connection)
+            connection.commit()
+
+        return {id: "向量数据库记录不存在" for id in ids if id not in records}
+
+    def delete_by_ids(self, dataset_id: str, ids: list[str]) -> None:
+        """根据id列表删除记录, 对应的向量行成为废弃行, 废弃行过多时压缩向量文件"""
+        with self._open(dataset_id, exclusive=True) as connection:
+            connection.executemany("DELETE FROM record WHERE id = ?", [(id,) for id in ids])
+            self._bump_version(connection)
+            connection.commit()
+            self._compact_if_needed(connection, dataset_id)
+
+    def delete_by_document_id(self, dataset_id: str, document_id: str) -> None:
+        """删除文档下的所有记录"""
+        with self._open(dataset_id, exclusive=True) as connection:
+            connection.execute("DELETE FROM record WHERE document_id = ?", (str(document_id),))
+            self._bump_version(connection)
+            connection.commit()
+            self._compact_if_needed(connection, dataset_id)
+
+    def delete_by_dataset_id(self, dataset_id: str) -> None:
+        """删除知识库目录下的记录与向量文件"""
+        dataset_path = self._get_dataset_path(dataset_id)
+        if not os.path.isdir(dataset_path):
+            return
+        with self._lock(dataset_id, exclusive=True):
+            shutil.rmtree(dataset_path, ignore_errors=True)
+        with _filter_cache_lock:
+            _filter_cache.pop(str(dataset_id), None)
+
+    def similarity_search(
+            self,
+            query: str,
+            query_vector: list[float],
+            dataset_ids: list[str],
+            k: int = 4,
+            score_threshold: float = 0,
+            excluded_document_ids: Optional[list[str]] = None,
+    ) -> list[tuple[LCDocument, float]]:
+        """在每个知识库的向量文件上执行精确的余弦相似度检索, 合并各知识库的结果后返回得分最高的k条记录,
+        本地后端没有关键词检索, 原始得分为余弦相似度"""
+        query_vector = self._normalize(np.asarray([query_vector], dtype=np.float32))[0]
+
+        results = []
+        for dataset_id in dataset_ids:
+            if os.path.isdir(self._get_dataset_path(dataset_id)):
+                results.extend(self._search(str(dataset_id), query_vector, k, score_threshold, excluded_document_ids))
+
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results[:k]
+
+    def _search(
+            self,
+            dataset_id: str,
+            query_vector: np.ndarray,
+            k: int,
+            score_threshold: float,
+            excluded_document_ids: Optional[list[str]],
+    ) -> list[tuple[LCDocument, float]]:
+        """在单个知识库中检索文档与片段均启用的前k条记录"""
+        with self._open(dataset_id, exclusive=False) as connection:
+            meta = self._get_meta(connection)
+            if not meta.get("row_count") or meta["dimension"] != len(query_vector):
+                return []
+
+            # 1.分块计算向量文件中所有行的相似度, 顺序读取内存映射比按行随机读取更快
+            vectors = self._open_vectors(dataset_id, meta)
+            scores = np.empty(meta["row_count"], dtype=np.float32)
+            for start in range(0, meta["row_count"], SEARCH_CHUNK_SIZE):
+                scores[start:start + SEARCH_CHUNK_SIZE] = vectors[start:start + SEARCH_CHUNK_SIZE] @ query_vector
+            del vectors
+
+            # 2.只在启用的记录中选出得分最高的k行, 过滤状态缓存在进程内, 记录变更后按版本号重新加载
+            rows = np.flatnonzero(self._get_filter_state(connection, dataset_id, meta).get_candidate_mask(
+                excluded_document_ids,
+            ))
+            if len(rows) == 0:
+                return []
+            candidate_scores = scores[rows]
+            if len(rows) > k:
+                top = np.argpartition(-candidate_scores, k - 1)[:k]
+                rows, candidate_scores = rows[top], candidate_scores[top]
+            candidate_scores = [normalize_relevance_score(score) for score in candidate_scores.tolist()]
+            scores_by_row = {
+                row: score for row, score in zip(rows.tolist(), candidate_scores) if score >= score_threshold
+            }
+            if not scores_by_row:
+                return []
+
+            # 3.读取命中记录的文本与属性
+            records = self._fetch_in(
+                connection,
+                "SELECT row, text, metadata FROM record WHERE row IN ({})",
+                list(scores_by_row.keys()),
+            )
+
+        return [
+            (LCDocument(page_content=text, metadata=json.loads(metadata)), scores_by_row[row])
+            for row, text, metadata in records
+        ]
+
+    def _upsert(self, dataset_id: str, ids: list[str], documents: list[LCDocument], vectors: np.ndarray) -> None:
+        """在知识库的写锁内写入记录与向量"""
+        with self._open(dataset_id, exclusive=True) as connection:
+            self._write(connection, dataset_id, ids, documents, vectors)
+            self._compact_if_needed(connection, dataset_id)
+
+    def _write(
+            self,
+            connection: sqlite3.Connection,
+            dataset_id: str,
+            ids: list[str],
+            documents: list[LCDocument],
+            vectors: np.ndarray,
+    ) -> None:
+        """将向量追加到向量文件末尾并覆盖写入记录, 需要在写锁内调用"""
+        meta = self._get_meta(connection)
+        dimension = meta.setdefault("dimension", vectors.shape[1])
+        if vectors.ndim != 2 or vectors.shape[1] != dimension:
+            raise ValueError(f"向量维度与知识库已有向量维度{dimension}不一致")
+        row_count = meta.setdefault("row_count", 0)
+        meta.setdefault("generation", 0)
+        meta.setdefault("created_at", time.time_ns())
+
+        # 1.先截断到已提交的行数(丢弃上次写入失败残留的数据)再追加向量, 记录提交后新的向量行才可见
+        with open(self._get_vectors_path(dataset_id, meta["generation"]), "ab") as file:
+            file.truncate(row_count * dimension * 4)
+            file.write(self._normalize(vectors).tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+
+        # 2.覆盖写入记录, 旧记录对应的向量行成为废弃行
+        connection.executemany(
+            "INSERT OR REPLACE INTO record "
+            "(row, id, text, metadata, document_id, document_enabled, segment_enabled) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (row_count + index, id, document.page_content, json.dumps(document.metadata),
+                 *self._get_filter_values(document.metadata))
+                for index, (id, document) in enumerate(zip(ids, documents))
+            ],
+        )
+        record_count, = connection.execute("SELECT COUNT(*) FROM record").fetchone()
+        if record_count > self.max_records:
+            connection.rollback()
+            raise ValueError(f"本地向量库单个知识库最多存储{self.max_records}条记录, 更大的知识库请使用Weaviate后端")
+        meta["row_count"] = row_count + len(ids)
+        meta["version"] = meta.get("version", 0) + 1
+        self._set_meta(connection, meta)
+        connection.commit()
+
+    def _compact_if_needed(self, connection: sqlite3.Connection, dataset_id: str) -> None:
+        """废弃向量行过多时, 将有效向量按行号顺序写入新一代向量文件并重排记录行号, 需要在写锁内调用"""
+        meta = self._get_meta(connection)
+        row_count = meta.get("row_count", 0)
+        record_count, = connection.execute("SELECT COUNT(*) FROM record").fetchone()
+        if row_count <= COMPACT_MIN_ROWS or row_count - record_count <= row_count * COMPACT_RATIO:
+            return
+
+        # 1.按行号升序把有效向量复制到新文件, 新行号不大于旧行号, 按升序更新不会产生主键冲突
+        rows = np.fromiter(
+            (row for row, in connection.execute("SELECT row FROM record ORDER BY row")),
+            dtype=np.int64,
+        )
+        vectors = self._open_vectors(dataset_id, meta)
+        generation = meta["generation"] + 1
+        with open(self._get_vectors_path(dataset_id, generation), "wb") as file:
+            for start in range(0, len(rows), SEARCH_CHUNK_SIZE):
+                file.write(np.ascontiguousarray(vectors[rows[start:start + SEARCH_CHUNK_SIZE]]).tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        del vectors
+
+        # 2.在同一个事务中重排行号并切换向量文件, 提交后再删除旧文件
+        connection.executemany(
+            "UPDATE record SET row = ? WHERE row = ?",
+            [(index, row) for index, row in enumerate(rows.tolist())],
+        )
+        old_generation = meta["generation"]
+        self._set_meta(connection, {**meta, "row_count": len(rows), "generation": generation})
+        connection.commit()
+        os.remove(self._get_vectors_path(dataset_id, old_generation))
+
+    @classmethod
+    def _get_filter_state(cls, connection: sqlite3.Connection, dataset_id: str, meta: dict) -> FilterState:
+        """获取知识库的过滤状态, 知识库创建时间、向量文件代数、行数与记录版本号均未变化时直接使用进程内缓存, 需要在锁内调用"""
+        key = (meta.get("created_at", 0), meta["generation"], meta["row_count"], meta.get("version", 0))
+        with _filter_cache_lock:
+            filter_state = _filter_cache.get(dataset_id)
+        if filter_state is not None and filter_state.key == key:
+            return filter_state
+
+        filter_state = FilterState(key, meta["row_count"], connection.execute(
+            "SELECT row, document_id, document_enabled, segment_enabled FROM record",
+        ).fetchall())
+        with _filter_cache_lock:
+            _filter_cache[dataset_id] = filter_state
+        return filter_state
+
+    @classmethod
+    def _bump_version(cls, connection: sqlite3.Connection) -> None:
+        """递增记录版本号, 使各进程缓存的过滤状态失效, 需要在修改记录的事务内调用"""
+        connection.execute(
+            "INSERT INTO meta (key, value) VALUES ('version', 1) "
+            "ON CONFLICT (key) DO UPDATE SET value = value + 1"
+        )
+
+    def _open_vectors(self, dataset_id: str, meta: dict) -> np.ndarray:
+        """以只读内存映射的方式打开知识库已提交的向量行"""
+        return np.memmap(
+            self._get_vectors_path(dataset_id, meta["generation"]),
+            dtype=np.float32,
+            mode="r",
+            shape=(meta["row_count"], meta["dimension"]),
+        )
+
+    @contextmanager
+    def _open(self, dataset_id: str, exclusive: bool) -> Iterator[sqlite3.Connection]:
+        """持有知识库的文件锁并打开记录数据库, 写操作使用排他锁, 检索使用共享锁"""
+        os.makedirs(self._get_dataset_path(dataset_id), exist_ok=True)
+        with self._lock(dataset_id, exclusive):
+            with closing(sqlite3.connect(os.path.join(self._get_dataset_path(dataset_id), "records.sqlite3"))) as connection:
+                connection.executescript(SCHEMA)
+                yield connection
+
+    @contextmanager
+    def _lock(self, dataset_id: str, exclusive: bool) -> Iterator[None]:
+        """获取知识库的文件锁, 每次都打开新的文件描述符, 同时对进程内的其他线程生效"""
+        with open(os.path.join(self._get_dataset_path(dataset_id), ".lock"), "a") as file:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+    def _get_dataset_path(self, dataset_id: str) -> str:
+        return os.path.join(self.path, str(dataset_id))
+
+    def _get_vectors_path(self, dataset_id: str, generation: int) -> str:
+        return os.path.join(self._get_dataset_path(dataset_id), f"vectors.{generation}.f32")
+
+    @classmethod
+    def _fetch_in(cls, connection: sqlite3.Connection, sql: str, values: list) -> list[tuple]:
+        """分批执行带IN条件的查询, sql中的`{}`会被替换为当前批次的占位符, 避免超出sqlite的参数数量上限"""
+        records = []
+        for start in range(0, len(values), SQL_VARIABLE_CHUNK_SIZE):
+            chunk = values[start:start + SQL_VARIABLE_CHUNK_SIZE]
+            records.extend(connection.execute(sql.format(",".join("?" * len(chunk))), chunk).fetchall())
+        return records
+
+    @classmethod
+    def _get_meta(cls, connection: sqlite3.Connection) -> dict:
+        return dict(connection.execute("SELECT key, value FROM meta").fetchall())
+
+    @classmethod
+    def _set_meta(cls, connection: sqlite3.Connection, meta: dict) -> None:
+        connection.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", list(meta.items()))
+
+    @classmethod
+    def _get_filter_values(cls, metadata: dict) -> tuple[Optional[str], int, int]:
+        """从记录属性中获取过滤列的值, 启用状态缺省时视为启用"""
+        document_id = metadata.get("document_id")
+        return (
+            None if document_id is None else str(document_id),
+            int(bool(metadata.get("document_enabled", True))),
+            int(bool(metadata.get("segment_enabled", True))),
+        )
+
+    @classmethod
+    def _normalize(cls, vectors: np.ndarray) -> np.ndarray:
+        """对向量做L2归一化, 使内积即为余弦相似度"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms == 0, 1, norms)).astype(np.float32)
@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import weaviate
+from langchain_core.documents import Document as LCDocument
+from weaviate import WeaviateClient
+from weaviate.auth import AuthApiKey
+from weaviate.classes.data import DataObject
+from weaviate.classes.query import Filter, MetadataQuery
+from weaviate.collections import Collection
+
+from .base_vector_database import BaseVectorDatabase, normalize_relevance_score
+
+# 单次批量删除的最大记录数
+DELETE_BATCH_SIZE = 1000
+
+# 并发更新属性的最大请求数
+UPDATE_CONCURRENCY = 8
+
+
+class WeaviateVectorDatabase(BaseVectorDatabase):
+    """Weaviate向量数据库后端, 所有知识库的记录存储在同一个集合中, 通过属性过滤知识库与启用状态"""
+    client: WeaviateClient
+    collection_name: str
+
+    def __init__(self, cluster_url: str, api_key: str, collection_name: str):
+        self.client = weaviate.connect_to_weaviate_cloud(
+            cluster_url=cluster_url,
+            auth_credentials=AuthApiKey(api_key),
+        )
+        self.collection_name = collection_name
+
+    def close(self) -> None:
+        """关闭Weaviate客户端连接"""
+        self.client.close()
+
+    @property
+    def collection(self) -> Collection:
+        return self.client.collections.get(self.collection_name)
+
+    def add_documents(self, documents: list[LCDocument], vectors: list[list[float]], ids: list[str]) -> list[str]:
+        """携带预计算的向量批量写入文档, 跳过向量数据库侧的嵌入计算, 返回写入失败的id列表"""
+        result = self.collection.data.insert_many([
+            DataObject(
+                properties={"text": document.page_content, **document.metadata},
+                uuid=id,
+                vector=vector,
+            )
+            for document, vector, id in zip(documents, vectors, ids)
+        ])
+
+        return [ids[index] for index in result.errors.keys()]
+
+    def update_document(self, dataset_id: str, id: str, text: str, vector: list[float]) -> None:
+        """更新单条记录的文本与向量"""
+        self.collection.data.update(uuid=id, properties={"text": text}, vector=vector)
+
+    def update_properties(self, dataset_id: str, ids: list[str], properties: dict) -> dict[str, str]:
+        """批量更新记录的属性, 每条记录只提交传递的属性(部分更新, 不读取也不回写向量与其他属性),
+        请求通过有界线程池并发发送, 返回更新失败的{id: 错误信息}"""
+        if not ids:
+            return {}
+        collection = self.collection
+
+        def update(id: str) -> Optional[str]:
+            try:
+                collection.data.update(uuid=id, properties=properties)
+            except Exception as e:
+                return str(e)
+            return None
+
+        with ThreadPoolExecutor(max_workers=min(UPDATE_CONCURRENCY, len(ids))) as executor:
+            return {id: error for id, error in zip(ids, executor.map(update, ids)) if error is not None}
+
+    def delete_by_ids(self, dataset_id: str, ids: list[str]) -> None:
+        """根据id列表分批删除记录"""
+        for i in range(0, len(ids), DELETE_BATCH_SIZE):
+            self.collection.data.delete_many(
+                where=Filter.by_id().contains_any(ids[i:i + DELETE_BATCH_SIZE]),
+            )
+
+    def delete_by_document_id(self, dataset_id: str, document_id: str) -> None:
+        """删除文档下的所有记录"""
+        self.collection.data.delete_many(
+            where=Filter.by_property("document_id").equal(document_id),
+        )
+
+    def delete_by_dataset_id(self, dataset_id: str) -> None:
+        """删除知识库下的所有记录"""
+        self.collection.data.delete_many(
+            where=Filter.by_property("dataset_id").equal(dataset_id),
+        )
+
+    def similarity_search(
+            self,
+            query: str,
+            query_vector: list[float],
+            dataset_ids: list[str],
+            k: int = 4,
+            score_threshold: float = 0,
+            excluded_document_ids: Optional[list[str]] = None,
+    ) -> list[tuple[LCDocument, float]]:
+        """使用query文本与向量执行混合检索(与此前langchain_weaviate的检索方式一致), 过滤条件下推到Weaviate,
+        相关性得分为混合检索得分经过归一化后的值"""
+        filters = [
+            Filter.by_property("dataset_id").contains_any(dataset_ids),
+            Filter.by_property("segment_enabled").equal(True),
+        ]
+        if excluded_document_ids is None:
+            filters.append(Filter.by_property("document_enabled").equal(True))
+        elif excluded_document_ids:
+            # 使用单个contains_none条件排除文档, 过滤树的大小不随禁用文档数量增长
+            filters.append(Filter.by_property("document_id").contains_none(
+                [str(document_id) for document_id in excluded_document_ids],
+            ))
+
+        response = self.collection.query.hybrid(
+            query=query,
+            vector=query_vector,
+            limit=k,
+            filters=Filter.all_of(filters),
+            return_metadata=MetadataQuery(score=True),
+        )
+
+        results = []
+        for obj in response.objects:
+            properties = dict(obj.properties)
+            text = properties.pop("text", "")
+            score = normalize_relevance_score(obj.metadata.score)
+            if score >= score_threshold:
+                results.append((LCDocument(page_content=text, metadata=properties), score))
+
+        return results
@@ -4,8 +4,41 @@ LOCK_EXPIRE_TIME = 600
 # 更新文档启用状态缓存锁
 LOCK_DOCUMENT_UPDATED_ENABLED = "lock:document:update:enabled_{document_id}"
 
+# 文档构建锁, 构建过程中持续续期, 过期则视为构建中断
+LOCK_DOCUMENT_INDEXING = "lock:document:indexing_{document_id}"
+
 # 更新关键词表缓存锁
 LOCK_KEYWORD_TABLE_UPDATE_KEYWORD_TABLE = "lock:keyword_table:update:keyword_table_{dataset_id}"
 
 # 更新片段启用状态缓存锁
-LOCK_SEGMENT_UPDATE_ENABLED = "lock:segment:update:enabled_{segment_id}"
\ No newline at end of file
+LOCK_SEGMENT_UPDATE_ENABLED = "lock:segment:update:enabled_{segment_id}"
+
+# 片段向量缓存键, 使用嵌入模型名称与片段内容哈希作为标识
+CACHE_EMBEDDING_VECTOR = "embedding:vector:{model}:{hash}"
+
+# query向量缓存键, 使用嵌入模型名称与规整后query的哈希作为标识
+CACHE_QUERY_EMBEDDING_VECTOR = "embedding:query:{model}:{hash}"
+
+# 知识库内容版本号, 知识库下的文档或片段变更时递增, 作为检索结果缓存键的一部分
+CACHE_DATASET_VERSION = "dataset:version:{dataset_id}"
+
+# 检索结果缓存键, 使用知识库列表、版本号、检索参数与query的哈希作为标识
+CACHE_RETRIEVAL_RESULT = "retrieval:result:{hash}"
+
+# 知识库检索结果缓存的命中统计, 哈希结构, 字段为hits与misses
+CACHE_RETRIEVAL_STATS = "retrieval:stats:{dataset_id}"
+
+# 知识库禁用文档集合版本号, 文档启用状态变更时递增
+CACHE_DISABLED_DOCUMENTS_VERSION = "dataset:disabled_documents:version:{dataset_id}"
+
+# 知识库禁用文档id集合缓存键, 键中携带版本号, 版本号递增后旧缓存不再被读取
+CACHE_DISABLED_DOCUMENTS = "dataset:disabled_documents:{dataset_id}:{version}"
+
+# 知识库关键词表版本号, 倒排记录变更时递增, 用于校验进程内缓存
+CACHE_KEYWORD_TABLE_VERSION = "keyword_table:version:{dataset_id}"
+
+# 知识库关键词表版本变更的广播频道, 消息内容为知识库id
+CHANNEL_KEYWORD_TABLE_VERSION = "keyword_table:version"
+
+# 已补齐片段全文检索向量的全文检索后端, 与当前配置的后端不一致时说明后端发生了切换
+CACHE_SEARCH_VECTOR_SYNCED_BACKEND = "segment:search_vector:synced_backend"
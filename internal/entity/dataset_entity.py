@@ -53,6 +53,21 @@ class RetrievalStrategy(str, Enum):
     SEMANTIC = "semantic"
     HYBRID = "hybrid"
 
+class FullTextRetrievalBackend(str, Enum):
+    """全文检索后端"""
+    KEYWORD_TABLE = "keyword_table"
+    POSTGRES = "postgres"
+
+class VectorDatabaseBackend(str, Enum):
+    """向量数据库后端"""
+    WEAVIATE = "weaviate"
+    LOCAL = "local"
+
+class DocumentEnabledMode(str, Enum):
+    """文档启用状态的生效方式"""
+    STORED = "stored"
+    EXCLUSION = "exclusion"
+
 class RetrievalSource(str, Enum):
     """检索来源"""
     HIT_TESTING = "hit_testing"
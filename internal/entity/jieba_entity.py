@@ -1,4 +1,5 @@
-STOPWORD_SET = {
+# 停用词集合, 冻结后可以在多个进程、多个服务实例之间安全共享
+STOPWORD_SET = frozenset({
     "during", "when", "but", "then", "further", "isn", "mustn't", "until", "own", "i", "couldn", "y", "only", "you've",
     "ours", "who", "where", "ourselves", "has", "to", "was", "didn't", "themselves", "if", "against", "through", "her",
     "an", "your", "can", "those", "didn", "about", "aren't", "shan't", "be", "not", "these", "again", "so", "t",
@@ -96,4 +97,4 @@ STOPWORD_SET = {
     "全年", "全然", "全身心", "然", "人人", "仍", "仍旧", "仍然", "日复一日", "日见", "日渐", "日益", "日臻", "如常",
     "如此等等", "如次", "如今", "如期", "如前所述", "如上", "如下", "汝", "三番两次", "三番五次", "三天两头", "瑟瑟",
     "沙沙", "上", "上来", "上去", "一个", "月", "日", "\n"
-}
\ No newline at end of file
+})
@@ -53,6 +53,12 @@ class DatasetHandler:
         resp = GetDatasetQueriesResp(many=True)
         return success_json(resp.dump(dataset_queries))
 
+    @login_required
+    def get_retrieval_cache_stats(self, dataset_id: UUID):
+        """根据传递的知识库id获取检索结果缓存的命中次数、未命中次数与命中率"""
+        stats = self.dataset_service.get_retrieval_cache_stats(dataset_id, current_user)
+        return success_json(stats)
+
     @login_required
     def create_dataset(self):
         """创建知识库"""
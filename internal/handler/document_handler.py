@@ -12,6 +12,7 @@ from internal.schema.document_schema import (
     GetDocumentsWithPageReq,
     GetDocumentsWithPageResp,
     UpdateDocumentEnabledReq,
+    ReindexDocumentReq,
 )
 from pkg.response import validate_error_json, success_json, success_message
 from internal.service import DocumentService
@@ -52,6 +53,16 @@ class DocumentHandler:
         self.document_service.update_document(dataset_id, document_id, account=current_user, name=req.name.data)
         return success_message("更新文档名字成功")
 
+    @login_required
+    def reindex_document(self, dataset_id: UUID, document_id: UUID):
+        """根据传递的知识库id+文档id重新上传文件或修改处理规则, 并增量重建文档索引"""
+        req = ReindexDocumentReq()
+        if not req.validate():
+            return validate_error_json(req.errors)
+
+        self.document_service.reindex_document(dataset_id, document_id, **req.data, account=current_user)
+        return success_message("重建文档索引成功")
+
     @login_required
     def update_document_enabled(self, dataset_id: UUID, document_id: UUID):
         """根据传递的知识库id+文档id更新指定文档的启用状态"""
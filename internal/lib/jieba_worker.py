@@ -0,0 +1,106 @@
+import warnings
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+warnings.filterwarnings("ignore", category=ResourceWarning)
+
+import re
+import threading
+from collections import Counter
+
+import jieba
+import jieba.analyse
+from jieba.analyse import default_tfidf
+from internal.entity.jieba_entity import STOPWORD_SET
+
+# tsvector中单个词位最多记录的位置数与最大位置, 超出部分由postgres丢弃或截断, 这里提前处理保证写入不会失败
+MAX_SEARCH_VECTOR_POSITIONS = 256
+MAX_SEARCH_VECTOR_POSITION = 16383
+
+# tsvector中单个词位的最大字节数
+MAX_SEARCH_VECTOR_LEXEME_BYTES = 2046
+
+# 至少包含一个字母、数字或汉字的分词才会被索引
+WORD_PATTERN = re.compile(r"\w")
+
+_warmed_up = False
+_warm_up_lock = threading.Lock()
+
+
+def warm_up(cache_file: str = None) -> None:
+    """预热jieba, 替换为冻结的停用词集合并从序列化的词典缓存加载前缀词典, 进程内只会执行一次,
+    在fork前执行时(如gunicorn预加载、celery主进程)子进程以写时复制的方式共享已加载的词典"""
+    global _warmed_up
+    if _warmed_up:
+        return
+
+    with _warm_up_lock:
+        if _warmed_up:
+            return
+        default_tfidf.stop_words = STOPWORD_SET
+        if cache_file:
+            jieba.dt.cache_file = cache_file
+        jieba.initialize()
+        _warmed_up = True
+
+
+def extract_keywords(text: str, max_keyword_per_chunk: int = 10) -> list[str]:
+    """根据输入的文本, 提取对应文本的关键词列表"""
+    return jieba.analyse.extract_tags(
+        sentence=text,
+        topK=max_keyword_per_chunk,
+    )
+
+
+def extract_keywords_batch(texts: list[str], max_keyword_per_chunk: int = 10) -> list[list[str]]:
+    """批量提取文本列表的关键词列表, 作为进程池的任务函数, 模块只依赖jieba以减小工作进程的启动开销"""
+    return [extract_keywords(text, max_keyword_per_chunk) for text in texts]
+
+
+def count_keyword_frequencies(text: str, keywords: list[str]) -> tuple[list[int], int]:
+    """使用与关键词提取相同的精确模式对文本分词, 返回每个关键词作为完整分词出现的次数与文本的分词数,
+    词频与片段长度来自同一次分词, 关键词不会命中其他词中的子串(如ai不会命中said)"""
+    counts = Counter(token.lower() for token in jieba.cut(text) if WORD_PATTERN.search(token))
+    return [counts[keyword.lower()] for keyword in keywords], sum(counts.values())
+
+
+def count_keyword_frequencies_batch(items: list[tuple[str, list[str]]]) -> list[tuple[list[int], int]]:
+    """批量统计(文本, 关键词列表)的关键词词频与文本分词数, 作为进程池的任务函数"""
+    return [count_keyword_frequencies(text, keywords) for text, keywords in items]
+
+
+def tokenize(text: str) -> list[str]:
+    """使用搜索引擎模式对文本分词, 统一转换为小写并移除停用词与纯标点/空白的分词, 文档与query使用相同的分词规则"""
+    return [
+        token for token in (token.strip().lower() for token in jieba.cut_for_search(text))
+        if token and token not in STOPWORD_SET and WORD_PATTERN.search(token)
+    ]
+
+
+def build_search_vector(text: str) -> str:
+    """将文本分词后构建为带位置信息的tsvector字面量, 词位已经过jieba分词, 写入时无需再经过postgres的分词器"""
+    positions = {}
+    for position, token in enumerate(tokenize(text), start=1):
+        if len(token.encode("utf-8")) > MAX_SEARCH_VECTOR_LEXEME_BYTES:
+            continue
+        token_positions = positions.setdefault(token, [])
+        if len(token_positions) < MAX_SEARCH_VECTOR_POSITIONS:
+            token_positions.append(min(position, MAX_SEARCH_VECTOR_POSITION))
+
+    return " ".join(
+        f"{quote_lexeme(token)}:{','.join(map(str, sorted(set(token_positions))))}"
+        for token, token_positions in positions.items()
+    )
+
+
+def build_search_vectors_batch(texts: list[str]) -> list[str]:
+    """批量构建文本列表的tsvector字面量, 作为进程池的任务函数"""
+    return [build_search_vector(text) for text in texts]
+
+
+def build_search_query(text: str) -> str:
+    """将query分词后构建为tsquery字面量, 任一分词命中即可匹配, 没有可用分词时返回空字符串"""
+    return " | ".join(quote_lexeme(token) for token in dict.fromkeys(tokenize(text)))
+
+
+def quote_lexeme(lexeme: str) -> str:
+    """将词位转换为tsvector/tsquery字面量中的带引号形式"""
+    return "'" + lexeme.replace("\\", "\\\\").replace("'", "''") + "'"
@@ -1,7 +1,7 @@
 from .app import App, AppDatasetJoin, AppConfig, AppConfigVersion
 from .api_tool import ApiToolProvider, ApiTool
 from .upload_file import UploadFile
-from .dataset import Dataset, Document, Segment, KeywordTable, DatasetQuery, ProcessRule
+from .dataset import Dataset, Document, Segment, KeywordTable, KeywordSegment, KeywordPosting, DatasetQuery, ProcessRule
 from .conversation import Conversation, Message, MessageAgentThought
 from .account import Account, AccountOAuth
 from .api_key import ApiKey
@@ -12,7 +12,7 @@ __all__ = [
     "App", "AppDatasetJoin", "AppConfig", "AppConfigVersion",
     "ApiToolProvider", "ApiTool",
     "UploadFile",
-    "Dataset", "Document", "Segment", "KeywordTable", "DatasetQuery", "ProcessRule",
+    "Dataset", "Document", "Segment", "KeywordTable", "KeywordSegment", "KeywordPosting", "DatasetQuery", "ProcessRule",
     "Conversation", "Message", "MessageAgentThought",
     "Account", "AccountOAuth",
     "ApiKey",
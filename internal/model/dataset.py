@@ -11,11 +11,13 @@ from sqlalchemy import (
     Text,
     text,
     Integer,
+    LargeBinary,
     Boolean,
     func,
-    Index
+    Index,
+    UniqueConstraint,
 )
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from .upload_file import UploadFile
 
 class Dataset(db.Model):
@@ -149,6 +151,7 @@ class Segment(db.Model):
         Index("segment_account_id_idx", "account_id"),
         Index("segment_dataset_id_idx", "dataset_id"),
         Index("segment_document_id_idx", "document_id"),
+        Index("segment_search_vector_idx", "search_vector", postgresql_using="gin"),
     )
 
     id = Column(UUID, nullable=False, server_default=text("uuid_generate_v4()"))
@@ -161,6 +164,7 @@ class Segment(db.Model):
     character_count = Column(Integer, nullable=False, server_default=text("0"))
     token_count = Column(Integer, nullable=False, server_default=text("0"))
     keywords = Column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
+    search_vector = Column(TSVECTOR, nullable=True)
     hash = Column(String(255), nullable=False, server_default=text("''::character varying"))
     hit_count = Column(Integer, nullable=False, server_default=text("0"))
     enabled = Column(Boolean, nullable=False, server_default=text("false"))
@@ -184,7 +188,7 @@ class Segment(db.Model):
         return db.session.query(Document).get(self.document_id)
 
 class KeywordTable(db.Model):
-    """关键词表"""
+    """关键词表, 记录知识库已建立倒排索引的片段数与分词总数(用于BM25计算平均片段长度), 以及下一个可分配的片段序号"""
     __tablename__ = "keyword_table"
     __table_args__ = (
         PrimaryKeyConstraint("id", name="pk_keyword_table_id"),
@@ -194,6 +198,49 @@ class KeywordTable(db.Model):
     id = Column(UUID, nullable=False, server_default=text("uuid_generate_v4()"))
     dataset_id = Column(UUID, nullable=False)
     keyword_table = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    segment_count = Column(Integer, nullable=False, server_default=text("0"))
+    token_count = Column(Integer, nullable=False, server_default=text("0"))
+    next_ordinal = Column(Integer, nullable=False, server_default=text("0"))
+    updated_at = Column(
+        DateTime,
+        nullable=False,
+        server_default=text("CURRENT_TIMESTAMP(0)"),
+        onupdate=datetime.now
+    )
+    created_at = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP(0)"))
+
+class KeywordSegment(db.Model):
+    """关键词片段表, 为知识库下建立倒排索引的片段分配知识库内唯一的整数序号, 并记录片段的关键词与长度"""
+    __tablename__ = "keyword_segment"
+    __table_args__ = (
+        PrimaryKeyConstraint("id", name="pk_keyword_segment_id"),
+        UniqueConstraint("dataset_id", "segment_id", name="uk_keyword_segment_dataset_id_segment_id"),
+        UniqueConstraint("dataset_id", "ordinal", name="uk_keyword_segment_dataset_id_ordinal"),
+    )
+
+    id = Column(UUID, nullable=False, server_default=text("uuid_generate_v4()"))
+    dataset_id = Column(UUID, nullable=False)
+    segment_id = Column(UUID, nullable=False)
+    ordinal = Column(Integer, nullable=False)
+    keywords = Column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
+    segment_length = Column(Integer, nullable=False, server_default=text("0"))
+    created_at = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP(0)"))
+
+class KeywordPosting(db.Model):
+    """关键词倒排表, 每条记录对应知识库下的一个关键词, 命中片段的序号、词频与片段长度以压缩字节串存储"""
+    __tablename__ = "keyword_posting"
+    __table_args__ = (
+        PrimaryKeyConstraint("id", name="pk_keyword_posting_id"),
+        UniqueConstraint("dataset_id", "keyword", name="uk_keyword_posting_dataset_id_keyword"),
+    )
+
+    id = Column(UUID, nullable=False, server_default=text("uuid_generate_v4()"))
+    dataset_id = Column(UUID, nullable=False)
+    keyword = Column(String(255), nullable=False, server_default=text("''::character varying"))
+    segment_count = Column(Integer, nullable=False, server_default=text("0"))
+    segment_ordinals = Column(LargeBinary, nullable=False, server_default=text("''::bytea"))
+    frequencies = Column(LargeBinary, nullable=False, server_default=text("''::bytea"))
+    segment_lengths = Column(LargeBinary, nullable=False, server_default=text("''::bytea"))
     updated_at = Column(
         DateTime,
         nullable=False,
@@ -109,6 +109,7 @@ class Router:
         bp.add_url_rule("/datasets/<uuid:dataset_id>/documents/<uuid:document_id>", view_func=self.document_handler.get_document)
         bp.add_url_rule("/datasets/<uuid:dataset_id>/documents/<uuid:document_id>/name", methods=["POST"], view_func=self.document_handler.update_document_name)
         bp.add_url_rule("/datasets/<uuid:dataset_id>/documents/<uuid:document_id>/enabled", methods=["POST"], view_func=self.document_handler.update_document_enabled)
+        bp.add_url_rule("/datasets/<uuid:dataset_id>/documents/<uuid:document_id>/reindex", methods=["POST"], view_func=self.document_handler.reindex_document)
         bp.add_url_rule("/datasets/<uuid:dataset_id>/documents/<uuid:document_id>/delete", methods=["POST"], view_func=self.document_handler.delete_document)
         bp.add_url_rule("/datasets/<uuid:dataset_id>/documents/<uuid:document_id>/segments", view_func=self.segment_handler.get_segments_with_page)
         bp.add_url_rule("/datasets/<uuid:dataset_id>/documents/<uuid:document_id>/segments/<uuid:segment_id>", view_func=self.segment_handler.get_segment)
@@ -118,6 +119,7 @@ class Router:
         bp.add_url_rule("/datasets/<uuid:dataset_id>/documents/<uuid:document_id>/segments/<uuid:segment_id>", methods=["POST"], view_func=self.segment_handler.update_segment)
         bp.add_url_rule("/datasets/<uuid:dataset_id>/hit", methods=["POST"], view_func=self.dataset_handler.hit)
         bp.add_url_rule("/datasets/<uuid:dataset_id>/queries", view_func=self.dataset_handler.get_dataset_queries)
+        bp.add_url_rule("/datasets/<uuid:dataset_id>/retrieval-cache", view_func=self.dataset_handler.get_retrieval_cache_stats)
 
         # 授权认证模块
         bp.add_url_rule("/oauth/<string:provider_name>", view_func=self.oauth_handler.provider)
@@ -91,6 +91,27 @@ class CreateDocumentReq(FlaskForm):
                 }
             }
 
+class ReindexDocumentReq(FlaskForm):
+    """重建文档索引请求, 可以重新上传文件或修改处理规则"""
+    upload_file_id = StringField("upload_file_id", default="", validators=[
+        Optional(),
+    ])
+    process_type = StringField("process_type", validators=[
+        DataRequired("文档处理类型不能为空"),
+        AnyOf(values=[ProcessType.AUTOMATIC, ProcessType.CUSTOM], message="处理类型格式错误")
+    ])
+    rule = DictField("rule")
+
+    def validate_upload_file_id(self, field: StringField) -> None:
+        """校验重新上传的文件id"""
+        if field.data:
+            try:
+                uuid.UUID(field.data)
+            except Exception as e:
+                raise ValidationError("文件id的格式必须是UUID")
+
+    validate_rule = CreateDocumentReq.validate_rule
+
 class UpdateDocumentNameReq(FlaskForm):
     """更新文档名称/基础信息请求"""
     name = StringField("name", validators=[
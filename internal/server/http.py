@@ -1,5 +1,7 @@
+import gc
 import logging
 import os
+from celery.signals import worker_process_init
 from flask import Flask
 from flask_cors import CORS
 from flask_migrate import Migrate
@@ -8,6 +10,7 @@ from internal.router import Router
 from config import Config
 from internal.exception import CustomException
 from internal.extension import logging_extension, redis_extension, celery_extension
+from internal.lib import jieba_worker
 from internal.middleware import Middleware
 from pkg.response import json, Response, HttpCode
 from pkg.sqlalchemy import SQLAlchemy
@@ -52,6 +55,17 @@ class Http(Flask):
         # 注册应用中间件
         login_manager.request_loader(middleware.request_loader)
 
+    def preload(self):
+        """在fork工作进程前预热jieba词典与停用词并冻结GC, 子进程扫描已加载对象时不会触发写时复制,
+        需要在应用构建完成后由gunicorn预加载或celery主进程调用"""
+        jieba_worker.warm_up(self.config.get("JIEBA_CACHE_FILE"))
+        worker_process_init.connect(self._warm_up_worker_process, weak=False)
+        gc.freeze()
+
+    def _warm_up_worker_process(self, **kwargs):
+        """celery工作进程启动时预热jieba, 从已预热的主进程fork出来时不会重复加载"""
+        jieba_worker.warm_up(self.config.get("JIEBA_CACHE_FILE"))
+
     def _register_error_handler(self, error: Exception):
         logging.error("An error occurred: %s", error, exc_info=True)
         # 异常信息是不是我们的自定义异常, 如果是可以提取message和code等信息
@@ -7,12 +7,15 @@ from .cos_service import CosService
 from .upload_file_service import UploadFileService
 from .dataset_service import DatasetService
 from .embeddings_service import EmbeddingsService
+from .token_count_service import TokenCountService
 from .jieba_service import JiebaService
 from .document_service import DocumentService
+from .disabled_document_service import DisabledDocumentService
 from .indexing_service import IndexService
 from .process_rule_service import ProcessRuleService
 from .keyword_table_service import KeywordTableService
 from .segment_service import SegmentService
+from .retrieval_cache_service import RetrievalCacheService
 from .retriever_service import RetrievalService
 from .conversation_service import ConversationService
 from .jwt_service import JwtService
@@ -40,12 +43,15 @@ __all__ = [
     'UploadFileService',
     'DatasetService',
     'EmbeddingsService',
+    'TokenCountService',
     'JiebaService',
     'DocumentService',
+    'DisabledDocumentService',
     'IndexService',
     'ProcessRuleService',
     'KeywordTableService',
     'SegmentService',
+    'RetrievalCacheService',
     'RetrievalService',
     'ConversationService',
     'JwtService',
@@ -1,5 +1,6 @@
 from typing import Any, Optional
 
+from sqlalchemy import insert
 from pkg.sqlalchemy import SQLAlchemy
 from internal.exception import FailException
 
@@ -15,6 +16,19 @@ class BaseService:
             self.db.session.add(model_instance)
         return model_instance
 
+    def create_many(self, model: Any, rows: list[dict], returning: list[Any] = None) -> list[Any]:
+        """根据传递的模型类+键值对列表在一个事务内批量创建数据库记录, 并按传入顺序返回指定的字段"""
+        if not rows:
+            return []
+
+        with self.db.auto_commit():
+            stmt = insert(model)
+            if returning:
+                stmt = stmt.returning(*returning, sort_by_parameter_order=True)
+            result = self.db.session.execute(stmt, rows)
+            records = result.all() if returning else []
+        return records
+
     def delete(self, model_instance: Any) -> Any:
         """根据传递的模型实例删除数据库记录"""
         with self.db.auto_commit():
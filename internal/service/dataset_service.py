@@ -4,6 +4,7 @@ from injector import inject
 from dataclasses import dataclass
 from .base_service import BaseService
 from .retriever_service import RetrievalService
+from .retrieval_cache_service import RetrievalCacheService
 from pkg.sqlalchemy import SQLAlchemy
 from internal.schema.dataset_schema import (
     CreateDatasetReq,
@@ -24,6 +25,7 @@ from sqlalchemy import desc
 class DatasetService(BaseService):
     db: SQLAlchemy
     retrieval_service: RetrievalService
+    retrieval_cache_service: RetrievalCacheService
 
     def create_dataset(self, req: CreateDatasetReq, account: Account) -> Dataset:
         """根据传递的请求信息创建知识库"""
@@ -154,6 +156,14 @@ class DatasetService(BaseService):
 
         return dataset_queries
 
+    def get_retrieval_cache_stats(self, dataset_id: UUID, account: Account) -> dict:
+        """根据传递的知识库id获取检索结果缓存的命中统计"""
+        dataset = self.get(Dataset, dataset_id)
+        if dataset is None or dataset.account_id != account.id:
+            raise NotFoundException("该知识库不存在")
+
+        return self.retrieval_cache_service.get_cache_stats(dataset_id)
+
     def delete_dataset(self, dataset_id: UUID, account: Account) -> Dataset:
         """根据传递的信息删除指定知识库"""
         dataset = self.get(Dataset, dataset_id)
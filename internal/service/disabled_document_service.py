@@ -0,0 +1,73 @@
+import json
+from uuid import UUID
+
+from flask import current_app
+from injector import inject
+from dataclasses import dataclass
+from redis import Redis
+from sqlalchemy import func
+
+from .base_service import BaseService
+from pkg.sqlalchemy import SQLAlchemy
+from internal.model import Document
+from internal.entity.cache_entity import CACHE_DISABLED_DOCUMENTS, CACHE_DISABLED_DOCUMENTS_VERSION
+from internal.entity.dataset_entity import DocumentEnabledMode
+
+
+@inject
+@dataclass
+class DisabledDocumentService(BaseService):
+    """禁用文档服务, 查询时排除模式下文档的启用状态只存储在Postgres中,
+    检索时通过缓存的禁用文档id集合排除对应文档, 切换文档启用状态只需要一次更新加一次版本递增"""
+    db: SQLAlchemy
+    redis_client: Redis
+
+    @classmethod
+    def is_exclusion_mode(cls) -> bool:
+        """判断当前是否使用查询时排除禁用文档的模式"""
+        return current_app.config.get("DOCUMENT_ENABLED_MODE") == DocumentEnabledMode.EXCLUSION
+
+    def get_disabled_document_ids(self, dataset_ids: list[UUID]) -> list[str]:
+        """获取知识库列表下所有禁用文档的id, 优先读取当前版本号下的缓存, 未命中的知识库统一从数据库加载"""
+        dataset_ids = list(dict.fromkeys(str(dataset_id) for dataset_id in dataset_ids))
+        if not dataset_ids:
+            return []
+
+        # 1.先读取版本号再读取数据, 加载期间发生的变更会递增版本号, 写入旧版本号的缓存不会再被读取
+        versions = [int(version or 0) for version in self.redis_client.mget([
+            CACHE_DISABLED_DOCUMENTS_VERSION.format(dataset_id=dataset_id) for dataset_id in dataset_ids
+        ])]
+        keys = [
+            CACHE_DISABLED_DOCUMENTS.format(dataset_id=dataset_id, version=version)
+            for dataset_id, version in zip(dataset_ids, versions)
+        ]
+        disabled_document_ids = {
+            dataset_id: json.loads(value)
+            for dataset_id, value in zip(dataset_ids, self.redis_client.mget(keys)) if value is not None
+        }
+
+        # 2.一次查询加载所有未命中缓存的知识库并回写缓存
+        missing_dataset_ids = [dataset_id for dataset_id in dataset_ids if dataset_id not in disabled_document_ids]
+        if missing_dataset_ids:
+            rows = self.db.session.query(
+                Document.dataset_id,
+                func.array_agg(Document.id),
+            ).filter(
+                Document.dataset_id.in_(missing_dataset_ids),
+                Document.enabled == False,
+            ).group_by(Document.dataset_id).all()
+            loaded = {str(dataset_id): [str(id) for id in ids] for dataset_id, ids in rows}
+
+            expire = current_app.config.get("DISABLED_DOCUMENTS_CACHE_EXPIRE")
+            with self.redis_client.pipeline(transaction=False) as pipeline:
+                for dataset_id, key in zip(dataset_ids, keys):
+                    if dataset_id in missing_dataset_ids:
+                        disabled_document_ids[dataset_id] = loaded.get(dataset_id, [])
+                        pipeline.setex(key, expire, json.dumps(disabled_document_ids[dataset_id]))
+                pipeline.execute()
+
+        return [id for dataset_id in dataset_ids for id in disabled_document_ids[dataset_id]]
+
+    def bump_disabled_documents_version(self, dataset_id: UUID) -> None:
+        """递增知识库禁用文档集合的版本号, 使缓存失效"""
+        self.redis_client.incr(CACHE_DISABLED_DOCUMENTS_VERSION.format(dataset_id=dataset_id))
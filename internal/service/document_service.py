@@ -14,10 +14,12 @@ from internal.model import Document, Dataset, UploadFile, ProcessRule, Segment,
 from internal.exception import ForbiddenException, FailException, NotFoundException
 from internal.entity.upload_file_entity import ALLOWED_DOCUMENT_EXTENSION
 from internal.entity.cache_entity import LOCK_EXPIRE_TIME, LOCK_DOCUMENT_UPDATED_ENABLED
-from internal.task.document_task import build_documents, update_document_enabled, delete_document
+from internal.task.document_task import build_documents, reindex_documents, update_document_enabled, delete_document
 from internal.lib.helper import datetime_to_timestamp
 from internal.schema.document_schema import GetDocumentsWithPageReq
 from redis import Redis
+from .disabled_document_service import DisabledDocumentService
+from .retrieval_cache_service import RetrievalCacheService
 
 @inject
 @dataclass
@@ -25,6 +27,8 @@ class DocumentService(BaseService):
     """文档服务"""
     db: SQLAlchemy
     redis_client: Redis
+    disabled_document_service: DisabledDocumentService
+    retrieval_cache_service: RetrievalCacheService
 
     def create_documents(
             self,
@@ -155,6 +159,59 @@ class DocumentService(BaseService):
 
         return self.update(document, **kwargs)
 
+    def reindex_document(
+            self,
+            dataset_id: UUID,
+            document_id: UUID,
+            upload_file_id: str = "",
+            process_type: str = ProcessType.AUTOMATIC,
+            rule: dict = None,
+            account: Account = None
+    ) -> Document:
+        """根据传递的知识库id+文档id重新上传文件或修改处理规则, 并调用异步任务增量重建索引"""
+        document = self.get(Document, document_id)
+        if document is None:
+            raise NotFoundException("该文档不存在")
+
+        if document.dataset_id != dataset_id or document.account_id != account.id:
+            raise ForbiddenException("当前用户无权限修改该文档, 请核实后重试")
+
+        if document.status not in [DocumentStatus.COMPLETED, DocumentStatus.ERROR]:
+            raise ForbiddenException("当前文档处于不可修改状态, 请稍后重试")
+
+        # 重新上传文件时校验文件归属与扩展名, 文档名称同步为新文件名称
+        kwargs = {}
+        if upload_file_id:
+            upload_file = self.get(UploadFile, upload_file_id)
+            if (
+                    upload_file is None
+                    or upload_file.account_id != account.id
+                    or upload_file.extension.lower() not in ALLOWED_DOCUMENT_EXTENSION
+            ):
+                raise FailException("暂未解析到合法文件")
+            kwargs = {"upload_file_id": upload_file.id, "name": upload_file.name}
+
+        process_rule = self.create(
+            ProcessRule,
+            account_id=account.id,
+            dataset_id=dataset_id,
+            mode=process_type,
+            rule=rule,
+        )
+
+        self.update(
+            document,
+            process_rule_id=process_rule.id,
+            status=DocumentStatus.WAITING,
+            error="",
+            **kwargs,
+        )
+
+        # 调用异步任务完成增量重建
+        reindex_documents.delay([document.id])
+
+        return document
+
     def update_document_enabled(
             self,
             dataset_id: UUID,
@@ -162,7 +219,8 @@ class DocumentService(BaseService):
             enabled: bool,
             account: Account
     ) -> Document:
-        """根据传递的知识库id+文档id, 更新文档启用状态, 同时会异步更新weaviate向量数据库中的数据"""
+        """根据传递的知识库id+文档id, 更新文档启用状态, 同时会异步更新向量数据库中的数据,
+        查询时排除模式下只更新文档记录并使禁用文档集合缓存失效"""
         document = self.get(Document, document_id)
         if document is None:
             raise NotFoundException("该文档不存在")
@@ -188,6 +246,11 @@ class DocumentService(BaseService):
             disabled_at=None if enabled else datetime.now(),
         )
 
+        if self.disabled_document_service.is_exclusion_mode():
+            self.disabled_document_service.bump_disabled_documents_version(dataset_id)
+            self.retrieval_cache_service.bump_dataset_versions([dataset_id])
+            return document
+
         self.redis_client.setex(cached_key, LOCK_EXPIRE_TIME, 1)
 
         # 启用异步任务
@@ -196,7 +259,7 @@ class DocumentService(BaseService):
         return document
 
     def delete_document(self, dataset_id: UUID, document_id: UUID, account: Account) -> Document:
-        """根据传递的知识库id+文档id删除指定的文档信息, 包含文档片段删除、关键词表更新、weaviate向量数据库中的数据删除"""
+        """根据传递的知识库id+文档id删除指定的文档信息, 包含文档片段删除、关键词表更新、向量数据库中的数据删除"""
         document = self.get(Document, document_id)
         if document is None:
             raise NotFoundException("该文档不存在")
@@ -208,6 +271,7 @@ class DocumentService(BaseService):
             raise ForbiddenException("当前文档处于不可修改状态, 请稍后重试")
 
         self.delete(document)
+        self.retrieval_cache_service.bump_dataset_versions([dataset_id])
 
         # 调用异步任务
         delete_document.delay(dataset_id, document_id)
@@ -1,4 +1,9 @@
 import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from flask import current_app
 from injector import inject
 from dataclasses import dataclass
 
@@ -8,41 +13,140 @@ from langchain.embeddings import CacheBackedEmbeddings
 from langchain_huggingface import HuggingFaceEmbeddings
 
 from redis import Redis
-import tiktoken
+import numpy as np
 from transformers import logging
+from internal.entity.cache_entity import CACHE_EMBEDDING_VECTOR, CACHE_QUERY_EMBEDDING_VECTOR
+from internal.lib.helper import generate_text_hash
+from .token_count_service import TokenCountService
 
 logging.set_verbosity_error()
 
+# 文本嵌入模型名称, 同时作为片段与query向量缓存键的一部分, 更换模型后旧缓存自动失效
+EMBEDDING_MODEL_NAME = "Alibaba-NLP/gte-multilingual-base"
+
+# 进程内共享的文本嵌入模型, 首次使用时加载, fork出的子进程直接复用父进程已加载的只读权重
+_embedding_model: Optional[Embeddings] = None
+_embedding_model_lock = threading.Lock()
+
+# 进程内query向量缓存, 键为query向量缓存键, 值为float16向量字节
+_query_cache: OrderedDict[str, bytes] = OrderedDict()
+_query_cache_lock = threading.Lock()
+_query_cache_info = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+
+
+def _reset_locks_after_fork() -> None:
+    """fork后在子进程中重建锁, 避免继承父进程中被其他线程持有的锁"""
+    global _embedding_model_lock, _query_cache_lock
+    _embedding_model_lock = threading.Lock()
+    _query_cache_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
 @inject
 @dataclass
 class EmbeddingsService:
     """文本嵌入模型服务"""
     _store: RedisStore
-    _embeddings: Embeddings
-    _cached_backed_embeddings: CacheBackedEmbeddings
+    _redis: Redis
 
     def __init__(self, redis: Redis):
-        """初始化文本嵌入模型客户端、存储器、缓存客户端"""
+        """初始化存储器与缓存客户端, 文本嵌入模型在进程内共享, 首次使用时才加载"""
+        self._redis = redis
         self._store = RedisStore(client=redis)
-        self._embeddings = HuggingFaceEmbeddings(
-            model_name="Alibaba-NLP/gte-multilingual-base",
-            cache_folder=os.path.join(os.getcwd(), "internal", "core", "embeddings"),
-            model_kwargs={
-                "trust_remote_code": True
-            }
-        )
-        #self._embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        self._cached_backed_embeddings = CacheBackedEmbeddings.from_bytes_store(
-            self._embeddings,
-            self._store,
-            namespace="embeddings"
-        )
+
+    @classmethod
+    def get_embedding_model(cls) -> Embeddings:
+        """获取进程内共享的文本嵌入模型, 整个进程只会加载一次, 加载完成后直接返回不再加锁"""
+        global _embedding_model
+        if _embedding_model is not None:
+            return _embedding_model
+
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                _embedding_model = HuggingFaceEmbeddings(
+                    model_name=EMBEDDING_MODEL_NAME,
+                    cache_folder=os.path.join(os.getcwd(), "internal", "core", "embeddings"),
+                    model_kwargs={
+                        "trust_remote_code": True
+                    }
+                )
+                # _embedding_model = OpenAIEmbeddings(model="text-embedding-3-small")
+            return _embedding_model
 
     @classmethod
     def calculate_token_count(cls, query: str) -> int:
         """计算传入文本的token数"""
-        encoding = tiktoken.encoding_for_model("gpt-3.5")
-        return len(encoding.encode(query))
+        return TokenCountService.calculate_token_count(query)
+
+    def embed_documents_with_cache(self, texts: list[str], hashes: list[str]) -> list[list[float]]:
+        """根据传递的文本+内容哈希列表计算向量, 已缓存的向量直接复用, 未缓存的文本去重后一次性批量计算"""
+        keys = [CACHE_EMBEDDING_VECTOR.format(model=EMBEDDING_MODEL_NAME, hash=hash) for hash in hashes]
+        cached_vectors = self._redis.mget(keys)
+
+        # 1.提取未命中缓存的文本, 相同哈希的文本只计算一次
+        missing_texts = {}
+        for text, key, cached_vector in zip(texts, keys, cached_vectors):
+            if cached_vector is None and key not in missing_texts:
+                missing_texts[key] = text
+
+        # 2.一次性将未命中的文本交给嵌入模型, 让模型以较大的批次完成计算并回写缓存(携带过期时间)
+        computed_vectors = {}
+        if missing_texts:
+            vectors = self.embeddings.embed_documents(list(missing_texts.values()))
+            computed_vectors = dict(zip(missing_texts.keys(), vectors))
+            expire = current_app.config.get("EMBEDDING_CACHE_EXPIRE")
+            with self._redis.pipeline(transaction=False) as pipeline:
+                for key, vector in computed_vectors.items():
+                    pipeline.set(key, np.asarray(vector, dtype=np.float32).tobytes(), ex=expire)
+                pipeline.execute()
+
+        return [
+            computed_vectors[key] if cached_vector is None else np.frombuffer(cached_vector, dtype=np.float32).tolist()
+            for key, cached_vector in zip(keys, cached_vectors)
+        ]
+
+    def embed_query(self, query: str) -> list[float]:
+        """计算query的向量, 依次查询进程内缓存与redis缓存, 均未命中时才调用嵌入模型并回写两级缓存"""
+        query = " ".join(query.split())
+        key = CACHE_QUERY_EMBEDDING_VECTOR.format(model=EMBEDDING_MODEL_NAME, hash=generate_text_hash(query))
+
+        # 1.查询进程内缓存
+        with _query_cache_lock:
+            cached_vector = _query_cache.get(key)
+            if cached_vector is not None:
+                _query_cache.move_to_end(key)
+                _query_cache_info["local_hits"] += 1
+                return np.frombuffer(cached_vector, dtype=np.float16).astype(np.float32).tolist()
+
+        # 2.查询redis缓存, 未命中时调用嵌入模型计算并回写redis
+        cached_vector = self._redis.get(key)
+        if cached_vector is not None:
+            self._update_query_cache_info("redis_hits")
+        else:
+            self._update_query_cache_info("misses")
+            cached_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float16).tobytes()
+            self._redis.set(key, cached_vector, ex=current_app.config.get("QUERY_EMBEDDING_CACHE_EXPIRE"))
+
+        # 3.回写进程内缓存, 超出上限时淘汰最久未使用的向量
+        with _query_cache_lock:
+            _query_cache[key] = cached_vector
+            _query_cache.move_to_end(key)
+            while len(_query_cache) > current_app.config.get("QUERY_EMBEDDING_CACHE_MAX_SIZE"):
+                _query_cache.popitem(last=False)
+
+        return np.frombuffer(cached_vector, dtype=np.float16).astype(np.float32).tolist()
+
+    @classmethod
+    def get_query_cache_info(cls) -> dict:
+        """获取当前进程query向量缓存的命中统计"""
+        with _query_cache_lock:
+            return {**_query_cache_info, "size": len(_query_cache)}
+
+    @classmethod
+    def _update_query_cache_info(cls, name: str) -> None:
+        with _query_cache_lock:
+            _query_cache_info[name] += 1
 
     @property
     def store(self) -> RedisStore:
@@ -50,8 +154,12 @@ class EmbeddingsService:
 
     @property
     def embeddings(self) -> Embeddings:
-        return self._embeddings
+        return self.get_embedding_model()
 
     @property
     def cache_backed_embedding(self) -> CacheBackedEmbeddings:
-        return self._cached_backed_embeddings
\ No newline at end of file
+        return CacheBackedEmbeddings.from_bytes_store(
+            self.embeddings,
+            self._store,
+            namespace="embeddings"
+        )
\ No newline at end of file
@@ -1,7 +1,11 @@
 import uuid
-from datetime import datetime
-import re
+import time
+from datetime import datetime, timedelta
 import logging
+from itertools import islice
+from queue import Queue
+from threading import Event, Lock, Thread
+from typing import Any, Callable
 from uuid import UUID
 from flask import Flask, current_app
 from injector import inject
@@ -9,20 +13,28 @@ from dataclasses import dataclass
 from concurrent.futures import ThreadPoolExecutor
 from .base_service import BaseService
 from pkg.sqlalchemy import SQLAlchemy
-from internal.model import Document, Segment, KeywordTable, DatasetQuery, ProcessRule
+from internal.model import Document, Segment, KeywordTable, KeywordSegment, KeywordPosting, DatasetQuery, ProcessRule, UploadFile
 from internal.entity.dataset_entity import DocumentStatus, SegmentStatus
+from internal.exception import FailException
 from langchain_core.documents import Document as LCDocument
 from internal.core.file_extractor import FileExtractor
-from internal.entity.cache_entity import LOCK_DOCUMENT_UPDATED_ENABLED
+from internal.entity.cache_entity import (
+    LOCK_DOCUMENT_UPDATED_ENABLED,
+    LOCK_DOCUMENT_INDEXING,
+    CACHE_SEARCH_VECTOR_SYNCED_BACKEND,
+)
+from internal.task.document_task import resume_documents
 
 from .process_rule_service import ProcessRuleService
 from .embeddings_service import EmbeddingsService
-from sqlalchemy import func
+from .token_count_service import TokenCountService
+from sqlalchemy import func, update
 from internal.lib.helper import generate_text_hash
 from .jieba_service import JiebaService
 from .keyword_table_service import KeywordTableService
 from .vector_database_service import VectorDatabaseService
-from weaviate.classes.query import Filter
+from .disabled_document_service import DisabledDocumentService
+from .retrieval_cache_service import RetrievalCacheService
 from redis import Redis
 
 @inject
@@ -33,45 +45,241 @@ class IndexService(BaseService):
     file_extractor: FileExtractor
     process_rule_service: ProcessRuleService
     embedding_service: EmbeddingsService
+    token_count_service: TokenCountService
     jieba_service: JiebaService
     keyword_table_service: KeywordTableService
     vector_database_service: VectorDatabaseService
+    retrieval_cache_service: RetrievalCacheService
+    disabled_document_service: DisabledDocumentService
     redis_client: Redis
 
     def build_documents(self, document_ids: list[UUID]) -> None:
         """根据传递的文档id列表构建知识库文档, 涵盖了加载、分割、索引构建、数据库储存等"""
-        documents = self.db.session.query(Document).filter(
-            Document.id.in_(document_ids)
-        ).all()
+        document_ids = self._acquire_waiting_documents(document_ids)
+
+        # 超过阈值的大文件使用流式构建, 按窗口逐批完成加载、分割、索引与存储, 内存占用只与窗口大小相关
+        streaming_file_size = current_app.config.get("INDEXING_STREAMING_FILE_SIZE")
+        streaming_document_ids = [
+            id for id, in self.db.session.query(Document).with_entities(Document.id).join(
+                UploadFile, Document.upload_file_id == UploadFile.id,
+            ).filter(
+                Document.id.in_(document_ids),
+                UploadFile.size > streaming_file_size,
+            ).all()
+        ]
+        document_ids = [id for id in document_ids if id not in streaming_document_ids]
 
-        for document in documents:
-            try:
-                # 更新当前状态为解析中, 并记录开始处理时间
-                self.update(document, status=DocumentStatus.PARSING, processing_started_at=datetime.now())
+        # 流式构建的文档与普通文档同时构建, 流式构建的并发数单独配置
+        flask_app = current_app._get_current_object()
 
-                # 执行文档加载步骤, 并更新文档的状态与时间
-                lc_documents = self._parsing(document)
+        def streaming_func() -> None:
+            with flask_app.app_context():
+                self._run_pipeline(
+                    streaming_document_ids,
+                    [(self._streaming, flask_app.config.get("INDEXING_STREAMING_CONCURRENCY"))],
+                )
 
-                # 执行文档分割步骤, 并更新文档状态与时间, 涵盖了片段的信息
-                lc_segments = self._splitting(document, lc_documents)
+        streaming_thread = Thread(target=streaming_func)
+        streaming_thread.start()
+
+        # 各阶段以流水线方式执行, 前一个文档在向量化时后一个文档已经可以开始解析
+        self._run_pipeline(document_ids, [
+            # 执行文档加载步骤, 并更新文档的状态与时间
+            (lambda document, _: self._parsing(document), current_app.config.get("INDEXING_PARSE_CONCURRENCY")),
+            # 执行文档分割步骤, 并更新文档状态与时间, 涵盖了片段的信息
+            (self._splitting, current_app.config.get("INDEXING_SPLIT_CONCURRENCY")),
+            # 执行文档索引构建, 涵盖了关键词提取、并更新数据状态
+            (self._indexing, current_app.config.get("INDEXING_INDEX_CONCURRENCY")),
+            # 存储操作, 涵盖了文档状态更新, 以及向量数据库的存储
+            (self._completed, current_app.config.get("INDEXING_STORE_CONCURRENCY")),
+        ])
+        streaming_thread.join()
+
+    def reindex_documents(self, document_ids: list[UUID]) -> None:
+        """根据传递的文档id列表增量重建文档索引, 仅对新增或变化的片段执行关键词提取与向量化"""
+        document_ids = self._acquire_waiting_documents(document_ids)
+
+        self._run_pipeline(document_ids, self._get_reindex_stages())
+
+    def resume_documents(self, document_ids: list[UUID]) -> None:
+        """根据传递的文档id列表从最后完成的阶段继续构建文档, 已完成的解析、分割与向量化不会重复执行"""
+        documents = self.db.session.query(Document).filter(
+            Document.id.in_(document_ids),
+            Document.status.in_([
+                DocumentStatus.WAITING,
+                DocumentStatus.PARSING,
+                DocumentStatus.SPLITTING,
+                DocumentStatus.INDEXING,
+            ]),
+        ).order_by(Document.position).all()
+
+        # 1.本轮分割已经完成的文档, 片段已全部落库, 只需要继续处理等待中与索引中的片段
+        indexing_document_ids = [
+            document.id for document in documents
+            if document.status == DocumentStatus.INDEXING
+               and document.processing_started_at is not None
+               and document.splitting_completed_at is not None
+               and document.splitting_completed_at >= document.processing_started_at
+        ]
+        self._run_pipeline(indexing_document_ids, [
+            (self._resume_indexing, current_app.config.get("INDEXING_INDEX_CONCURRENCY")),
+            (self._reindex_completed, current_app.config.get("INDEXING_STORE_CONCURRENCY")),
+        ])
+
+        # 2.解析或分割未完成的文档无法还原中间结果, 重新解析后按片段哈希复用已经完成的片段
+        self._run_pipeline(
+            [document.id for document in documents if document.id not in indexing_document_ids],
+            self._get_reindex_stages(),
+        )
 
-                # 执行文档索引构建, 涵盖了关键词提取、并更新数据状态
-                self._indexing(document, lc_segments)
+    def resume_stalled_documents(self) -> list[UUID]:
+        """检测长时间没有进度的构建中文档, 并投递异步任务从最后完成的阶段继续构建,
+        构建任务消息丢失或进入第一个阶段前中断时文档会停留在等待状态, 同样需要继续构建"""
+        stalled_timeout = current_app.config.get("INDEXING_STALLED_TIMEOUT")
+        documents = self.db.session.query(Document).with_entities(Document.id).filter(
+            Document.status.in_([
+                DocumentStatus.WAITING,
+                DocumentStatus.PARSING,
+                DocumentStatus.SPLITTING,
+                DocumentStatus.INDEXING,
+            ]),
+            Document.updated_at < datetime.now() - timedelta(seconds=stalled_timeout),
+        ).all()
 
-                # 存储操作, 涵盖了文档状态更新, 以及向量数据库的存储
-                self._completed(document, lc_segments)
+        # 构建中的文档会持续续期构建锁, 只有抢到锁的文档才是真正中断的文档
+        document_ids = [
+            id for id, in documents
+            if self.redis_client.set(LOCK_DOCUMENT_INDEXING.format(document_id=id), 1, ex=stalled_timeout, nx=True)
+        ]
+        if document_ids:
+            logging.warning(f"检测到中断的文档构建任务, 文档id列表: {document_ids}")
+            resume_documents.delay(document_ids)
+
+        return document_ids
+
+    def _get_reindex_stages(self) -> list[tuple[Callable[[Document, Any], Any], int]]:
+        """获取增量重建的流水线阶段, 被用户禁用的文档在重建后保持禁用, 其新增片段不写入关键词表(查询时排除模式下照常写入)"""
+        exclusion_mode = DisabledDocumentService.is_exclusion_mode()
+        return [
+            (lambda document, _: self._parsing(document), current_app.config.get("INDEXING_PARSE_CONCURRENCY")),
+            (self._diff_splitting, current_app.config.get("INDEXING_SPLIT_CONCURRENCY")),
+            (
+                lambda document, lc_segments: self._indexing(
+                    document,
+                    lc_segments,
+                    document.disabled_at is None or exclusion_mode,
+                ),
+                current_app.config.get("INDEXING_INDEX_CONCURRENCY"),
+            ),
+            (self._reindex_completed, current_app.config.get("INDEXING_STORE_CONCURRENCY")),
+        ]
 
-            except Exception as e:
-                logging.exception(f"构建文档发生错误, 错误信息: {str(e)}")
+    def _run_pipeline(
+            self,
+            document_ids: list[UUID],
+            stages: list[tuple[Callable[[Document, Any], Any], int]],
+    ) -> None:
+        """以多阶段流水线的方式处理文档, 阶段之间使用有界队列连接, 每个阶段可以配置独立的并发数,
+        流水线执行期间由心跳线程定期为未结束的文档续期构建锁, 单个阶段耗时超过中断超时时间也不会被视为中断"""
+        flask_app = current_app._get_current_object()
+        queue_size = current_app.config.get("INDEXING_QUEUE_SIZE")
+        queues = [Queue()] + [Queue(maxsize=queue_size) for _ in stages[1:]]
+        pending_document_ids = set(document_ids)
+        pending_lock = Lock()
+        stop_event = Event()
+
+        def finish_document(document_id: UUID) -> None:
+            """文档构建结束或出错后不再需要心跳续期"""
+            with pending_lock:
+                pending_document_ids.discard(document_id)
+
+        def heartbeat_func() -> None:
+            """心跳线程函数, 每隔中断超时时间的三分之一为未结束的文档续期构建锁并刷新更新时间"""
+            heartbeat_interval = flask_app.config.get("INDEXING_STALLED_TIMEOUT") / 3
+            with flask_app.app_context():
+                while not stop_event.wait(heartbeat_interval):
+                    with pending_lock:
+                        heartbeat_document_ids = list(pending_document_ids)
+                    if heartbeat_document_ids:
+                        self._heartbeat(heartbeat_document_ids)
+
+        def thread_func(stage_index: int) -> None:
+            """阶段线程函数, 从当前阶段队列中取出文档处理, 并将结果交给下一个阶段"""
+            stage_func = stages[stage_index][0]
+            with flask_app.app_context():
+                while True:
+                    item = queues[stage_index].get()
+                    if item is None:
+                        break
+
+                    document_id, payload = item
+                    try:
+                        document = self.get(Document, document_id)
+                        if document is None:
+                            raise FailException("文档不存在或已被删除")
+                        self._renew_indexing_lock([document_id])
+                        payload = stage_func(document, payload)
+                    except Exception as e:
+                        logging.exception(f"构建文档发生错误, 文档id: {document_id}, 错误信息: {str(e)}")
+                        finish_document(document_id)
+                        self._mark_document_error(document_id, e)
+                        continue
+
+                    if stage_index + 1 < len(stages):
+                        queues[stage_index + 1].put((document_id, payload))
+                        continue
+
+                    finish_document(document_id)
+                    try:
+                        self.redis_client.delete(LOCK_DOCUMENT_INDEXING.format(document_id=document_id))
+                        self.retrieval_cache_service.bump_dataset_versions([document.dataset_id])
+                    except Exception as e:
+                        logging.exception(f"释放文档构建锁失败, 文档id: {document_id}, 错误信息: {str(e)}")
+
+        self._renew_indexing_lock(document_ids)
+        for document_id in document_ids:
+            queues[0].put((document_id, None))
+        heartbeat_thread = Thread(target=heartbeat_func, daemon=True)
+        heartbeat_thread.start()
+
+        stage_threads = []
+        for stage_index, (_, concurrency) in enumerate(stages):
+            threads = [Thread(target=thread_func, args=(stage_index,)) for _ in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            stage_threads.append(threads)
+
+        # 逐个阶段等待结束, 上一阶段全部结束后再通知下一阶段的线程退出
+        for stage_index, threads in enumerate(stage_threads):
+            for _ in threads:
+                queues[stage_index].put(None)
+            for thread in threads:
+                thread.join()
+        stop_event.set()
+        heartbeat_thread.join()
+
+    def _mark_document_error(self, document_id: UUID, error: Exception) -> None:
+        """将构建失败的文档标记为错误并释放构建锁, 自身出错时只记录日志, 阶段线程退出会导致上游阶段阻塞在有界队列上"""
+        try:
+            # 数据库异常后会话需要先回滚才能继续使用
+            self.db.session.rollback()
+            document = self.get(Document, document_id)
+            if document is not None:
                 self.update(
                     document,
                     status=DocumentStatus.ERROR,
-                    error=str(e),
+                    error=str(error),
                     stopped_at=datetime.now()
                 )
+                self._bump_disabled_documents_version(document.dataset_id)
+                self.retrieval_cache_service.bump_dataset_versions([document.dataset_id])
+            self.redis_client.delete(LOCK_DOCUMENT_INDEXING.format(document_id=document_id))
+        except Exception as e:
+            # 构建锁未释放时会自然过期, 随后由中断检测重新投递构建任务
+            logging.exception(f"记录文档构建错误失败, 文档id: {document_id}, 错误信息: {str(e)}")
 
     def update_document_enabled(self, document_id: UUID) -> None:
-        """根据传递的文档id更新文档状态, 同时修改weaviate向量数据库中的记录"""
+        """根据传递的文档id更新文档状态, 同时修改向量数据库中的记录"""
         cached_key = LOCK_DOCUMENT_UPDATED_ENABLED.format(document_id=document_id)
 
         document = self.get(Document, document_id)
@@ -85,29 +293,32 @@ class IndexService(BaseService):
         node_ids = [node_id for _, node_id, _ in segments]
 
         try:
-            collection = self.vector_database_service.collection
-            for node_id in node_ids:
-                try:
-                    collection.data.update(
-                        uuid=node_id,
-                        properties={
-                            "document_enabled": document.enabled,
-                        }
-                    )
-                except Exception as e:
-                    with self.db.auto_commit():
-                        self.db.session.query(Segment).filter(
-                            Segment.node_id == node_id,
-                        ).update({
-                            "error": str(e),
-                            "status": SegmentStatus.ERROR,
-                            "enabled": False,
-                            "disabled_at": datetime.now(),
-                            "stopped_at": datetime.now()
-                        })
+            errors = self.vector_database_service.update_properties(
+                document.dataset_id,
+                node_ids,
+                {"document_enabled": document.enabled},
+            )
+
+            # 只将更新失败的片段标记为错误, 同一分块失败的片段错误信息相同, 按错误信息分组批量更新
+            failed_node_ids = {}
+            for node_id, error in errors.items():
+                failed_node_ids.setdefault(error, []).append(node_id)
+            with self.db.auto_commit():
+                for error, error_node_ids in failed_node_ids.items():
+                    self.db.session.query(Segment).filter(
+                        Segment.node_id.in_(error_node_ids),
+                    ).update({
+                        "error": error,
+                        "status": SegmentStatus.ERROR,
+                        "enabled": False,
+                        "disabled_at": datetime.now(),
+                        "stopped_at": datetime.now()
+                    }, synchronize_session=False)
 
             if document.enabled:
-                enabled_segment_ids = [id for id, _, enabled in segments if enabled]
+                enabled_segment_ids = [
+                    id for id, node_id, enabled in segments if enabled and str(node_id) not in errors
+                ]
                 self.keyword_table_service.add_keyword_table_from_ids(document.dataset_id, enabled_segment_ids)
             else:
                 self.keyword_table_service.delete_keyword_table_from_ids(document.dataset_id, segment_ids)
@@ -120,7 +331,9 @@ class IndexService(BaseService):
                 enabled=origin_enabled,
                 disabled_at=None if origin_enabled else datetime.now(),
             )
+            self._bump_disabled_documents_version(document.dataset_id)
         finally:
+            self.retrieval_cache_service.bump_dataset_versions([document.dataset_id])
             self.redis_client.delete(cached_key)
 
     def delete_document(self, dataset_id: UUID, document_id: UUID) -> None:
@@ -131,10 +344,7 @@ class IndexService(BaseService):
             ).all()
         ]
 
-        collection = self.vector_database_service.collection
-        collection.data.delete_many(
-            where=Filter.by_property("document_id").equal(document_id),
-        )
+        self.vector_database_service.delete_by_document_id(dataset_id, document_id)
 
         with self.db.auto_commit():
             self.db.session.query(Segment).filter(
@@ -142,6 +352,7 @@ class IndexService(BaseService):
             ).delete()
 
         self.keyword_table_service.delete_keyword_table_from_ids(dataset_id, segment_ids)
+        self.retrieval_cache_service.bump_dataset_versions([dataset_id])
 
     def delete_dataset(self, dataset_id: UUID) -> None:
         """根据传递的知识库id执行删除"""
@@ -159,6 +370,14 @@ class IndexService(BaseService):
                     KeywordTable.dataset_id == dataset_id,
                 ).delete()
 
+                self.db.session.query(KeywordSegment).filter(
+                    KeywordSegment.dataset_id == dataset_id,
+                ).delete()
+
+                self.db.session.query(KeywordPosting).filter(
+                    KeywordPosting.dataset_id == dataset_id,
+                ).delete()
+
                 self.db.session.query(DatasetQuery).filter(
                     DatasetQuery.dataset_id == dataset_id,
                 ).delete()
@@ -167,20 +386,131 @@ class IndexService(BaseService):
                     ProcessRule.dataset_id == dataset_id,
                 ).delete()
 
-            self.vector_database_service.collection.data.delete_many(
-                where=Filter.by_property("dataset_id").equal(str(dataset_id))
-            )
+            self.keyword_table_service.bump_keyword_table_version(dataset_id)
+            self.vector_database_service.delete_by_dataset_id(dataset_id)
+            self.retrieval_cache_service.bump_dataset_versions([dataset_id])
 
         except Exception as e:
             logging.exception("异步删除知识库错误")
 
+    def sync_search_vectors(self) -> None:
+        """全文检索后端切换为Postgres后, 补齐切换前写入的片段的全文检索向量, 每次切换只需要补齐一次"""
+        backend = current_app.config.get("FULL_TEXT_RETRIEVAL_BACKEND")
+        synced_backend = self.redis_client.get(CACHE_SEARCH_VECTOR_SYNCED_BACKEND)
+        if synced_backend is not None and synced_backend.decode() == backend:
+            return
+
+        # 补齐完成后再记录后端, 中途失败时下一次定时任务会继续补齐
+        if self.jieba_service.is_search_vector_enabled():
+            logging.warning("全文检索后端已切换为Postgres, 开始补齐片段的全文检索向量")
+            self.rebuild_search_vectors()
+        self.redis_client.set(CACHE_SEARCH_VECTOR_SYNCED_BACKEND, backend)
+
+    def rebuild_search_vectors(self, batch_size: int = 1000) -> None:
+        """为还没有全文检索向量的片段分批补齐tsvector, 用于启用Postgres全文检索前迁移历史片段"""
+        while True:
+            segments = self.db.session.query(Segment).with_entities(
+                Segment.id, Segment.dataset_id, Segment.content,
+            ).filter(
+                Segment.search_vector.is_(None),
+            ).limit(batch_size).all()
+            if not segments:
+                return
+
+            search_vectors = self.jieba_service.build_search_vectors_batch([content for _, _, content in segments])
+            with self.db.auto_commit():
+                self.db.session.execute(update(Segment), [
+                    {"id": id, "search_vector": search_vector}
+                    for (id, _, _), search_vector in zip(segments, search_vectors)
+                ])
+            self.retrieval_cache_service.bump_dataset_versions({dataset_id for _, dataset_id, _ in segments})
+
+    def _acquire_waiting_documents(self, document_ids: list[UUID]) -> list[UUID]:
+        """筛选出等待构建且抢到构建锁的文档id列表, 已被中断检测接管或已经开始构建的文档不会重复构建"""
+        stalled_timeout = current_app.config.get("INDEXING_STALLED_TIMEOUT")
+        documents = self.db.session.query(Document).with_entities(Document.id).filter(
+            Document.id.in_(document_ids),
+            Document.status == DocumentStatus.WAITING,
+        ).order_by(Document.position).all()
+
+        return [
+            id for id, in documents
+            if self.redis_client.set(LOCK_DOCUMENT_INDEXING.format(document_id=id), 1, ex=stalled_timeout, nx=True)
+        ]
+
+    def _bump_disabled_documents_version(self, dataset_id: UUID) -> None:
+        """查询时排除模式下文档的启用状态只存储在Postgres中, 构建过程修改文档启用状态并提交后需要使禁用文档集合缓存失效,
+        否则构建期间缓存的禁用文档id会让刚完成构建的文档在缓存过期前一直被排除"""
+        if DisabledDocumentService.is_exclusion_mode():
+            self.disabled_document_service.bump_disabled_documents_version(dataset_id)
+
+    def _renew_indexing_lock(self, document_ids: list[Any]) -> None:
+        """为构建中的文档续期构建锁, 锁过期且文档长时间没有进度时会被视为中断"""
+        stalled_timeout = current_app.config.get("INDEXING_STALLED_TIMEOUT")
+        with self.redis_client.pipeline() as pipe:
+            for document_id in document_ids:
+                pipe.set(LOCK_DOCUMENT_INDEXING.format(document_id=document_id), 1, ex=stalled_timeout)
+            pipe.execute()
+
+    def _heartbeat(self, document_ids: list[UUID]) -> None:
+        """为构建中的文档续期构建锁并刷新更新时间, 心跳失败只记录日志, 不影响文档构建"""
+        try:
+            self._renew_indexing_lock(document_ids)
+        except Exception as e:
+            logging.exception(f"续期文档构建锁失败, 文档id列表: {document_ids}, 错误信息: {str(e)}")
+
+        try:
+            with self.db.auto_commit():
+                self.db.session.execute(
+                    update(Document).where(Document.id.in_(document_ids)).values(updated_at=datetime.now())
+                )
+        except Exception as e:
+            logging.exception(f"刷新文档更新时间失败, 文档id列表: {document_ids}, 错误信息: {str(e)}")
+
+    def _resume_indexing(self, document: Document, _: Any = None) -> list[LCDocument]:
+        """从数据库中恢复文档未完成的片段, 对等待中的片段补齐关键词索引, 并返回所有待存储的片段"""
+        def load_lc_segments(statuses: list[str]) -> list[LCDocument]:
+            segments = self.db.session.query(Segment).with_entities(
+                Segment.id, Segment.node_id, Segment.content,
+            ).filter(
+                Segment.document_id == document.id,
+                Segment.status.in_(statuses),
+            ).order_by(Segment.position).all()
+
+            return [LCDocument(
+                page_content=content,
+                metadata={
+                    "account_id": str(document.account_id),
+                    "dataset_id": str(document.dataset_id),
+                    "document_id": str(document.id),
+                    "segment_id": str(id),
+                    "node_id": str(node_id),
+                    "document_enabled": False,
+                    "segment_enabled": False,
+                }
+            ) for id, node_id, content in segments]
+
+        # 查询时排除模式下禁用文档的关键词同样写入关键词表, 检索时再排除
+        self._indexing(
+            document,
+            load_lc_segments([SegmentStatus.WAITING]),
+            document.disabled_at is None or DisabledDocumentService.is_exclusion_mode(),
+        )
+
+        return load_lc_segments([SegmentStatus.WAITING, SegmentStatus.INDEXING])
+
     def _parsing(self, document: Document) -> list[LCDocument]:
         """解析传递的文档为langchain文档列表"""
+        # 更新当前状态为解析中, 并记录开始处理时间
+        self.update(document, status=DocumentStatus.PARSING, processing_started_at=datetime.now())
+
         upload_file = document.upload_file
         lc_documents = self.file_extractor.load(upload_file, False, True)
 
+        # 使用编译后的清洗器单次扫描完成多余字符清除与预处理规则清洗
+        text_cleaner = self.process_rule_service.get_text_cleaner_by_process_rule(document.process_rule)
         for lc_document in lc_documents:
-            lc_document.page_content = self._clean_extra_text(lc_document.page_content)
+            lc_document.page_content = text_cleaner.clean(lc_document.page_content)
 
         self.update(
             document,
@@ -191,137 +521,269 @@ class IndexService(BaseService):
 
         return lc_documents
 
-    def _splitting(self, document: Document, lc_documents: list[LCDocument]) -> list[LCDocument]:
-        """根据传递的信息进行文档分割, 拆分成小块片段"""
+    def _streaming(self, document: Document, _: Any = None) -> None:
+        """流式构建文档, 按窗口逐批执行加载、清洗、分割、片段创建、索引与存储, 避免同时持有整个文件的数据"""
+        self.update(document, status=DocumentStatus.PARSING, processing_started_at=datetime.now())
+
         process_rule = document.process_rule
+        text_cleaner = self.process_rule_service.get_text_cleaner_by_process_rule(process_rule)
         text_splitter = self.process_rule_service.get_text_splitter_by_process_rule(
             process_rule,
-            self.embedding_service.calculate_token_count,
+            self.token_count_service.get_length_function(),
+            self.token_count_service.get_encoding(),
         )
+        window_size = current_app.config.get("INDEXING_STREAMING_WINDOW_SIZE")
+        position = self.db.session.query(func.coalesce(func.max(Segment.position), 0)).filter(
+            Segment.document_id == document.id,
+        ).scalar()
 
-        for lc_document in lc_documents:
-            lc_document.page_content = self.process_rule_service.clean_text_by_process_rule(
-                lc_document.page_content,
-                process_rule
+        character_count = 0
+        token_count = 0
+        parsing_completed_at = None
+        splitting_completed_at = None
+        lc_documents = self.file_extractor.lazy_load(document.upload_file, True)
+        while True:
+            # 读取的文档不足一个窗口说明文件已经读完, 解析在此时完成, 分割在最后一个窗口分割后完成
+            window = list(islice(lc_documents, window_size))
+            if len(window) < window_size:
+                parsing_completed_at = datetime.now()
+            if not window:
+                break
+
+            # 1.清洗当前窗口内的文档并分割成片段
+            for lc_document in window:
+                lc_document.page_content = text_cleaner.clean(lc_document.page_content)
+                character_count += len(lc_document.page_content)
+            lc_segments = text_splitter.split_documents(window)
+            splitting_completed_at = datetime.now()
+
+            # 2.创建片段记录后完成关键词索引与向量存储, 当前窗口处理完即可释放
+            token_counts = self._create_segments(
+                document,
+                lc_segments,
+                list(range(position + 1, position + len(lc_segments) + 1)),
             )
+            position += len(lc_segments)
+            token_count += sum(token_counts)
+            self.update(
+                document,
+                status=DocumentStatus.INDEXING,
+                character_count=character_count,
+                token_count=token_count,
+                **({
+                    "parsing_completed_at": parsing_completed_at,
+                    "splitting_completed_at": splitting_completed_at,
+                } if parsing_completed_at is not None else {}),
+            )
+
+            self._indexing(document, lc_segments)
+            self._completed(document, lc_segments, update_document=False)
+
+        self.update(
+            document,
+            status=DocumentStatus.COMPLETED,
+            parsing_completed_at=parsing_completed_at,
+            splitting_completed_at=max(parsing_completed_at, splitting_completed_at or parsing_completed_at),
+            completed_at=datetime.now(),
+            enabled=True,
+        )
+        self._bump_disabled_documents_version(document.dataset_id)
 
-        lc_segments = text_splitter.split_documents(lc_documents)
+    def _splitting(self, document: Document, lc_documents: list[LCDocument]) -> list[LCDocument]:
+        """根据传递的信息进行文档分割, 拆分成小块片段"""
+        lc_segments = self._split_documents(document, lc_documents)
 
         position = self.db.session.query(func.coalesce(func.max(Segment.position), 0)).filter(
             Segment.document_id == document.id,
         ).scalar()
 
-        segments = []
-        for lc_segment in lc_segments:
-            position += 1
+        token_counts = self._create_segments(
+            document,
+            lc_segments,
+            list(range(position + 1, position + len(lc_segments) + 1)),
+        )
+
+        self.update(
+            document,
+            token_count=sum(token_counts),
+            status=DocumentStatus.INDEXING,
+            splitting_completed_at=datetime.now()
+        )
+
+        return lc_segments
+
+    def _diff_splitting(self, document: Document, lc_documents: list[LCDocument]) -> list[LCDocument]:
+        """根据片段哈希对比新旧片段, 仅创建新增/变化的片段并删除已移除的片段, 未变化的片段保留原有node_id与向量"""
+        lc_segments = self._split_documents(document, lc_documents)
+
+        # 1.只有已完成的片段可以复用, 其余状态的片段一律视为需要删除
+        existing_segments = self.db.session.query(Segment).with_entities(
+            Segment.id, Segment.node_id, Segment.hash, Segment.status,
+        ).filter(
+            Segment.document_id == document.id,
+        ).order_by(Segment.position).all()
+
+        reusable_segments = {}
+        removed_segments = []
+        for id, node_id, hash, status in existing_segments:
+            if status == SegmentStatus.COMPLETED:
+                reusable_segments.setdefault(hash, []).append((id, node_id))
+            else:
+                removed_segments.append((id, node_id))
+
+        # 2.按新的顺序逐个匹配片段哈希, 相同内容的片段只更新位置
+        kept_rows = []
+        new_lc_segments = []
+        new_positions = []
+        for position, lc_segment in enumerate(lc_segments, start=1):
+            candidates = reusable_segments.get(generate_text_hash(lc_segment.page_content))
+            if candidates:
+                id, _ = candidates.pop(0)
+                kept_rows.append({"id": id, "position": position})
+            else:
+                new_lc_segments.append(lc_segment)
+                new_positions.append(position)
+
+        for candidates in reusable_segments.values():
+            removed_segments.extend(candidates)
+
+        # 3.删除已经移除的片段, 更新保留片段的位置, 并创建新增的片段
+        self._delete_segments(document, removed_segments)
+        if kept_rows:
+            with self.db.auto_commit():
+                self.db.session.execute(update(Segment), kept_rows)
+        self._create_segments(document, new_lc_segments, new_positions)
+
+        token_count = self.db.session.query(func.coalesce(func.sum(Segment.token_count), 0)).filter(
+            Segment.document_id == document.id,
+        ).scalar()
+        self.update(
+            document,
+            token_count=token_count,
+            status=DocumentStatus.INDEXING,
+            splitting_completed_at=datetime.now()
+        )
+
+        return new_lc_segments
+
+    def _split_documents(self, document: Document, lc_documents: list[LCDocument]) -> list[LCDocument]:
+        """根据文档的处理规则分割LangChain文档列表, 文档内容已在解析阶段完成清洗"""
+        text_splitter = self.process_rule_service.get_text_splitter_by_process_rule(
+            document.process_rule,
+            self.token_count_service.get_length_function(),
+            self.token_count_service.get_encoding(),
+        )
+
+        return text_splitter.split_documents(lc_documents)
+
+    def _create_segments(self, document: Document, lc_segments: list[LCDocument], positions: list[int]) -> list[int]:
+        """在一个事务内批量写入文档片段, 并将生成的id回填到LangChain片段元数据中, 返回各片段的token数"""
+        token_counts = self.token_count_service.calculate_token_counts(
+            [lc_segment.page_content for lc_segment in lc_segments],
+            use_memo=True,
+        )
+
+        segment_rows = []
+        for lc_segment, token_count, position in zip(lc_segments, token_counts, positions):
             content = lc_segment.page_content
-            segment = self.create(
-                Segment,
-                account_id=document.account_id,
-                dataset_id=document.dataset_id,
-                document_id=document.id,
-                node_id=uuid.uuid4(),
-                position=position,
-                content=content,
-                character_count=len(content),
-                token_count=self.embedding_service.calculate_token_count(content),
-                hash=generate_text_hash(content),
-                status=SegmentStatus.WAITING,
-            )
+            segment_rows.append({
+                "account_id": document.account_id,
+                "dataset_id": document.dataset_id,
+                "document_id": document.id,
+                "node_id": uuid.uuid4(),
+                "position": position,
+                "content": content,
+                "character_count": len(content),
+                "token_count": token_count,
+                "hash": generate_text_hash(content),
+                "status": SegmentStatus.WAITING,
+            })
+
+        records = self.create_many(Segment, segment_rows, returning=[Segment.id, Segment.node_id])
+        for lc_segment, (segment_id, node_id) in zip(lc_segments, records):
             lc_segment.metadata = {
                 "account_id": str(document.account_id),
                 "dataset_id": str(document.dataset_id),
                 "document_id": str(document.id),
-                "segment_id": str(segment.id),
-                "node_id": str(segment.node_id),
+                "segment_id": str(segment_id),
+                "node_id": str(node_id),
                 "document_enabled": False,
                 "segment_enabled": False,
             }
-            segments.append(segment)
 
-        self.update(
-            document,
-            token_count=sum([segment.token_count for segment in segments]),
-            status=DocumentStatus.INDEXING,
-            splitting_completed_at=datetime.now()
-        )
+        return token_counts
 
-        return lc_segments
+    def _delete_segments(self, document: Document, segments: list[tuple[UUID, UUID]]) -> None:
+        """根据传递的(片段id, 节点id)列表删除片段, 涵盖向量数据库、关键词表与片段记录"""
+        if not segments:
+            return
 
-    def _indexing(self, document: Document, lc_segments: list[LCDocument]) -> None:
-        """根据传递的信息构建索引、涵盖关键词提取、词表构建"""
-        for lc_segment in lc_segments:
-            keywords = self.jieba_service.extract_keywords(lc_segment.page_content, 10)
+        segment_ids = [id for id, _ in segments]
+        node_ids = [str(node_id) for _, node_id in segments]
+
+        self.vector_database_service.delete_by_ids(document.dataset_id, node_ids)
+
+        self.keyword_table_service.delete_keyword_table_from_ids(document.dataset_id, segment_ids)
+
+        with self.db.auto_commit():
             self.db.session.query(Segment).filter(
-                Segment.id == lc_segment.metadata["segment_id"]
-            ).update({
+                Segment.id.in_(segment_ids),
+            ).delete()
+        self.retrieval_cache_service.bump_dataset_versions([document.dataset_id])
+
+    def _indexing(
+            self,
+            document: Document,
+            lc_segments: list[LCDocument],
+            update_keyword_table: bool = True,
+    ) -> list[LCDocument]:
+        """根据传递的信息构建索引、涵盖关键词提取、词表构建"""
+        # 在内存中汇总整个文档的关键词倒排记录, 片段的关键词与状态统一批量更新
+        contents = [lc_segment.page_content for lc_segment in lc_segments]
+        keywords_list = self.jieba_service.extract_keywords_batch(contents, 10)
+        # 全文检索向量只在Postgres全文检索后端下构建, 其他后端留空, 切换后端时再补齐
+        search_vectors = (
+            self.jieba_service.build_search_vectors_batch(contents)
+            if self.jieba_service.is_search_vector_enabled() else [None] * len(contents)
+        )
+        keyword_segments = []
+        segment_rows = []
+        for lc_segment, keywords, search_vector in zip(lc_segments, keywords_list, search_vectors):
+            segment_id = lc_segment.metadata["segment_id"]
+            keyword_segments.append((segment_id, keywords, lc_segment.page_content))
+
+            segment_rows.append({
+                "id": UUID(segment_id),
                 "keywords": keywords,
+                "search_vector": search_vector,
                 "status": SegmentStatus.INDEXING,
                 "indexing_completed_at": datetime.now(),
             })
 
-            keyword_table_record = self.keyword_table_service.get_keyword_table_from_dataset_id(document.dataset_id)
-            keyword_table = {
-                field: set(value) for field, value in keyword_table_record.keyword_table.items()
-            }
-
-            for keyword in keywords:
-                if keyword not in keyword_table:
-                    keyword_table[keyword] = set()
-                keyword_table[keyword].add(lc_segment.metadata["segment_id"])
+        # 一次性写入整个文档的倒排记录, 写入完成后再标记片段状态, 保证中断后可以安全重试
+        if update_keyword_table:
+            self.keyword_table_service.add_keyword_table_from_segments(document.dataset_id, keyword_segments)
 
-            self.update(
-                keyword_table_record,
-                keyword_table={field: list(value) for field, value in keyword_table.items()}
-            )
+        if segment_rows:
+            with self.db.auto_commit():
+                self.db.session.execute(update(Segment), segment_rows)
 
         self.update(
             document,
             indexing_completed_at=datetime.now()
         )
 
-    def _completed(self, document: Document, lc_segments: list[LCDocument]) -> None:
+        return lc_segments
+
+    def _completed(self, document: Document, lc_segments: list[LCDocument], update_document: bool = True) -> None:
         """存储文档片段到向量数据库, 并完成状态更新"""
         for lc_segment in lc_segments:
             lc_segment.metadata["document_enabled"] = True
             lc_segment.metadata["segment_enabled"] = True
 
-        # 每次向向量数据库存储10条数据, 避免一次传递过多数据
-        def thread_func(flask_app: Flask, chunks: list[LCDocument], ids: list[UUID]) -> None:
-            """线程函数, 执行向量数据库与postgre数据存储"""
-            with flask_app.app_context():
-                try:
-                    self.vector_database_service.vector_store.add_documents(chunks, ids=ids)
-                    with self.db.auto_commit():
-                        self.db.session.query(Segment).filter(
-                            Segment.node_id.in_(ids)
-                        ).update({
-                            "status": SegmentStatus.COMPLETED,
-                            "completed_at": datetime.now(),
-                            "enabled": True,
-                        })
-                except Exception as e:
-                    logging.exception(f"构建文档片段索引发生异常, 错误信息: {str(e)}")
-                    with self.db.auto_commit():
-                        self.db.session.query(Segment).filter(
-                            Segment.node_id.in_(ids)
-                        ).update({
-                            "status": SegmentStatus.ERROR,
-                            "completed_at": None,
-                            "stopped_at": datetime.now(),
-                            "enabled": False,
-                        })
-
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = []
-
-            for i in range(0, len(lc_segments), 10):
-                chunks = lc_segments[i:i+10]
-                ids = [chunk.metadata["node_id"] for chunk in chunks]
-                futures.append(executor.submit(thread_func, current_app._get_current_object(), chunks, ids))
-
-            for future in futures:
-                future.result()
+        self._embedding(lc_segments)
+        if not update_document:
+            return
 
         self.update(
             document,
@@ -329,12 +791,100 @@ class IndexService(BaseService):
             completed_at=datetime.now(),
             enabled=True,
         )
+        self._bump_disabled_documents_version(document.dataset_id)
+
+    def _reindex_completed(self, document: Document, lc_segments: list[LCDocument]) -> None:
+        """存储重建索引时新增的片段到向量数据库, 并保持文档原有的启用状态"""
+        enabled = document.disabled_at is None
+        for lc_segment in lc_segments:
+            lc_segment.metadata["document_enabled"] = enabled
+            lc_segment.metadata["segment_enabled"] = True
+
+        self._embedding(lc_segments)
+
+        self.update(
+            document,
+            status=DocumentStatus.COMPLETED,
+            completed_at=datetime.now(),
+            enabled=enabled,
+        )
+        self._bump_disabled_documents_version(document.dataset_id)
+
+    def _embedding(self, lc_segments: list[LCDocument]) -> None:
+        """向量化阶段, 按批次计算片段向量(复用已缓存的向量)并携带向量写入向量数据库, 片段可以来自一个或多个文档"""
+        batch_size = current_app.config.get("EMBEDDING_BATCH_SIZE")
+        min_batch_size = current_app.config.get("EMBEDDING_MIN_BATCH_SIZE")
+        max_batch_size = current_app.config.get("EMBEDDING_MAX_BATCH_SIZE")
+        target_latency = current_app.config.get("EMBEDDING_STORE_TARGET_LATENCY")
+
+        def thread_func(flask_app: Flask, chunks: list[LCDocument], vectors: list[list[float]]) -> float:
+            """线程函数, 执行向量数据库与postgres数据存储, 并返回本批次写入耗时"""
+            with flask_app.app_context():
+                start_at = time.perf_counter()
+                ids = [chunk.metadata["node_id"] for chunk in chunks]
+                self._renew_indexing_lock(list({chunk.metadata["document_id"] for chunk in chunks}))
+                try:
+                    failed_ids = self.vector_database_service.add_documents_with_vectors(chunks, vectors, ids)
+                except Exception as e:
+                    logging.exception(f"构建文档片段索引发生异常, 错误信息: {str(e)}")
+                    failed_ids = ids
+
+                self._update_segments_stored(ids, failed_ids)
+                self.retrieval_cache_service.bump_dataset_versions({chunk.metadata["dataset_id"] for chunk in chunks})
+                return time.perf_counter() - start_at
 
-    @classmethod
-    def _clean_extra_text(cls, text: str) -> str:
-        """清除过滤多余的空白字符串"""
-        text = re.sub(r'<\|', '<', text)
-        text = re.sub(r'\|>', '>', text)
-        text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F\xEF\xBF\xBE]', '', text)
-        text = re.sub('\uFFFE', '', text)
-        return text
+        # 向量计算在当前线程执行, 写入在后台线程执行, 同一时间最多只有一个批次在写入
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = None
+            position = 0
+            while position < len(lc_segments):
+                chunks = lc_segments[position:position + batch_size]
+                position += len(chunks)
+
+                try:
+                    vectors = self.embedding_service.embed_documents_with_cache(
+                        [chunk.page_content for chunk in chunks],
+                        [generate_text_hash(chunk.page_content) for chunk in chunks],
+                    )
+                except Exception as e:
+                    logging.exception(f"计算文档片段向量发生异常, 错误信息: {str(e)}")
+                    ids = [chunk.metadata["node_id"] for chunk in chunks]
+                    self._update_segments_stored(ids, ids)
+                    continue
+
+                # 等待上一批次写入完成(背压), 写入过慢时缩小批次, 写入及时则逐步扩大批次
+                if future is not None:
+                    latency = future.result()
+                    if latency > target_latency:
+                        batch_size = max(min_batch_size, batch_size // 2)
+                    else:
+                        batch_size = min(max_batch_size, batch_size + min_batch_size)
+
+                future = executor.submit(thread_func, current_app._get_current_object(), chunks, vectors)
+
+            if future is not None:
+                future.result()
+
+    def _update_segments_stored(self, ids: list[str], failed_ids: list[str]) -> None:
+        """根据向量数据库的写入结果更新片段状态, 写入失败的片段标记为错误"""
+        failed_ids = set(failed_ids)
+        completed_ids = [id for id in ids if id not in failed_ids]
+
+        with self.db.auto_commit():
+            if completed_ids:
+                self.db.session.query(Segment).filter(
+                    Segment.node_id.in_(completed_ids)
+                ).update({
+                    "status": SegmentStatus.COMPLETED,
+                    "completed_at": datetime.now(),
+                    "enabled": True,
+                })
+            if failed_ids:
+                self.db.session.query(Segment).filter(
+                    Segment.node_id.in_(failed_ids)
+                ).update({
+                    "status": SegmentStatus.ERROR,
+                    "completed_at": None,
+                    "stopped_at": datetime.now(),
+                    "enabled": False,
+                })
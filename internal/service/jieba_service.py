@@ -1,26 +1,140 @@
-import warnings
-warnings.filterwarnings("ignore", category=DeprecationWarning)
-warnings.filterwarnings("ignore", category=ResourceWarning)
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
 
-import jieba
+from flask import current_app
 from injector import inject
 from dataclasses import dataclass
-from internal.entity.jieba_entity import STOPWORD_SET
-from jieba.analyse import default_tfidf
+from internal.entity.dataset_entity import FullTextRetrievalBackend
+from internal.lib import jieba_worker
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_pid = None
+_process_pool_lock = threading.Lock()
+
 
 @inject
 @dataclass
 class JiebaService:
-    """结巴分词服务"""
-
-    def __init__(self):
-        """扩展jieba的停用词"""
-        default_tfidf.stop_words = STOPWORD_SET
+    """结巴分词服务, 批量提取交由常驻词典的进程池执行, 单条提取在gevent下交由原生线程执行避免阻塞事件循环"""
 
     @classmethod
     def extract_keywords(cls, text: str, max_keyword_per_chunk: int = 10) -> list[str]:
         """根据输入的文本, 提取对应文本的关键词列表"""
-        return jieba.analyse.extract_tags(
-            sentence=text,
-            topK=max_keyword_per_chunk,
-        )
\ No newline at end of file
+        return cls._run_in_thread(jieba_worker.extract_keywords, text, max_keyword_per_chunk)
+
+    @classmethod
+    def extract_keywords_batch(cls, texts: list[str], max_keyword_per_chunk: int = 10) -> list[list[str]]:
+        """批量提取文本列表的关键词列表, 文本数达到阈值时按块分发到进程池并行提取, 结果顺序与传递的文本一致"""
+        return cls._map_batch(jieba_worker.extract_keywords_batch, texts, max_keyword_per_chunk)
+
+    @classmethod
+    def count_keyword_frequencies_batch(
+            cls,
+            texts: list[str],
+            keywords_list: list[list[str]],
+    ) -> list[tuple[list[int], int]]:
+        """批量统计每个文本中对应关键词的词频与文本的分词数, 文本数达到阈值时分发到进程池并行统计"""
+        return cls._map_batch(jieba_worker.count_keyword_frequencies_batch, list(zip(texts, keywords_list)))
+
+    @classmethod
+    def build_search_query(cls, text: str) -> str:
+        """使用与片段全文检索向量相同的分词规则构建query的tsquery字面量, 没有可用分词时返回空字符串"""
+        return cls._run_in_thread(jieba_worker.build_search_query, text)
+
+    @classmethod
+    def is_search_vector_enabled(cls) -> bool:
+        """只有全文检索使用Postgres后端时才需要维护片段的全文检索向量"""
+        return current_app.config.get("FULL_TEXT_RETRIEVAL_BACKEND") == FullTextRetrievalBackend.POSTGRES
+
+    @classmethod
+    def build_search_vector(cls, text: str) -> str:
+        """构建文本的全文检索向量(tsvector字面量)"""
+        return cls._run_in_thread(jieba_worker.build_search_vector, text)
+
+    @classmethod
+    def build_search_vectors_batch(cls, texts: list[str]) -> list[str]:
+        """批量构建文本列表的全文检索向量(tsvector字面量), 文本数达到阈值时分发到进程池并行构建"""
+        return cls._map_batch(jieba_worker.build_search_vectors_batch, texts)
+
+    @classmethod
+    def _run_in_thread(cls, func: Callable, *args: Any) -> Any:
+        """执行单条文本的分词任务, gevent下交由原生线程执行, 避免阻塞事件循环上的其他协程"""
+        cls.warm_up()
+        if cls._is_gevent_patched():
+            from gevent import get_hub
+            return get_hub().threadpool.apply(func, args)
+
+        return func(*args)
+
+    @classmethod
+    def _map_batch(cls, func: Callable, texts: list[str], *args: Any) -> list:
+        """将批量分词任务按块分发到进程池执行, 文本数未达到阈值或进程池不可用时在当前进程执行, 结果顺序与传递的文本一致"""
+        cls.warm_up()
+        min_batch_size = current_app.config.get("JIEBA_BATCH_MIN_SIZE")
+        process_pool = cls._get_process_pool() if len(texts) >= min_batch_size else None
+        if process_pool is None:
+            return func(texts, *args)
+
+        # 每个工作进程分到若干块, 兼顾负载均衡与进程间通信的开销
+        chunk_size = max(min_batch_size // 4, -(-len(texts) // (current_app.config.get("JIEBA_WORKER_COUNT") * 4)))
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        try:
+            results = process_pool.map(func, chunks, *[[arg] * len(chunks) for arg in args])
+            return [result for chunk_results in results for result in chunk_results]
+        except Exception as e:
+            logging.exception(f"进程池执行分词任务失败, 当前进程后续将直接执行, 错误信息: {str(e)}")
+            cls._disable_process_pool()
+            return func(texts, *args)
+
+    @classmethod
+    def warm_up(cls) -> None:
+        """预热jieba词典与停用词, 应用创建与celery工作进程启动时会主动调用, 已预热时直接返回"""
+        jieba_worker.warm_up(current_app.config.get("JIEBA_CACHE_FILE"))
+
+    @classmethod
+    def _get_process_pool(cls) -> Optional[ProcessPoolExecutor]:
+        """获取当前进程的关键词提取进程池, fork出的子进程会重新创建, 未启用或不可用时返回None"""
+        global _process_pool, _process_pool_pid
+        worker_count = current_app.config.get("JIEBA_WORKER_COUNT")
+        if worker_count <= 0:
+            return None
+
+        with _process_pool_lock:
+            if _process_pool_pid == os.getpid():
+                return _process_pool
+            try:
+                # 使用spawn启动工作进程, 避免在多线程/gevent进程中fork
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=worker_count,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=jieba_worker.warm_up,
+                    initargs=(current_app.config.get("JIEBA_CACHE_FILE"),),
+                )
+            except Exception as e:
+                logging.warning(f"创建关键词提取进程池失败, 将在当前进程提取关键词, 错误信息: {str(e)}")
+                _process_pool = None
+            _process_pool_pid = os.getpid()
+            return _process_pool
+
+    @classmethod
+    def _disable_process_pool(cls) -> None:
+        """关闭并停用当前进程的关键词提取进程池(如celery守护进程无法创建子进程), 之后的批量提取在当前进程执行"""
+        global _process_pool, _process_pool_pid
+        with _process_pool_lock:
+            if _process_pool is not None and _process_pool_pid == os.getpid():
+                _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+            _process_pool_pid = os.getpid()
+
+    @classmethod
+    def _is_gevent_patched(cls) -> bool:
+        """判断当前进程是否启用了gevent猴子补丁"""
+        try:
+            from gevent import monkey
+        except ImportError:
+            return False
+        return monkey.is_module_patched("threading")
@@ -1,16 +1,46 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
 from uuid import UUID
+
+import numpy as np
+from flask import current_app
 from injector import inject
 from dataclasses import dataclass
+from sqlalchemy import ARRAY, Integer, String, UUID as PG_UUID, and_, cast, delete, func, literal, update
+from sqlalchemy.dialects.postgresql import insert
 from .base_service import BaseService
+from .disabled_document_service import DisabledDocumentService
+from .jieba_service import JiebaService
 from pkg.sqlalchemy import SQLAlchemy
-from internal.model import KeywordTable, Segment
-from internal.entity.cache_entity import LOCK_KEYWORD_TABLE_UPDATE_KEYWORD_TABLE, LOCK_EXPIRE_TIME
+from internal.core.posting_list import PostingList
+from internal.model import KeywordTable, KeywordSegment, KeywordPosting, Segment, Document
+from internal.entity.cache_entity import CACHE_KEYWORD_TABLE_VERSION, CHANNEL_KEYWORD_TABLE_VERSION
 from redis import Redis
 
+# 单次批量读写的片段/关键词最大条数
+KEYWORD_POSTING_BATCH_SIZE = 5000
+
+# 进程内缓存中知识库统计信息使用的关键词占位
+STATISTICS_CACHE_KEYWORD = ""
+
+# 进程内缓存: (知识库id, 关键词) -> (版本号, 倒排列表), 统计信息以空关键词存储为(版本号, (片段数, 分词总数))
+_cache: OrderedDict[tuple[str, str], tuple[int, PostingList | tuple[int, int]]] = OrderedDict()
+_cache_keys: dict[str, set[tuple[str, str]]] = {}
+_cache_lock = threading.Lock()
+_cache_info = {"hits": 0, "misses": 0, "postings": 0}
+_subscriber_pid = None
+
+
 @inject
 @dataclass
 class KeywordTableService(BaseService):
-    """知识库关键词表服务"""
+    """知识库关键词表服务, 片段在知识库内被分配连续的整数序号, 每个关键词的倒排列表以压缩的序号数组存储,
+    关键词表记录知识库的片段数与分词总数, 随倒排列表的增删增量维护,
+    增删片段时知识库关键词表记录只在分配序号与累加统计信息的语句上短暂加锁, 倒排列表按关键词逐行加锁合并,
+    查询时的倒排列表缓存在进程内, 通过Redis中的知识库版本号校验并广播失效"""
     db: SQLAlchemy
     redis_client: Redis
 
@@ -24,48 +54,510 @@ class KeywordTableService(BaseService):
 
         return keyword_table
 
+    def search_postings(
+            self,
+            dataset_ids: list[UUID],
+            keywords: list[str],
+    ) -> tuple[dict[str, dict[str, PostingList]], int, int]:
+        """根据知识库id列表+关键词列表获取{知识库id: {关键词: 倒排列表}}与片段数、分词总数,
+        优先读取进程内缓存, 缓存版本与Redis中的知识库版本号不一致时重新从数据库加载"""
+        if not dataset_ids:
+            return {}, 0, 0
+        self._ensure_version_subscriber()
+
+        # 1.先读取版本号再读取数据, 保证加载期间发生的变更会让缓存在下次查询时失效
+        dataset_ids = list(dict.fromkeys(str(dataset_id) for dataset_id in dataset_ids))
+        keywords = list(dict.fromkeys(keywords))
+        versions = {
+            dataset_id: int(version or 0) for dataset_id, version in zip(dataset_ids, self.redis_client.mget([
+                CACHE_KEYWORD_TABLE_VERSION.format(dataset_id=dataset_id) for dataset_id in dataset_ids
+            ]))
+        }
+        keys = [(dataset_id, keyword) for dataset_id in dataset_ids for keyword in [STATISTICS_CACHE_KEYWORD, *keywords]]
+
+        # 2.读取命中的缓存
+        values = {}
+        with _cache_lock:
+            for key in keys:
+                entry = _cache.get(key)
+                if entry is not None and entry[0] == versions[key[0]]:
+                    _cache.move_to_end(key)
+                    values[key] = entry[1]
+            _cache_info["hits"] += len(values)
+            _cache_info["misses"] += len(keys) - len(values)
+
+        # 3.未命中的知识库+关键词一次性从数据库加载并写回缓存
+        missing_keys = [key for key in keys if key not in values]
+        if missing_keys:
+            loaded = self._load_postings(missing_keys)
+            values.update(loaded)
+            self._set_cache(versions, loaded)
+
+        postings = {
+            dataset_id: {
+                keyword: values[(dataset_id, keyword)] for keyword in keywords if len(values[(dataset_id, keyword)]) > 0
+            } for dataset_id in dataset_ids
+        }
+        segment_count = sum(values[(dataset_id, STATISTICS_CACHE_KEYWORD)][0] for dataset_id in dataset_ids)
+        token_count = sum(values[(dataset_id, STATISTICS_CACHE_KEYWORD)][1] for dataset_id in dataset_ids)
+        return postings, segment_count, token_count
+
+    def get_enabled_segments_by_ordinals(self, ordinals: list[tuple[str, int]], k: int) -> list[tuple[Segment, int]]:
+        """按传递的顺序匹配(知识库id, 片段序号)对应的片段, 未启用的片段/文档在同一条SQL中被跳过,
+        返回前k条(片段, 在传递列表中的下标), 候选足够时结果总是满k条"""
+        if not ordinals or k <= 0:
+            return []
+
+        # 候选以数组参数传递并展开为带序号的临时表, 按候选顺序连接片段与文档后过滤启用状态并截断
+        candidate = func.unnest(
+            cast(literal([str(dataset_id) for dataset_id, _ in ordinals], ARRAY(String)), ARRAY(PG_UUID)),
+            literal([ordinal for _, ordinal in ordinals], ARRAY(Integer)),
+        ).table_valued("dataset_id", "ordinal", with_ordinality="position").render_derived(name="candidate")
+        segments = self.db.session.query(Segment, candidate.c.position).select_from(candidate).join(
+            KeywordSegment, and_(
+                KeywordSegment.dataset_id == candidate.c.dataset_id,
+                KeywordSegment.ordinal == candidate.c.ordinal,
+            ),
+        ).join(
+            Segment, Segment.id == KeywordSegment.segment_id,
+        ).join(
+            Document, Segment.document_id == Document.id,
+        ).filter(
+            Segment.enabled == True,
+            Document.enabled == True,
+        ).order_by(candidate.c.position).limit(k).all()
+
+        return [(segment, position - 1) for segment, position in segments]
+
+    @classmethod
+    def get_cache_info(cls) -> dict:
+        """获取进程内缓存的命中次数、未命中次数、缓存条数与倒排记录总数"""
+        with _cache_lock:
+            return {**_cache_info, "size": len(_cache)}
+
+    def _load_postings(self, keys: list[tuple[str, str]]) -> dict[tuple[str, str], PostingList | tuple[int, int]]:
+        """从数据库中加载传递的(知识库id, 关键词)对应的倒排列表与统计信息"""
+        dataset_ids = list(set([dataset_id for dataset_id, _ in keys]))
+        keywords = list(set([keyword for _, keyword in keys if keyword != STATISTICS_CACHE_KEYWORD]))
+        values = {key: PostingList() for key in keys if key[1] != STATISTICS_CACHE_KEYWORD}
+
+        if keywords:
+            postings = self.db.session.query(KeywordPosting).with_entities(
+                KeywordPosting.dataset_id,
+                KeywordPosting.keyword,
+                KeywordPosting.segment_ordinals,
+                KeywordPosting.frequencies,
+                KeywordPosting.segment_lengths,
+            ).filter(
+                KeywordPosting.dataset_id.in_(dataset_ids),
+                KeywordPosting.keyword.in_(keywords),
+            ).all()
+            for dataset_id, keyword, segment_ordinals, frequencies, segment_lengths in postings:
+                key = (str(dataset_id), keyword)
+                if key in values:
+                    values[key] = PostingList.from_bytes(segment_ordinals, frequencies, segment_lengths)
+
+        statistics = self.db.session.query(KeywordTable).with_entities(
+            KeywordTable.dataset_id,
+            func.coalesce(func.sum(KeywordTable.segment_count), 0),
+            func.coalesce(func.sum(KeywordTable.token_count), 0),
+        ).filter(
+            KeywordTable.dataset_id.in_(dataset_ids),
+        ).group_by(KeywordTable.dataset_id).all()
+        statistics = {str(dataset_id): (segment_count, token_count) for dataset_id, segment_count, token_count in statistics}
+        for dataset_id in dataset_ids:
+            key = (dataset_id, STATISTICS_CACHE_KEYWORD)
+            if key in keys:
+                values[key] = statistics.get(dataset_id, (0, 0))
+
+        return values
+
+    @classmethod
+    def _set_cache(cls, versions: dict[str, int], values: dict[tuple[str, str], PostingList | tuple[int, int]]) -> None:
+        """将加载的数据写入进程内缓存, 超出倒排记录总数上限时淘汰最久未使用的记录"""
+        max_postings = current_app.config.get("KEYWORD_TABLE_CACHE_MAX_POSTINGS")
+        with _cache_lock:
+            for key, value in values.items():
+                cls._evict_cache_key(key)
+                _cache[key] = (versions[key[0]], value)
+                _cache_keys.setdefault(key[0], set()).add(key)
+                _cache_info["postings"] += cls._get_cache_value_size(value)
+            while _cache and _cache_info["postings"] > max_postings:
+                cls._evict_cache_key(next(iter(_cache)))
+
+    @classmethod
+    def _get_cache_value_size(cls, value: PostingList | tuple[int, int]) -> int:
+        """获取缓存值计入上限的倒排记录数, 统计信息计为1条"""
+        return len(value) if isinstance(value, PostingList) else 1
+
+    @classmethod
+    def _evict_cache_key(cls, key: tuple[str, str]) -> None:
+        """移除进程内缓存的一条记录, 调用方需持有缓存锁"""
+        entry = _cache.pop(key, None)
+        if entry is None:
+            return
+        _cache_info["postings"] -= cls._get_cache_value_size(entry[1])
+        dataset_keys = _cache_keys.get(key[0])
+        if dataset_keys is not None:
+            dataset_keys.discard(key)
+            if not dataset_keys:
+                del _cache_keys[key[0]]
+
+    @classmethod
+    def _evict_dataset(cls, message: dict) -> None:
+        """处理知识库版本变更广播, 移除该知识库在当前进程内的所有缓存"""
+        dataset_id = message["data"].decode() if isinstance(message["data"], bytes) else str(message["data"])
+        with _cache_lock:
+            for key in list(_cache_keys.get(dataset_id, [])):
+                cls._evict_cache_key(key)
+
+    def _ensure_version_subscriber(self) -> None:
+        """确保当前进程已订阅知识库版本变更广播, fork出的子进程会重新订阅"""
+        global _subscriber_pid
+        if _subscriber_pid == os.getpid():
+            return
+
+        with _cache_lock:
+            if _subscriber_pid == os.getpid():
+                return
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{CHANNEL_KEYWORD_TABLE_VERSION: self._evict_dataset})
+                pubsub.run_in_thread(sleep_time=1, daemon=True)
+                _subscriber_pid = os.getpid()
+            except Exception:
+                logging.exception("订阅关键词表版本变更广播失败, 缓存仍会通过版本号校验")
+
+    def bump_keyword_table_version(self, dataset_id: UUID) -> None:
+        """递增知识库的关键词表版本号, 并广播给其他进程移除对应缓存"""
+        self.redis_client.incr(CACHE_KEYWORD_TABLE_VERSION.format(dataset_id=dataset_id))
+        self.redis_client.publish(CHANNEL_KEYWORD_TABLE_VERSION, str(dataset_id))
+
     def delete_keyword_table_from_ids(self, dataset_id: UUID, segment_ids: list[UUID]) -> None:
-        """根据传递的知识库id+片段id列表删除对应关键词表中多余的数据"""
-        cache_key = LOCK_KEYWORD_TABLE_UPDATE_KEYWORD_TABLE.format(dataset_id=dataset_id)
-        with self.redis_client.lock(cache_key, timeout=LOCK_EXPIRE_TIME):
-            keyword_table_record = self.get_keyword_table_from_dataset_id(dataset_id)
-            keyword_table = keyword_table_record.keyword_table.copy()
+        """根据传递的知识库id+片段id列表, 从倒排列表中移除对应片段的序号, 并扣减关键词表的片段数与分词总数"""
+        if not segment_ids:
+            return
 
-            segment_ids_to_delete = set([str(segment_id) for segment_id in segment_ids])
-            keywords_to_delete = set()
+        self.get_keyword_table_from_dataset_id(dataset_id)
+        with self.db.auto_commit():
+            self._share_lock_keyword_table(dataset_id)
+            deleted_segments = self.db.session.execute(
+                delete(KeywordSegment).where(
+                    KeywordSegment.dataset_id == dataset_id,
+                    KeywordSegment.segment_id.in_(segment_ids),
+                ).returning(KeywordSegment.ordinal, KeywordSegment.keywords, KeywordSegment.segment_length)
+            ).all()
+            if not deleted_segments:
+                return
 
-            for keyword, ids in keyword_table.items():
-                ids_set = set(ids)
-                if segment_ids_to_delete.intersection(ids_set):
-                    keyword_table[keyword] = list(ids_set.difference(segment_ids_to_delete))
-                    if not keyword_table[keyword]:
-                        keywords_to_delete.add(keyword)
+            # 片段记录了建立索引时的关键词, 只需要改写这些关键词的倒排列表
+            removed_ordinals = {}
+            for ordinal, keywords, _ in deleted_segments:
+                for keyword in keywords:
+                    removed_ordinals.setdefault(keyword, []).append(ordinal)
+            self._write_postings(dataset_id, {}, {
+                keyword: np.array(ordinals, dtype=np.int64) for keyword, ordinals in removed_ordinals.items()
+            })
 
-            for keyword in keywords_to_delete:
-                del keyword_table[keyword]
+            self._update_statistics(
+                dataset_id,
+                -len(deleted_segments),
+                -sum(segment_length for _, _, segment_length in deleted_segments),
+            )
 
-            self.update(keyword_table_record, keyword_table=keyword_table)
+        self.bump_keyword_table_version(dataset_id)
 
     def add_keyword_table_from_ids(self, dataset_id: UUID, segment_ids: list[UUID]) -> None:
         """根据传递的知识库id+片段id列表, 在关键词表中添加关键词"""
-        cache_key = LOCK_KEYWORD_TABLE_UPDATE_KEYWORD_TABLE.format(dataset_id=dataset_id)
-        with self.redis_client.lock(cache_key, timeout=LOCK_EXPIRE_TIME):
-            keyword_table_record = self.get_keyword_table_from_dataset_id(dataset_id)
-            keyword_table = {
-                field: set(value) for field, value in keyword_table_record.keyword_table.items()
-            }
+        segments = self.db.session.query(Segment).with_entities(
+            Segment.id, Segment.keywords, Segment.content,
+        ).filter(
+            Segment.id.in_(segment_ids),
+        ).all()
+
+        self.add_keyword_table_from_segments(dataset_id, segments)
+
+    def add_keyword_table_from_segments(
+            self,
+            dataset_id: UUID,
+            segments: list[tuple[UUID | str, list[str], str]],
+    ) -> None:
+        """根据传递的知识库id+片段列表(片段id, 关键词列表, 内容), 为新片段分配序号并合并到倒排列表,
+        同时累加关键词表的片段数与分词总数"""
+        keyword_segments = self._build_keyword_segments(segments)
+        if not keyword_segments:
+            return
+
+        # 1.已经分配序号的片段已建立倒排索引并计入统计信息, 直接跳过
+        self.get_keyword_table_from_dataset_id(dataset_id)
+        existing_segment_ids = set()
+        for i in range(0, len(keyword_segments), KEYWORD_POSTING_BATCH_SIZE):
+            existing_segment_ids.update([
+                str(segment_id) for segment_id, in self.db.session.query(KeywordSegment).with_entities(
+                    KeywordSegment.segment_id,
+                ).filter(
+                    KeywordSegment.dataset_id == dataset_id,
+                    KeywordSegment.segment_id.in_([
+                        keyword_segment["segment_id"]
+                        for keyword_segment in keyword_segments[i:i + KEYWORD_POSTING_BATCH_SIZE]
+                    ]),
+                ).all()
+            ])
+        keyword_segments = [
+            keyword_segment for keyword_segment in keyword_segments
+            if keyword_segment["segment_id"] not in existing_segment_ids
+        ]
+        if not keyword_segments:
+            return
 
-            segments = self.db.session.query(Segment).with_entities(Segment.id, Segment.keywords).filter(
-                Segment.id.in_(segment_ids),
+        while True:
+            # 2.在独立的短事务内分配连续的序号, 合并倒排列表时不再持有知识库关键词表记录的锁
+            start_ordinal = self._allocate_ordinals(dataset_id, len(keyword_segments))
+            end_ordinal = start_ordinal + len(keyword_segments)
+            for i, keyword_segment in enumerate(keyword_segments):
+                keyword_segment["ordinal"] = start_ordinal + i
+
+            with self.db.auto_commit():
+                # 3.分配序号后知识库被重建时序号区间可能已被占用, 重新分配
+                if not self._check_ordinals(dataset_id, start_ordinal, end_ordinal):
+                    continue
+
+                # 4.并发添加的相同片段只会写入一次, 只有写入成功的片段合并到倒排列表并计入统计信息
+                inserted_segment_ids = self._insert_keyword_segments(dataset_id, keyword_segments)
+                keyword_segments = [
+                    keyword_segment for keyword_segment in keyword_segments
+                    if keyword_segment["segment_id"] in inserted_segment_ids
+                ]
+                self._write_postings(dataset_id, self._group_postings(keyword_segments), {})
+                self._update_statistics(
+                    dataset_id,
+                    len(keyword_segments),
+                    sum(keyword_segment["segment_length"] for keyword_segment in keyword_segments),
+                )
+            break
+
+        self.bump_keyword_table_version(dataset_id)
+
+    def rebuild_keyword_table(self, dataset_id: UUID) -> None:
+        """根据知识库下已启用的片段重建片段序号、倒排列表与统计信息, 同时清空旧版关键词表(JSON),
+        用于迁移历史数据以及压缩删除片段后留下的序号空洞, 查询时排除模式下禁用文档的片段同样写入"""
+        filters = [Segment.dataset_id == dataset_id, Segment.enabled == True]
+        if not DisabledDocumentService.is_exclusion_mode():
+            filters.append(Document.enabled == True)
+        segments = self.db.session.query(Segment).with_entities(
+            Segment.id, Segment.keywords, Segment.content,
+        ).join(
+            Document, Segment.document_id == Document.id,
+        ).filter(*filters).all()
+        keyword_segments = self._build_keyword_segments(segments)
+        for i, keyword_segment in enumerate(keyword_segments):
+            keyword_segment["ordinal"] = i
+
+        self.get_keyword_table_from_dataset_id(dataset_id)
+        with self.db.auto_commit():
+            keyword_table = self._lock_keyword_table(dataset_id)
+            self.db.session.execute(delete(KeywordSegment).where(KeywordSegment.dataset_id == dataset_id))
+            self.db.session.execute(delete(KeywordPosting).where(KeywordPosting.dataset_id == dataset_id))
+            self._insert_keyword_segments(dataset_id, keyword_segments)
+            self._write_postings(dataset_id, self._group_postings(keyword_segments), {})
+
+            keyword_table.keyword_table = {}
+            keyword_table.next_ordinal = len(keyword_segments)
+            keyword_table.segment_count = len(keyword_segments)
+            keyword_table.token_count = sum(keyword_segment["segment_length"] for keyword_segment in keyword_segments)
+
+        self.bump_keyword_table_version(dataset_id)
+
+    def rebuild_keyword_tables(self) -> None:
+        """重建所有知识库的片段序号、倒排列表与统计信息"""
+        dataset_ids = [
+            dataset_id for dataset_id, in self.db.session.query(KeywordTable).with_entities(
+                KeywordTable.dataset_id,
             ).all()
+        ]
+        for dataset_id in dataset_ids:
+            self.rebuild_keyword_table(dataset_id)
 
-            for id, keywords in segments:
-                for keyword in keywords:
-                    if keyword not in keyword_table:
-                        keyword_table[keyword] = set()
-                    keyword_table[keyword].add(str(id))
-
-            self.update(
-                keyword_table_record,
-                keyword_table={field: list(value) for field, value in keyword_table.items()}
-            )
\ No newline at end of file
+    def _lock_keyword_table(self, dataset_id: UUID) -> KeywordTable:
+        """在当前事务内排他锁定知识库的关键词表记录, 仅用于重建, 会等待并阻塞所有增删片段的事务"""
+        return self.db.session.query(KeywordTable).filter(
+            KeywordTable.dataset_id == dataset_id,
+        ).with_for_update().first()
+
+    def _share_lock_keyword_table(self, dataset_id: UUID) -> int:
+        """在当前事务内以KEY SHARE模式锁定知识库的关键词表记录并返回下一个可分配的序号,
+        增删片段的事务之间以及与分配序号、累加统计信息的更新互不阻塞, 只与重建互斥"""
+        return self.db.session.query(KeywordTable).with_entities(
+            KeywordTable.next_ordinal,
+        ).filter(
+            KeywordTable.dataset_id == dataset_id,
+        ).with_for_update(read=True, key_share=True).scalar()
+
+    def _allocate_ordinals(self, dataset_id: UUID, count: int) -> int:
+        """在独立的短事务内为知识库分配count个连续的片段序号并返回起始序号"""
+        with self.db.auto_commit():
+            next_ordinal = self.db.session.execute(
+                update(KeywordTable).where(
+                    KeywordTable.dataset_id == dataset_id,
+                ).values(
+                    next_ordinal=KeywordTable.next_ordinal + count,
+                ).returning(KeywordTable.next_ordinal)
+            ).scalar_one()
+
+        return next_ordinal - count
+
+    def _check_ordinals(self, dataset_id: UUID, start_ordinal: int, end_ordinal: int) -> bool:
+        """在当前事务内锁定关键词表记录并校验分配的序号区间[start_ordinal, end_ordinal)仍然可用,
+        分配后知识库被重建会重置下一个可分配的序号, 区间可能与重建后的序号重叠"""
+        next_ordinal = self._share_lock_keyword_table(dataset_id)
+        if next_ordinal is None or next_ordinal < end_ordinal:
+            return False
+
+        return not self.db.session.query(
+            self.db.session.query(KeywordSegment).filter(
+                KeywordSegment.dataset_id == dataset_id,
+                KeywordSegment.ordinal >= start_ordinal,
+                KeywordSegment.ordinal < end_ordinal,
+            ).exists()
+        ).scalar()
+
+    def _update_statistics(self, dataset_id: UUID, segment_count: int, token_count: int) -> None:
+        """在当前事务内原子累加知识库关键词表的片段数与分词总数, 该语句到事务提交期间锁定关键词表记录"""
+        self.db.session.execute(
+            update(KeywordTable).where(
+                KeywordTable.dataset_id == dataset_id,
+            ).values(
+                segment_count=func.greatest(KeywordTable.segment_count + segment_count, 0),
+                token_count=func.greatest(KeywordTable.token_count + token_count, 0),
+            )
+        )
+
+    def _insert_keyword_segments(self, dataset_id: UUID, keyword_segments: list[dict]) -> set[str]:
+        """在当前事务内批量写入片段序号记录, 已存在的片段会被跳过, 返回实际写入的片段id"""
+        inserted_segment_ids = set()
+        rows = [{
+            "dataset_id": dataset_id,
+            "segment_id": keyword_segment["segment_id"],
+            "ordinal": keyword_segment["ordinal"],
+            "keywords": keyword_segment["keywords"],
+            "segment_length": keyword_segment["segment_length"],
+        } for keyword_segment in keyword_segments]
+        for i in range(0, len(rows), KEYWORD_POSTING_BATCH_SIZE):
+            inserted_segment_ids.update([
+                str(segment_id) for segment_id, in self.db.session.execute(
+                    insert(KeywordSegment).values(rows[i:i + KEYWORD_POSTING_BATCH_SIZE]).on_conflict_do_nothing(
+                        constraint="uk_keyword_segment_dataset_id_segment_id",
+                    ).returning(KeywordSegment.segment_id)
+                ).all()
+            ])
+
+        return inserted_segment_ids
+
+    def _write_postings(
+            self,
+            dataset_id: UUID,
+            added_postings: dict[str, PostingList],
+            removed_ordinals: dict[str, np.ndarray],
+    ) -> None:
+        """在当前事务内合并关键词的倒排列表, 先移除removed_ordinals中的片段序号再并入added_postings, 合并后为空的关键词会被删除,
+        只锁定涉及的关键词记录, 关键词按顺序加锁避免并发事务之间死锁"""
+        keywords = sorted(set(added_postings.keys()).union(removed_ordinals.keys()))
+        for i in range(0, len(keywords), KEYWORD_POSTING_BATCH_SIZE):
+            batch_keywords = keywords[i:i + KEYWORD_POSTING_BATCH_SIZE]
+
+            # 新关键词先写入空记录, 保证并发添加同一个关键词时也能在已有记录上加锁后合并
+            new_keywords = [keyword for keyword in batch_keywords if keyword in added_postings]
+            if new_keywords:
+                self.db.session.execute(insert(KeywordPosting).values([
+                    {"dataset_id": dataset_id, "keyword": keyword} for keyword in new_keywords
+                ]).on_conflict_do_nothing(constraint="uk_keyword_posting_dataset_id_keyword"))
+
+            postings = {
+                keyword: PostingList.from_bytes(segment_ordinals, frequencies, segment_lengths)
+                for keyword, segment_ordinals, frequencies, segment_lengths in self.db.session.query(
+                    KeywordPosting,
+                ).with_entities(
+                    KeywordPosting.keyword,
+                    KeywordPosting.segment_ordinals,
+                    KeywordPosting.frequencies,
+                    KeywordPosting.segment_lengths,
+                ).filter(
+                    KeywordPosting.dataset_id == dataset_id,
+                    KeywordPosting.keyword.in_(batch_keywords),
+                ).order_by(KeywordPosting.keyword).with_for_update().all()
+            }
+
+            rows, empty_keywords = [], []
+            for keyword in batch_keywords:
+                posting_list = postings.get(keyword, PostingList())
+                if keyword in removed_ordinals:
+                    posting_list = posting_list.difference(removed_ordinals[keyword])
+                if keyword in added_postings:
+                    posting_list = posting_list.union(added_postings[keyword])
+                if len(posting_list) == 0:
+                    empty_keywords.append(keyword)
+                    continue
+
+                segment_ordinals, frequencies, segment_lengths = posting_list.to_bytes()
+                rows.append({
+                    "dataset_id": dataset_id,
+                    "keyword": keyword,
+                    "segment_count": len(posting_list),
+                    "segment_ordinals": segment_ordinals,
+                    "frequencies": frequencies,
+                    "segment_lengths": segment_lengths,
+                })
+
+            if rows:
+                stmt = insert(KeywordPosting).values(rows)
+                self.db.session.execute(stmt.on_conflict_do_update(
+                    constraint="uk_keyword_posting_dataset_id_keyword",
+                    set_={
+                        "segment_count": stmt.excluded.segment_count,
+                        "segment_ordinals": stmt.excluded.segment_ordinals,
+                        "frequencies": stmt.excluded.frequencies,
+                        "segment_lengths": stmt.excluded.segment_lengths,
+                        "updated_at": datetime.now(),
+                    },
+                ))
+            if empty_keywords:
+                self.db.session.execute(delete(KeywordPosting).where(
+                    KeywordPosting.dataset_id == dataset_id,
+                    KeywordPosting.keyword.in_(empty_keywords),
+                ))
+
+    @classmethod
+    def _group_postings(cls, keyword_segments: list[dict]) -> dict[str, PostingList]:
+        """将已分配序号的片段按关键词分组为倒排列表, 片段需要按序号升序传递"""
+        groups = {}
+        for keyword_segment in keyword_segments:
+            for keyword, frequency in zip(keyword_segment["keywords"], keyword_segment["frequencies"]):
+                group = groups.setdefault(keyword, ([], [], []))
+                group[0].append(keyword_segment["ordinal"])
+                group[1].append(frequency)
+                group[2].append(keyword_segment["segment_length"])
+
+        return {keyword: PostingList(*group) for keyword, group in groups.items()}
+
+    @classmethod
+    def _build_keyword_segments(cls, segments: list[tuple[UUID | str, list[str], str]]) -> list[dict]:
+        """根据片段列表构建待建立索引的片段, 词频与片段长度来自同一次jieba分词,
+        词频为关键词作为完整分词出现的次数(至少为1), 片段长度为分词数, 没有关键词的片段会被忽略"""
+        keyword_segments = {}
+        segments = [
+            (str(segment_id), list(dict.fromkeys(keywords)), content)
+            for segment_id, keywords, content in segments if keywords
+        ]
+        frequencies_list = JiebaService.count_keyword_frequencies_batch(
+            [content for _, _, content in segments],
+            [keywords for _, keywords, _ in segments],
+        )
+        for (segment_id, keywords, _), (frequencies, segment_length) in zip(segments, frequencies_list):
+            keyword_segments[segment_id] = {
+                "segment_id": segment_id,
+                "keywords": keywords,
+                "frequencies": [max(1, frequency) for frequency in frequencies],
+                "segment_length": max(1, segment_length),
+            }
+
+        return list(keyword_segments.values())
@@ -1,9 +1,20 @@
-import re
+import threading
+from collections import OrderedDict
 from typing import Callable
 from injector import inject
 from dataclasses import dataclass
 from internal.model import ProcessRule
+from internal.core.text_cleaner import TextCleaner
+from internal.core.text_splitter import TokenOffsetTextSplitter
 from langchain.text_splitter import TextSplitter, RecursiveCharacterTextSplitter
+from tiktoken import Encoding
+
+# 编译后文本清洗器的最大缓存条数
+MAX_TEXT_CLEANER_CACHE_SIZE = 128
+
+_text_cleaners: OrderedDict[tuple[str, str], TextCleaner] = OrderedDict()
+_text_cleaners_lock = threading.Lock()
+
 
 @inject
 @dataclass
@@ -15,9 +26,21 @@ class ProcessRuleService:
             cls,
             process_rule: ProcessRule,
             length_function: Callable[[str], int] = len,
+            encoding: Encoding = None,
             **kwargs
     ) -> TextSplitter:
-        """根据传递的处理规则+长度计算函数, 获取相应的文本分割器"""
+        """根据传递的处理规则+长度计算函数, 获取相应的文本分割器, 传递了编码器时使用基于token偏移的分割器"""
+        if encoding is not None:
+            return TokenOffsetTextSplitter(
+                encoding=encoding,
+                chunk_size=process_rule.rule["segment"]["chunk_size"],
+                chunk_overlap=process_rule.rule["segment"]["chunk_overlap"],
+                separators=process_rule.rule["segment"]["separators"],
+                is_separator_regex=True,
+                length_function=length_function,
+                **kwargs
+            )
+
         return RecursiveCharacterTextSplitter(
             chunk_size=process_rule.rule["segment"]["chunk_size"],
             chunk_overlap=process_rule.rule["segment"]["chunk_overlap"],
@@ -27,18 +50,24 @@ class ProcessRuleService:
             **kwargs
         )
 
+    @classmethod
+    def get_text_cleaner_by_process_rule(cls, process_rule: ProcessRule) -> TextCleaner:
+        """根据传递的处理规则获取编译后的文本清洗器, 并按规则id+版本(更新时间)缓存"""
+        key = (str(process_rule.id), str(process_rule.updated_at))
+        with _text_cleaners_lock:
+            if key in _text_cleaners:
+                _text_cleaners.move_to_end(key)
+                return _text_cleaners[key]
+
+        text_cleaner = TextCleaner(process_rule.rule["pre_process_rules"])
+        with _text_cleaners_lock:
+            _text_cleaners[key] = text_cleaner
+            while len(_text_cleaners) > MAX_TEXT_CLEANER_CACHE_SIZE:
+                _text_cleaners.popitem(last=False)
+
+        return text_cleaner
+
     @classmethod
     def clean_text_by_process_rule(cls, text: str, process_rule: ProcessRule) -> str:
         """根据传递的处理规则清楚多余的字符串"""
-        for pre_process_rule in process_rule.rule["pre_process_rules"]:
-            if pre_process_rule["id"] == "remove_extra_space" and pre_process_rule["enabled"]:
-                pattern = r'\n{3,}'
-                text = re.sub(pattern, '\n\n', text)
-                pattern = r'[\t\f\r\x20\u00a0\u1680\u180e\u2000-\u200a\u202f\u205f\u3000]{2,}'
-                text = re.sub(pattern, ' ', text)
-            if pre_process_rule["id"] == "remove_url_and_email" and pre_process_rule["enabled"]:
-                pattern = r'([a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)'
-                text = re.sub(pattern, '', text)
-                pattern = r'https?://[^\s]+'
-                text = re.sub(pattern, '', text)
-        return text
\ No newline at end of file
+        return cls.get_text_cleaner_by_process_rule(process_rule).clean(text)
@@ -0,0 +1,94 @@
+import json
+from hashlib import sha256
+from typing import Any, Iterable, Optional
+from uuid import UUID
+
+from flask import current_app
+from injector import inject
+from dataclasses import dataclass
+from langchain_core.documents import Document as LCDocument
+from redis import Redis
+
+from internal.entity.cache_entity import CACHE_DATASET_VERSION, CACHE_RETRIEVAL_RESULT, CACHE_RETRIEVAL_STATS
+
+
+@inject
+@dataclass
+class RetrievalCacheService:
+    """检索结果缓存服务, 缓存键包含知识库的内容版本号, 知识库下的文档或片段变更时递增版本号,
+    旧版本号下的检索结果不会再被读取, 只会在过期后被清除"""
+    redis_client: Redis
+
+    def get_cache_key(
+            self,
+            dataset_ids: list[UUID],
+            retrieval_strategy: str,
+            k: int,
+            score: float,
+            query: str,
+    ) -> Optional[str]:
+        """根据知识库列表及其当前版本号、检索策略、检索参数与规整后的query构建缓存键, 未启用缓存时返回None"""
+        if current_app.config.get("RETRIEVAL_CACHE_EXPIRE") <= 0:
+            return None
+
+        dataset_ids = sorted(str(dataset_id) for dataset_id in dataset_ids)
+        versions = [int(version or 0) for version in self.redis_client.mget([
+            CACHE_DATASET_VERSION.format(dataset_id=dataset_id) for dataset_id in dataset_ids
+        ])]
+        payload = json.dumps(
+            [dataset_ids, versions, str(retrieval_strategy), int(k), float(score), " ".join(query.split())],
+            ensure_ascii=False,
+        )
+
+        return CACHE_RETRIEVAL_RESULT.format(hash=sha256(payload.encode()).hexdigest())
+
+    def get_documents(self, cache_key: str, dataset_ids: list[UUID]) -> Optional[list[LCDocument]]:
+        """读取缓存的检索结果, 同时记录每个知识库的命中与未命中次数, 未命中时返回None"""
+        value = self.redis_client.get(cache_key)
+        self._record_stats(dataset_ids, "hits" if value is not None else "misses")
+        if value is None:
+            return None
+
+        return [LCDocument(page_content=item["page_content"], metadata=item["metadata"]) for item in json.loads(value)]
+
+    def set_documents(self, cache_key: str, lc_documents: list[LCDocument]) -> None:
+        """缓存检索结果"""
+        self.redis_client.setex(
+            cache_key,
+            current_app.config.get("RETRIEVAL_CACHE_EXPIRE"),
+            json.dumps(
+                [{"page_content": document.page_content, "metadata": document.metadata} for document in lc_documents],
+                ensure_ascii=False,
+                default=str,
+            ),
+        )
+
+    def bump_dataset_versions(self, dataset_ids: Iterable[Any]) -> None:
+        """递增知识库的内容版本号, 使这些知识库相关的检索结果缓存失效, 需要在变更提交后调用"""
+        dataset_ids = {str(dataset_id) for dataset_id in dataset_ids}
+        if not dataset_ids:
+            return
+
+        with self.redis_client.pipeline(transaction=False) as pipeline:
+            for dataset_id in dataset_ids:
+                pipeline.incr(CACHE_DATASET_VERSION.format(dataset_id=dataset_id))
+            pipeline.execute()
+
+    def get_cache_stats(self, dataset_id: UUID) -> dict[str, Any]:
+        """获取知识库检索结果缓存的命中次数、未命中次数与命中率"""
+        stats = self.redis_client.hgetall(CACHE_RETRIEVAL_STATS.format(dataset_id=dataset_id))
+        hits = int(stats.get(b"hits", 0))
+        misses = int(stats.get(b"misses", 0))
+
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses > 0 else 0,
+        }
+
+    def _record_stats(self, dataset_ids: list[UUID], name: str) -> None:
+        """为本次检索涉及的每个知识库累加命中或未命中次数"""
+        with self.redis_client.pipeline(transaction=False) as pipeline:
+            for dataset_id in {str(dataset_id) for dataset_id in dataset_ids}:
+                pipeline.hincrby(CACHE_RETRIEVAL_STATS.format(dataset_id=dataset_id), name, 1)
+            pipeline.execute()
@@ -1,6 +1,6 @@
 from uuid import UUID
 
-from flask import Flask
+from flask import Flask, current_app
 from injector import inject
 from dataclasses import dataclass
 
@@ -10,11 +10,14 @@ from pkg.sqlalchemy import SQLAlchemy
 from .base_service import BaseService
 from .vector_database_service import VectorDatabaseService
 from .jieba_service import JiebaService
+from .keyword_table_service import KeywordTableService
+from .disabled_document_service import DisabledDocumentService
+from .retrieval_cache_service import RetrievalCacheService
 from langchain_core.documents import Document as LCDocument
-from langchain.retrievers import EnsembleRetriever
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.tools import BaseTool, tool
 from langchain_core.pydantic_v1 import BaseModel, Field
-from internal.entity.dataset_entity import RetrievalStrategy, RetrievalSource
+from internal.entity.dataset_entity import RetrievalStrategy, RetrievalSource, FullTextRetrievalBackend
 from internal.model import Dataset, DatasetQuery, Segment, Account
 from internal.exception import NotFoundException
 from internal.core.agent.entities.agent_entity import DATASET_RETRIEVAL_TOOL_NAME
@@ -27,6 +30,9 @@ class RetrievalService(BaseService):
     db: SQLAlchemy
     vector_database_service: VectorDatabaseService
     jieba_service: JiebaService
+    keyword_table_service: KeywordTableService
+    disabled_document_service: DisabledDocumentService
+    retrieval_cache_service: RetrievalCacheService
 
     def search_in_datasets(
             self,
@@ -38,7 +44,7 @@ class RetrievalService(BaseService):
             score: float = 0,
             retrieval_source: str = RetrievalSource.HIT_TESTING,
     ) -> list[LCDocument]:
-        """根据传递的query+知识库列表执行检索, 并返回检索的文档+得分"""
+        """根据传递的query+知识库列表执行检索, 并返回检索的文档+得分, 知识库内容未变更时直接复用缓存的检索结果"""
         datasets = self.db.session.query(Dataset).filter(
             Dataset.id.in_(dataset_ids),
             Dataset.account_id == account_id,
@@ -47,34 +53,13 @@ class RetrievalService(BaseService):
             raise NotFoundException("当前无知识库可执行检索")
         dataset_ids = [dataset.id for dataset in datasets]
 
-        from internal.core.retrievers import SemanticRetriever, FullTextRetriever
-        semantic_retriever = SemanticRetriever(
-            dataset_ids=dataset_ids,
-            vector_store=self.vector_database_service.vector_store,
-            search_kwargs={
-                "k": k,
-                "score_threshold": score,
-            }
-        )
-        full_text_retriever = FullTextRetriever(
-            db=self.db,
-            dataset_ids=dataset_ids,
-            jieba_service=self.jieba_service,
-            search_kwargs={
-                "k": k
-            }
-        )
-        hybrid_retriever = EnsembleRetriever(
-            retrievers=[semantic_retriever, full_text_retriever],
-            weights=[0.5, 0.5],
-        )
-
-        if retrieval_strategy == RetrievalStrategy.SEMANTIC:
-            lc_documents = semantic_retriever.invoke(query)
-        elif retrieval_strategy == RetrievalStrategy.FULL_TEXT:
-            lc_documents = full_text_retriever.invoke(query)
-        else:
-            lc_documents = hybrid_retriever.invoke(query)
+        # 缓存键在检索前构建, 检索期间发生的变更会递增版本号, 本次结果只会写入旧版本号的缓存
+        cache_key = self.retrieval_cache_service.get_cache_key(dataset_ids, retrieval_strategy, k, score, query)
+        lc_documents = self.retrieval_cache_service.get_documents(cache_key, dataset_ids) if cache_key else None
+        if lc_documents is None:
+            lc_documents = self._retrieve(dataset_ids, query, retrieval_strategy, k, score)
+            if lc_documents is not None and cache_key:
+                self.retrieval_cache_service.set_documents(cache_key, lc_documents)
 
         if lc_documents is None:
             return []
@@ -99,6 +84,78 @@ class RetrievalService(BaseService):
 
         return lc_documents
 
+    def _retrieve(
+            self,
+            dataset_ids: list[UUID],
+            query: str,
+            retrieval_strategy: str,
+            k: int,
+            score: float,
+    ) -> list[LCDocument]:
+        """根据检索策略构建检索器并执行检索"""
+        from internal.core.retrievers import (
+            SemanticRetriever,
+            FullTextRetriever,
+            PostgresFullTextRetriever,
+            HybridRetriever,
+        )
+
+        def build_semantic_retriever() -> SemanticRetriever:
+            """构建向量检索器, 查询时排除模式下附带知识库的禁用文档id列表"""
+            return SemanticRetriever(
+                dataset_ids=dataset_ids,
+                vector_database_service=self.vector_database_service,
+                excluded_document_ids=(
+                    self.disabled_document_service.get_disabled_document_ids(dataset_ids)
+                    if self.disabled_document_service.is_exclusion_mode() else None
+                ),
+                search_kwargs={
+                    "k": k,
+                    "score_threshold": score,
+                }
+            )
+
+        def build_full_text_retriever(statement_timeout: float = 0) -> BaseRetriever:
+            """根据配置的全文检索后端构建全文检索器, 语句超时时间为0时不限制查询耗时"""
+            if current_app.config.get("FULL_TEXT_RETRIEVAL_BACKEND") == FullTextRetrievalBackend.POSTGRES:
+                return PostgresFullTextRetriever(
+                    db=self.db,
+                    dataset_ids=dataset_ids,
+                    jieba_service=self.jieba_service,
+                    statement_timeout=statement_timeout,
+                    search_kwargs={
+                        "k": k
+                    }
+                )
+            return FullTextRetriever(
+                db=self.db,
+                dataset_ids=dataset_ids,
+                jieba_service=self.jieba_service,
+                keyword_table_service=self.keyword_table_service,
+                statement_timeout=statement_timeout,
+                search_kwargs={
+                    "k": k
+                }
+            )
+
+        if retrieval_strategy == RetrievalStrategy.SEMANTIC:
+            return build_semantic_retriever().invoke(query)
+        elif retrieval_strategy == RetrievalStrategy.FULL_TEXT:
+            return build_full_text_retriever().invoke(query)
+
+        # 混合检索中每个检索器使用独立的超时时间, 全文检索的数据库查询超时后由数据库取消, 不会在后台继续占用连接
+        full_text_timeout = current_app.config.get("HYBRID_FULL_TEXT_RETRIEVAL_TIMEOUT")
+        hybrid_retriever = HybridRetriever(
+            flask_app=current_app._get_current_object(),
+            retrievers=[build_semantic_retriever(), build_full_text_retriever(full_text_timeout)],
+            weights=[0.5, 0.5],
+            timeouts=[current_app.config.get("HYBRID_SEMANTIC_RETRIEVAL_TIMEOUT"), full_text_timeout],
+            search_kwargs={
+                "k": k
+            }
+        )
+        return hybrid_retriever.invoke(query)
+
     def create_langchain_tool_from_search(
             self,
             flask_app: Flask,
@@ -22,8 +22,10 @@ from sqlalchemy import asc, func
 from redis import Redis
 from .keyword_table_service import KeywordTableService
 from .vector_database_service import VectorDatabaseService
-from .embeddings_service import EmbeddingsService
+from .token_count_service import TokenCountService
 from .jieba_service import JiebaService
+from .disabled_document_service import DisabledDocumentService
+from .retrieval_cache_service import RetrievalCacheService
 from langchain_core.documents import Document as LCDocument
 
 @inject
@@ -34,12 +36,13 @@ class SegmentService(BaseService):
     redis_client: Redis
     keyword_table_service: KeywordTableService
     vector_base_service: VectorDatabaseService
-    embedding_service: EmbeddingsService
+    token_count_service: TokenCountService
     jieba_service: JiebaService
+    retrieval_cache_service: RetrievalCacheService
 
     def create_segment(self, dataset_id: UUID, document_id: UUID, req: CreateSegmentReq, account: Account) -> Segment:
         """根据传递的信息新增文档片段"""
-        token_count = self.embedding_service.calculate_token_count(req.content.data)
+        token_count = self.token_count_service.calculate_token_count(req.content.data)
         if token_count > 1000:
             raise ValidateErrorException("片段的内容长度不能超过1000token")
 
@@ -71,6 +74,10 @@ class SegmentService(BaseService):
                 character_count=len(req.content.data),
                 token_count=token_count,
                 keywords=req.keywords.data,
+                search_vector=(
+                    self.jieba_service.build_search_vector(req.content.data)
+                    if self.jieba_service.is_search_vector_enabled() else None
+                ),
                 hash=generate_text_hash(req.content.data),
                 enabled=True,
                 processing_started_at=datetime.now(),
@@ -79,7 +86,7 @@ class SegmentService(BaseService):
                 status=SegmentStatus.COMPLETED
             )
 
-            self.vector_base_service.vector_store.add_documents([LCDocument(
+            failed_ids = self.vector_base_service.add_documents([LCDocument(
                 page_content=req.content.data,
                 metadata={
                     "account_id": str(document.account_id),
@@ -91,6 +98,8 @@ class SegmentService(BaseService):
                     "segment_enabled": segment.enabled
                 }
             )], ids=[str(segment.node_id)])
+            if failed_ids:
+                raise FailException("写入向量数据库失败")
 
             document_character_count, document_token_count = self.db.session.query(
                 func.coalesce(func.sum(Segment.character_count), 0),
@@ -105,7 +114,7 @@ class SegmentService(BaseService):
                 token_count=document_token_count,
             )
 
-            if document.enabled:
+            if document.enabled or DisabledDocumentService.is_exclusion_mode():
                 self.keyword_table_service.add_keyword_table_from_ids(dataset_id, [segment.id])
 
         except Exception as e:
@@ -122,6 +131,8 @@ class SegmentService(BaseService):
                 )
 
             raise FailException("新增文档片段失败")
+        finally:
+            self.retrieval_cache_service.bump_dataset_versions([dataset_id])
 
 
     def update_segment(self, dataset_id: UUID, document_id: UUID, segment_id: UUID, req: UpdateSegmentReq, account: Account) -> Segment:
@@ -138,7 +149,7 @@ class SegmentService(BaseService):
         if segment.status != SegmentStatus.COMPLETED:
             raise FailException("当前片段不可修改状态")
 
-        token_count = self.embedding_service.calculate_token_count(req.content.data)
+        token_count = self.token_count_service.calculate_token_count(req.content.data)
         if token_count > 1000:
             raise ValidateErrorException("片段的内容长度不能超过1000token")
 
@@ -155,6 +166,10 @@ class SegmentService(BaseService):
                 character_count=len(req.content.data),
                 token_count=token_count,
                 keywords=req.keywords.data,
+                search_vector=(
+                    self.jieba_service.build_search_vector(req.content.data)
+                    if self.jieba_service.is_search_vector_enabled() else None
+                ),
                 hash=new_hash,
             )
 
@@ -177,16 +192,12 @@ class SegmentService(BaseService):
                     token_count=document_token_count,
                 )
 
-                self.vector_base_service.collection.data.update(
-                    uuid=str(segment.node_id),
-                    properties={
-                        "text": req.content.data,
-                    },
-                    vector=self.embedding_service.embeddings.embed_query(req.content.data)
-                )
+                self.vector_base_service.update_document(dataset_id, segment.node_id, req.content.data)
         except Exception as e:
             logging.exception("更新文档片段异常")
             raise FailException("更新文档片段失败")
+        finally:
+            self.retrieval_cache_service.bump_dataset_versions([dataset_id])
 
     def get_segments_with_page(
             self,
@@ -257,15 +268,18 @@ class SegmentService(BaseService):
                 )
 
                 document = segment.document
-                if enabled and document.enabled:
+                if enabled and (document.enabled or DisabledDocumentService.is_exclusion_mode()):
                     self.keyword_table_service.add_keyword_table_from_ids(dataset_id, [segment.id])
                 else:
                     self.keyword_table_service.delete_keyword_table_from_ids(dataset_id, [segment.id])
 
-                self.vector_base_service.collection.data.update(
-                    uuid=segment.node_id,
-                    properties={"segment_enabled": enabled}
+                errors = self.vector_base_service.update_properties(
+                    dataset_id,
+                    [segment.node_id],
+                    {"segment_enabled": enabled},
                 )
+                if errors:
+                    raise FailException(errors[str(segment.node_id)])
 
             except Exception as e:
                 logging.exception("更改文档片段启用状态出现异常")
@@ -278,6 +292,8 @@ class SegmentService(BaseService):
                     stopped_at=datetime.now(),
                 )
                 raise FailException("更新文档片段启用失败")
+            finally:
+                self.retrieval_cache_service.bump_dataset_versions([dataset_id])
 
     def delete_segment(self, dataset_id: UUID, document_id: UUID, segment_id: UUID, account: Account) -> Segment:
         """根据传递的信息删除指定片段"""
@@ -299,7 +315,7 @@ class SegmentService(BaseService):
         self.keyword_table_service.delete_keyword_table_from_ids(dataset_id, [segment_id])
 
         try:
-            self.vector_base_service.collection.data.delete_by_id(str(segment.node_id))
+            self.vector_base_service.delete_by_ids(dataset_id, [segment.node_id])
         except Exception as e:
             logging.exception("删除文档片段失败")
 
@@ -315,5 +331,6 @@ class SegmentService(BaseService):
             character_count=document_character_count,
             token_count=document_token_count,
         )
+        self.retrieval_cache_service.bump_dataset_versions([dataset_id])
 
         return segment
\ No newline at end of file
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable
+
+import tiktoken
+from injector import inject
+from dataclasses import dataclass
+from tiktoken import Encoding
+from internal.lib.helper import generate_text_hash
+
+# 默认用于计算token数的模型名字
+DEFAULT_TOKEN_COUNT_MODEL = "gpt-3.5"
+
+# 文本哈希备忘的最大条数
+MAX_TOKEN_COUNT_MEMO_SIZE = 100000
+
+# 批量编码时使用的线程数
+ENCODE_BATCH_NUM_THREADS = 8
+
+_memo: OrderedDict[tuple[str, str], int] = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+@inject
+@dataclass
+class TokenCountService:
+    """token计数服务, 缓存各模型的编码器并提供批量计数、文本哈希备忘"""
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def get_encoding(cls, model: str = DEFAULT_TOKEN_COUNT_MODEL) -> Encoding:
+        """根据传递的模型名字获取编码器, 同一个模型在进程内只会构建一次"""
+        return tiktoken.encoding_for_model(model)
+
+    @classmethod
+    def calculate_token_count(cls, text: str, model: str = DEFAULT_TOKEN_COUNT_MODEL, use_memo: bool = False) -> int:
+        """计算传入文本的token数, use_memo为True时会以文本哈希为键记录计算结果"""
+        if not use_memo:
+            return len(cls.get_encoding(model).encode(text))
+        return cls.calculate_token_counts([text], model, use_memo)[0]
+
+    @classmethod
+    def calculate_token_counts(
+            cls,
+            texts: list[str],
+            model: str = DEFAULT_TOKEN_COUNT_MODEL,
+            use_memo: bool = False,
+    ) -> list[int]:
+        """批量计算传入文本列表的token数, 未命中备忘的文本通过encode_batch一次性编码"""
+        encoding = cls.get_encoding(model)
+        if not use_memo:
+            return [len(tokens) for tokens in encoding.encode_batch(texts, num_threads=ENCODE_BATCH_NUM_THREADS)]
+
+        # 1.先从备忘中读取已经计算过的文本
+        keys = [(model, generate_text_hash(text)) for text in texts]
+        token_counts = [None] * len(texts)
+        with _memo_lock:
+            for index, key in enumerate(keys):
+                if key in _memo:
+                    _memo.move_to_end(key)
+                    token_counts[index] = _memo[key]
+
+        # 2.未命中的文本批量编码并写回备忘, 超出上限时淘汰最久未使用的记录
+        missing_indexes = [index for index, token_count in enumerate(token_counts) if token_count is None]
+        if missing_indexes:
+            encoded = encoding.encode_batch(
+                [texts[index] for index in missing_indexes],
+                num_threads=ENCODE_BATCH_NUM_THREADS,
+            )
+            with _memo_lock:
+                for index, tokens in zip(missing_indexes, encoded):
+                    token_counts[index] = len(tokens)
+                    _memo[keys[index]] = len(tokens)
+                while len(_memo) > MAX_TOKEN_COUNT_MEMO_SIZE:
+                    _memo.popitem(last=False)
+
+        return token_counts
+
+    @classmethod
+    def get_length_function(cls, model: str = DEFAULT_TOKEN_COUNT_MODEL) -> Callable[[str], int]:
+        """获取带备忘的长度计算函数, 用于文本分割器这类会重复计算相同文本的场景"""
+        def length_function(text: str) -> int:
+            return cls.calculate_token_count(text, model, use_memo=True)
+
+        return length_function
@@ -1,40 +1,131 @@
+import atexit
+import logging
 import os
-import weaviate
+import threading
+from typing import Optional
+
+from flask import current_app
 from injector import inject
-from langchain_core.vectorstores import VectorStoreRetriever
-from langchain_weaviate import WeaviateVectorStore
-from weaviate import WeaviateClient
-from weaviate.auth import AuthApiKey
+from langchain_core.documents import Document as LCDocument
+
+from internal.core.vector_database import BaseVectorDatabase, LocalVectorDatabase, WeaviateVectorDatabase
+from internal.entity.dataset_entity import VectorDatabaseBackend
 from .embeddings_service import EmbeddingsService
-from weaviate.collections import Collection
 
 COLLECTION_NAME = "Dataset"
 
+_vector_database: Optional[BaseVectorDatabase] = None
+_vector_database_pid = None
+_vector_database_lock = threading.Lock()
+
+
 @inject
 class VectorDatabaseService:
-    """向量数据库服务"""
-    client: WeaviateClient
-    vector_store: WeaviateVectorStore
+    """向量数据库服务, 根据配置将写入、更新、删除与检索交由Weaviate或本地嵌入式向量库执行"""
     embeddings_service: EmbeddingsService
 
     def __init__(self, embeddings_service: EmbeddingsService):
         self.embeddings_service = embeddings_service
-        self.client = weaviate.connect_to_weaviate_cloud(
-            cluster_url=os.getenv("WEAVIATE_URL"),
-            auth_credentials=AuthApiKey(os.getenv("WEAVIATE_API_KEY"))
+
+    @property
+    def vector_database(self) -> BaseVectorDatabase:
+        """获取当前进程共享的向量数据库后端, 首次使用时根据配置创建, fork出的子进程会重新创建连接"""
+        global _vector_database, _vector_database_pid
+        with _vector_database_lock:
+            if _vector_database_pid != os.getpid():
+                # 父进程的连接不能在子进程中复用, 也不能由子进程关闭, 直接丢弃即可
+                if current_app.config.get("VECTOR_DATABASE_BACKEND") == VectorDatabaseBackend.LOCAL:
+                    path = current_app.config.get("VECTOR_DATABASE_LOCAL_PATH")
+                    _vector_database = LocalVectorDatabase(
+                        path=path or os.path.join(os.getcwd(), "storage", "vector_database"),
+                        max_records=int(current_app.config.get("VECTOR_DATABASE_LOCAL_MAX_RECORDS")),
+                    )
+                else:
+                    _vector_database = WeaviateVectorDatabase(
+                        cluster_url=os.getenv("WEAVIATE_URL"),
+                        api_key=os.getenv("WEAVIATE_API_KEY"),
+                        collection_name=COLLECTION_NAME,
+                    )
+                _vector_database_pid = os.getpid()
+            return _vector_database
+
+    @classmethod
+    def close(cls) -> None:
+        """关闭当前进程创建的向量数据库后端连接, 进程退出时自动调用"""
+        global _vector_database, _vector_database_pid
+        with _vector_database_lock:
+            if _vector_database is not None and _vector_database_pid == os.getpid():
+                try:
+                    _vector_database.close()
+                except Exception as e:
+                    logging.warning(f"关闭向量数据库连接失败, 错误信息: {str(e)}")
+            _vector_database = None
+            _vector_database_pid = None
+
+    def add_documents(self, documents: list[LCDocument], ids: list[str]) -> list[str]:
+        """计算文档向量后批量写入, 返回写入失败的id列表"""
+        vectors = self.embeddings_service.embeddings.embed_documents(
+            [document.page_content for document in documents],
         )
+        return self.add_documents_with_vectors(documents, vectors, ids)
+
+    def add_documents_with_vectors(
+            self,
+            documents: list[LCDocument],
+            vectors: list[list[float]],
+            ids: list[str],
+    ) -> list[str]:
+        """携带预计算的向量批量写入文档, 跳过向量数据库侧的嵌入计算, 返回写入失败的id列表"""
+        return self.vector_database.add_documents(documents, vectors, ids)
 
-        self.vector_store = WeaviateVectorStore(
-            client=self.client,
-            index_name=COLLECTION_NAME,
-            text_key="text",
-            embedding=self.embeddings_service.embeddings,
+    def update_document(self, dataset_id: str, id: str, text: str) -> None:
+        """更新单条记录的文本, 并重新计算向量"""
+        vector = self.embeddings_service.embeddings.embed_query(text)
+        self.vector_database.update_document(str(dataset_id), str(id), text, vector)
+
+    def update_properties(self, dataset_id: str, ids: list[str], properties: dict) -> dict[str, str]:
+        """批量更新记录的属性, 返回更新失败的{id: 错误信息}"""
+        return self.vector_database.update_properties(str(dataset_id), [str(id) for id in ids], properties)
+
+    def delete_by_ids(self, dataset_id: str, ids: list[str]) -> None:
+        """根据id列表删除记录"""
+        self.vector_database.delete_by_ids(str(dataset_id), [str(id) for id in ids])
+
+    def delete_by_document_id(self, dataset_id: str, document_id: str) -> None:
+        """删除文档下的所有记录"""
+        self.vector_database.delete_by_document_id(str(dataset_id), str(document_id))
+
+    def delete_by_dataset_id(self, dataset_id: str) -> None:
+        """删除知识库下的所有记录"""
+        self.vector_database.delete_by_dataset_id(str(dataset_id))
+
+    def similarity_search(
+            self,
+            query: str,
+            dataset_ids: list[str],
+            k: int = 4,
+            score_threshold: float = 0,
+            excluded_document_ids: Optional[list[str]] = None,
+    ) -> list[tuple[LCDocument, float]]:
+        """在指定知识库中检索与query最相似且文档、片段均启用的k条记录, query向量优先从缓存中获取,
+        传递了排除的文档id列表时改为排除这些文档, 不再依赖记录中的document_enabled"""
+        return self.vector_database.similarity_search(
+            query,
+            self.embeddings_service.embed_query(query),
+            [str(dataset_id) for dataset_id in dataset_ids],
+            k=k,
+            score_threshold=score_threshold,
+            excluded_document_ids=excluded_document_ids,
         )
 
-    def get_retriever(self) -> VectorStoreRetriever:
-        """获取检索器"""
-        return self.vector_store.as_retriever()
 
-    @property
-    def collection(self) -> Collection:
-        return self.client.collections.get(COLLECTION_NAME)
\ No newline at end of file
+def _reset_after_fork() -> None:
+    """fork后在子进程中重置锁与连接, 避免继承父进程中被其他线程持有的锁"""
+    global _vector_database, _vector_database_pid, _vector_database_lock
+    _vector_database = None
+    _vector_database_pid = None
+    _vector_database_lock = threading.Lock()
+
+
+atexit.register(VectorDatabaseService.close)
+os.register_at_fork(after_in_child=_reset_after_fork)
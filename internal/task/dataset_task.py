@@ -9,4 +9,31 @@ def delete_dataset(dataset_id: UUID) -> None:
     from internal.service import IndexService
 
     indexing_service = injector.get(IndexService)
-    indexing_service.delete_dataset(dataset_id)
\ No newline at end of file
+    indexing_service.delete_dataset(dataset_id)
+
+@shared_task
+def rebuild_keyword_tables() -> None:
+    """重建所有知识库的片段序号、倒排列表与统计信息, 用于迁移旧版关键词表与倒排记录"""
+    from app.http.app import injector
+    from internal.service import KeywordTableService
+
+    keyword_table_service = injector.get(KeywordTableService)
+    keyword_table_service.rebuild_keyword_tables()
+
+@shared_task
+def rebuild_search_vectors() -> None:
+    """为历史片段补齐全文检索向量, 用于启用Postgres全文检索后端"""
+    from app.http.app import injector
+    from internal.service import IndexService
+
+    indexing_service = injector.get(IndexService)
+    indexing_service.rebuild_search_vectors()
+
+@shared_task
+def sync_search_vectors() -> None:
+    """定时检测全文检索后端是否切换为Postgres, 切换后补齐历史片段的全文检索向量"""
+    from app.http.app import injector
+    from internal.service import IndexService
+
+    indexing_service = injector.get(IndexService)
+    indexing_service.sync_search_vectors()
\ No newline at end of file
@@ -11,6 +11,33 @@ def build_documents(document_ids: list[UUID]) -> None:
     indexing_service = injector.get(IndexService)
     indexing_service.build_documents(document_ids)
 
+@shared_task
+def reindex_documents(document_ids: list[UUID]) -> None:
+    """根据传递的文档id列表, 增量重建文档索引"""
+    from app.http.module import injector
+    from internal.service.indexing_service import IndexService
+
+    indexing_service = injector.get(IndexService)
+    indexing_service.reindex_documents(document_ids)
+
+@shared_task
+def resume_documents(document_ids: list[UUID]) -> None:
+    """根据传递的文档id列表, 从最后完成的阶段继续构建文档"""
+    from app.http.module import injector
+    from internal.service.indexing_service import IndexService
+
+    indexing_service = injector.get(IndexService)
+    indexing_service.resume_documents(document_ids)
+
+@shared_task
+def resume_stalled_documents() -> None:
+    """定时检测中断的文档构建任务并继续构建"""
+    from app.http.module import injector
+    from internal.service.indexing_service import IndexService
+
+    indexing_service = injector.get(IndexService)
+    indexing_service.resume_stalled_documents()
+
 @shared_task
 def update_document_enabled(document_id: UUID) -> None:
     """根据传递的文档id修改文档的状态"""
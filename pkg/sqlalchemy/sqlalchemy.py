@@ -1,6 +1,7 @@
 
 from contextlib import contextmanager
 from flask_sqlalchemy import SQLAlchemy as _SQLAlchemy
+from sqlalchemy import func, select
 
 class SQLAlchemy(_SQLAlchemy):
     """重写Flask-SQLAlchemy中的核心类, 实现自动提交"""
@@ -12,4 +13,8 @@ class SQLAlchemy(_SQLAlchemy):
             self.session.commit()
         except Exception as e:
             self.session.rollback()
-            raise e
\ No newline at end of file
+            raise e
+
+    def set_statement_timeout(self, timeout: float) -> None:
+        """为当前事务设置语句超时时间(单位为秒), 超时的语句会被数据库取消, 事务结束后失效"""
+        self.session.execute(select(func.set_config("statement_timeout", f"{int(timeout * 1000)}ms", True)))
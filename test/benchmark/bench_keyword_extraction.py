@@ -0,0 +1,46 @@
+"""
+关键词提取基准测试, 对比逐条提取与批量提取(进程池)在不同片段数量下的耗时, 并校验提取结果一致
+运行方式: python -m test.benchmark.bench_keyword_extraction
+"""
+import random
+import time
+
+from app.http.app import app
+from internal.lib import jieba_worker
+from internal.service import JiebaService
+
+SEGMENT_COUNTS = [100, 1000, 5000]
+WORDS = "LLMOps 平台 支持 知识库 检索 工作流 编排 与 多模型 接入 向量 数据库 关键词 提取 分词 大语言模型 应用 开发".split()
+
+
+def build_segments(count: int) -> list[str]:
+    """构建指定数量的模拟片段, 每个片段约500个字符"""
+    random.seed(count)
+    return ["，".join(random.choice(WORDS) for _ in range(150)) for _ in range(count)]
+
+
+def main():
+    with app.app_context():
+        # 预热进程池, 工作进程启动时会加载jieba词典
+        JiebaService.extract_keywords_batch(build_segments(app.config.get("JIEBA_BATCH_MIN_SIZE")))
+
+        print(f"{'segments':>10} {'serial(s)':>10} {'batch(s)':>10} {'speedup':>8} {'same':>6}")
+        for count in SEGMENT_COUNTS:
+            segments = build_segments(count)
+
+            start_at = time.perf_counter()
+            serial_keywords = [jieba_worker.extract_keywords(segment, 10) for segment in segments]
+            serial_latency = time.perf_counter() - start_at
+
+            start_at = time.perf_counter()
+            batch_keywords = JiebaService.extract_keywords_batch(segments, 10)
+            batch_latency = time.perf_counter() - start_at
+
+            print(
+                f"{count:>10} {serial_latency:>10.2f} {batch_latency:>10.2f} "
+                f"{serial_latency / batch_latency:>7.1f}x {str(serial_keywords == batch_keywords):>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+片段写入基准测试, 对比逐条创建(每条一个事务)与批量创建(一个事务)在不同片段数量下的耗时
+运行方式: python -m test.benchmark.bench_segment_insert
+"""
+import time
+import uuid
+
+from app.http.app import app
+from app.http.module import injector
+from internal.entity.dataset_entity import SegmentStatus
+from internal.lib.helper import generate_text_hash
+from internal.model import Segment
+from internal.service import BaseService
+from pkg.sqlalchemy import SQLAlchemy
+
+SEGMENT_COUNTS = [1000, 10000, 50000]
+
+
+class BenchmarkService(BaseService):
+    """基准测试使用的基础服务"""
+
+    def __init__(self, db: SQLAlchemy):
+        self.db = db
+
+
+def build_segment_rows(count: int) -> list[dict]:
+    """构建指定数量的模拟片段记录, 所有片段挂载在随机的知识库与文档下, 便于测试结束后清理"""
+    account_id, dataset_id, document_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    rows = []
+    for position in range(1, count + 1):
+        content = f"benchmark segment {position} " * 20
+        rows.append({
+            "account_id": account_id,
+            "dataset_id": dataset_id,
+            "document_id": document_id,
+            "node_id": uuid.uuid4(),
+            "position": position,
+            "content": content,
+            "character_count": len(content),
+            "token_count": 0,
+            "hash": generate_text_hash(content),
+            "status": SegmentStatus.WAITING,
+        })
+    return rows
+
+
+def clear_segments(service: BenchmarkService, document_id: uuid.UUID) -> None:
+    """清除基准测试写入的片段"""
+    with service.db.auto_commit():
+        service.db.session.query(Segment).filter(Segment.document_id == document_id).delete()
+
+
+def main():
+    with app.app_context():
+        service = BenchmarkService(injector.get(SQLAlchemy))
+
+        print(f"{'segments':>10} {'per-row(s)':>12} {'bulk(s)':>10} {'speedup':>8}")
+        for count in SEGMENT_COUNTS:
+            rows = build_segment_rows(count)
+            start_at = time.perf_counter()
+            for row in rows:
+                service.create(Segment, **row)
+            per_row_latency = time.perf_counter() - start_at
+            clear_segments(service, rows[0]["document_id"])
+
+            rows = build_segment_rows(count)
+            start_at = time.perf_counter()
+            service.create_many(Segment, rows, returning=[Segment.id, Segment.node_id])
+            bulk_latency = time.perf_counter() - start_at
+            clear_segments(service, rows[0]["document_id"])
+
+            print(f"{count:>10} {per_row_latency:>12.2f} {bulk_latency:>10.2f} {per_row_latency / bulk_latency:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+文本分割基准测试, 对比LangChain递归字符分割器(逐片段计算token数)与基于token偏移的分割器的耗时, 并校验分割结果一致
+运行方式: python -m test.benchmark.bench_text_splitter
+"""
+import random
+import time
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from internal.core.text_splitter import TokenOffsetTextSplitter
+from internal.entity.dataset_entity import DEFAULT_PROCESS_RULE
+from internal.service.token_count_service import TokenCountService
+
+TEXT_SIZES = [1, 5, 20]
+WORDS = "LLMOps 平台 支持 知识库 检索 工作流 编排 与 多模型 接入 retrieval augmented generation with large language models".split()
+PUNCTUATIONS = [" ", " ", " ", "，", "。", ", ", ". ", "\n", "\n\n"]
+
+
+def build_text(size_mb: int) -> str:
+    """构建指定大小(MB)的模拟文本, 由随机的词语、标点与换行组成"""
+    random.seed(size_mb)
+    parts, size = [], 0
+    while size < size_mb * 1024 * 1024:
+        part = random.choice(WORDS) + random.choice(PUNCTUATIONS)
+        parts.append(part)
+        size += len(part.encode("utf-8"))
+    return "".join(parts)
+
+
+def measure(text_splitter, text: str) -> tuple[list[str], float]:
+    """执行分割并返回分割结果与耗时"""
+    start_at = time.perf_counter()
+    chunks = text_splitter.split_text(text)
+    return chunks, time.perf_counter() - start_at
+
+
+def main():
+    segment = DEFAULT_PROCESS_RULE["rule"]["segment"]
+    encoding = TokenCountService.get_encoding()
+    kwargs = {
+        "chunk_size": segment["chunk_size"],
+        "chunk_overlap": segment["chunk_overlap"],
+        "separators": segment["separators"],
+        "is_separator_regex": True,
+        "length_function": TokenCountService.calculate_token_count,
+    }
+
+    # 预热编码器的token字符表, 只会在进程内构建一次
+    TokenOffsetTextSplitter(encoding, **kwargs).split_text(WORDS[0])
+
+    print(f"{'size(MB)':>10} {'langchain(s)':>14} {'token-offset(s)':>16} {'speedup':>8} {'same':>6}")
+    for size_mb in TEXT_SIZES:
+        text = build_text(size_mb)
+        langchain_chunks, langchain_latency = measure(RecursiveCharacterTextSplitter(**kwargs), text)
+        token_offset_chunks, token_offset_latency = measure(TokenOffsetTextSplitter(encoding, **kwargs), text)
+        print(
+            f"{size_mb:>10} {langchain_latency:>14.2f} {token_offset_latency:>16.2f} "
+            f"{langchain_latency / token_offset_latency:>7.1f}x {str(langchain_chunks == token_offset_chunks):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
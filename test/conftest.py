@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
 
 import pytest
 from app.http.app import app as _app
@@ -38,4 +40,130 @@ def db(app):
         # 回退数据库并关闭连接, 随后清除会话
         transaction.rollback()
         connection.close()
-        session.remove()
\ No newline at end of file
+        session.remove()
+
+class FakePipeline:
+    """直接执行命令的Redis管道, execute返回各命令的执行结果"""
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def __getattr__(self, name):
+        command = getattr(self.redis_client, name)
+
+        def execute_command(*args, **kwargs):
+            self.results.append(command(*args, **kwargs))
+            return self
+
+        return execute_command
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+
+class FakeRedis:
+    """只实现服务层所需命令的内存Redis客户端, 值统一以字节串存储, 过期时间只记录不生效"""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.expires = {}
+
+    @classmethod
+    def _to_bytes(cls, value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = self._to_bytes(value)
+        self.expires[key] = ex
+        return True
+
+    def setex(self, key, expire, value):
+        return self.set(key, value, ex=expire)
+
+    def delete(self, *keys):
+        count = 0
+        for key in keys:
+            count += int(self.values.pop(key, None) is not None or self.hashes.pop(key, None) is not None)
+            self.expires.pop(key, None)
+        return count
+
+    def incr(self, key):
+        self.values[key] = self._to_bytes(int(self.values.get(key, 0)) + 1)
+        return int(self.values[key])
+
+    def hincrby(self, key, field, amount=1):
+        fields = self.hashes.setdefault(key, {})
+        fields[self._to_bytes(field)] = self._to_bytes(int(fields.get(self._to_bytes(field), 0)) + amount)
+        return int(fields[self._to_bytes(field)])
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def publish(self, channel, message):
+        return 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakeSession:
+    """记录执行语句、提交与回滚次数的数据库会话"""
+
+    def __init__(self):
+        self.statements = []
+        self.commit_count = 0
+        self.rollback_count = 0
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+
+    def commit(self):
+        self.commit_count += 1
+
+    def rollback(self):
+        self.rollback_count += 1
+
+
+class FakeSQLAlchemy:
+    """只持有内存会话的数据库, auto_commit与pkg.sqlalchemy中的实现保持一致"""
+
+    def __init__(self):
+        self.session = FakeSession()
+
+    @contextmanager
+    def auto_commit(self):
+        try:
+            yield
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            raise e
+
+
+@pytest.fixture
+def redis_client():
+    """获取内存Redis客户端, 用于不依赖真实Redis的服务层测试"""
+    return FakeRedis()
+
+
+@pytest.fixture
+def fake_db():
+    """获取只记录执行语句的数据库, 用于不访问数据库的服务层测试"""
+    return FakeSQLAlchemy()
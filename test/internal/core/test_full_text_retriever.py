@@ -0,0 +1,59 @@
+import math
+
+import numpy as np
+import pytest
+
+from internal.core.posting_list import PostingList
+from internal.core.retrievers.full_text_retriever import BM25_B, BM25_K1, FullTextRetriever
+
+
+def bm25(frequency: float, segment_length: float, average_length: float, total: int, document_frequency: int) -> float:
+    """按BM25公式计算单个关键词在单个片段上的得分"""
+    idf = math.log(1 + (total - document_frequency + 0.5) / (document_frequency + 0.5))
+    return idf * frequency * (BM25_K1 + 1) / (
+            frequency + BM25_K1 * (1 - BM25_B + BM25_B * segment_length / average_length)
+    )
+
+
+class TestFullTextRetriever:
+    """全文检索器的测试类, 校验BM25得分与手工计算的结果一致"""
+
+    def test_bm25_scores(self):
+        """单个知识库下两个关键词的得分按片段累加, 片段长度按知识库平均长度归一化"""
+        postings = [{
+            "llm": PostingList([1, 3], [2, 1], [100, 50]),
+            "agent": PostingList([3], [3], [50]),
+        }]
+
+        segment_keys, scores = FullTextRetriever._bm25_scores(postings, 10, 1000)
+
+        # 片段数10, token总数1000, 平均片段长度为100, llm的文档频率为2, agent的文档频率为1
+        assert segment_keys.tolist() == [1, 3]
+        assert scores[0] == pytest.approx(math.log(4.4) * 5 / 3.5)
+        assert scores[1] == pytest.approx(math.log(4.4) * 2.5 / 1.9375 + math.log(22 / 3) * 7.5 / 3.9375)
+        assert scores[1] == pytest.approx(bm25(1, 50, 100, 10, 2) + bm25(3, 50, 100, 10, 1))
+
+    def test_bm25_scores_across_datasets(self):
+        """多个知识库的片段键互不冲突, 文档频率为各知识库倒排列表长度之和"""
+        postings = [
+            {"llm": PostingList([0, 5], [1, 4], [80, 120])},
+            {"llm": PostingList([5], [2], [100]), "agent": PostingList([5, 7], [1, 1], [100, 60])},
+        ]
+
+        segment_keys, scores = FullTextRetriever._bm25_scores(postings, 20, 2000)
+
+        assert segment_keys.tolist() == [0, 5, (1 << 32) + 5, (1 << 32) + 7]
+        assert np.allclose(scores, [
+            bm25(1, 80, 100, 20, 3),
+            bm25(4, 120, 100, 20, 3),
+            bm25(2, 100, 100, 20, 3) + bm25(1, 100, 100, 20, 2),
+            bm25(1, 60, 100, 20, 2),
+        ])
+
+    def test_bm25_scores_with_stale_statistics(self):
+        """统计信息为空时使用候选片段数与候选片段的平均长度计算"""
+        postings = [{"llm": PostingList([0, 1], [1, 2], [30, 90])}]
+
+        _, scores = FullTextRetriever._bm25_scores(postings, 0, 0)
+
+        assert np.allclose(scores, [bm25(1, 30, 60, 2, 2), bm25(2, 90, 60, 2, 2)])
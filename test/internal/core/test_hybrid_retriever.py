@@ -0,0 +1,130 @@
+import time
+from typing import List
+
+import pytest
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document as LCDocument
+from langchain_core.retrievers import BaseRetriever
+
+from internal.core.retrievers.hybrid_retriever import RRF_K, HybridRetriever
+
+
+def build_documents(name: str, segment_ids: list[str]) -> list[LCDocument]:
+    """按传递的片段id顺序构建检索结果, 内容标记来源检索器"""
+    return [
+        LCDocument(page_content=f"{name}:{segment_id}", metadata={"segment_id": segment_id})
+        for segment_id in segment_ids
+    ]
+
+
+class FakeRetriever(BaseRetriever):
+    """等待指定时间后返回固定结果的检索器, 传递异常时抛出该异常"""
+    documents: list[LCDocument]
+    delay: float = 0
+    error: Exception = None
+
+    def _get_relevant_documents(
+            self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[LCDocument]:
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.documents
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+class TestHybridRetriever:
+    """混合检索器的测试类, 校验加权倒数排名融合的顺序以及单个检索器超时或异常时的降级"""
+
+    @pytest.mark.parametrize("weights, expected_segment_ids", [
+        ([0.7, 0.3], ["s1", "s3", "s2", "s4"]),
+        ([0.3, 0.7], ["s3", "s1", "s4", "s2"]),
+    ])
+    def test_reciprocal_rank_fusion(self, weights, expected_segment_ids):
+        """融合得分为各检索器中weight / (RRF_K + 排名)之和, 同一片段保留第一次出现的文档"""
+        results = [build_documents("semantic", ["s1", "s2", "s3"]), build_documents("full_text", ["s3", "s4", "s1"])]
+
+        lc_documents = HybridRetriever._reciprocal_rank_fusion(results, weights)
+
+        # 权重为[0.7, 0.3]时: s1=0.7/61+0.3/63, s3=0.7/63+0.3/61, s2=0.7/62, s4=0.3/62
+        assert [document.metadata["segment_id"] for document in lc_documents] == expected_segment_ids
+        assert {document.metadata["segment_id"]: document.page_content for document in lc_documents} == {
+            "s1": "semantic:s1", "s2": "semantic:s2", "s3": "semantic:s3", "s4": "full_text:s4",
+        }
+        assert RRF_K == 60
+
+    def test_reciprocal_rank_fusion_with_empty_results(self):
+        """其中一个检索器没有结果时按另一个检索器的顺序返回"""
+        lc_documents = HybridRetriever._reciprocal_rank_fusion([[], build_documents("full_text", ["s2", "s1"])], [0.5, 0.5])
+
+        assert [document.metadata["segment_id"] for document in lc_documents] == ["s2", "s1"]
+
+    def test_invoke(self, app):
+        """并发执行所有检索器并返回融合后的前k条文档"""
+        hybrid_retriever = HybridRetriever(
+            flask_app=app,
+            retrievers=[
+                FakeRetriever(documents=build_documents("semantic", ["s1", "s2", "s3"]), delay=0.3),
+                FakeRetriever(documents=build_documents("full_text", ["s3", "s4", "s1"]), delay=0.3),
+            ],
+            weights=[0.7, 0.3],
+            search_kwargs={"k": 3},
+        )
+
+        start = time.monotonic()
+        lc_documents = hybrid_retriever.invoke("query")
+
+        assert [document.metadata["segment_id"] for document in lc_documents] == ["s1", "s3", "s2"]
+        assert time.monotonic() - start < 0.5
+
+    def test_invoke_with_timeout(self, app):
+        """超时的检索器不再等待, 只使用其他检索器的结果"""
+        hybrid_retriever = HybridRetriever(
+            flask_app=app,
+            retrievers=[
+                FakeRetriever(documents=build_documents("semantic", ["s1", "s2"]), delay=2),
+                FakeRetriever(documents=build_documents("full_text", ["s3", "s4"])),
+            ],
+            timeout=0.2,
+        )
+
+        start = time.monotonic()
+        lc_documents = hybrid_retriever.invoke("query")
+
+        assert [document.metadata["segment_id"] for document in lc_documents] == ["s3", "s4"]
+        assert time.monotonic() - start < 1
+
+    def test_invoke_with_timeouts(self, app):
+        """每个检索器使用各自的超时时间, 耗时超过共享超时时间但未超过自身超时时间的检索器结果依然保留"""
+        hybrid_retriever = HybridRetriever(
+            flask_app=app,
+            retrievers=[
+                FakeRetriever(documents=build_documents("semantic", ["s1", "s2"]), delay=0.4),
+                FakeRetriever(documents=build_documents("full_text", ["s3", "s4"]), delay=2),
+            ],
+            weights=[0.7, 0.3],
+            timeout=0.2,
+            timeouts=[1, 0.2],
+        )
+
+        start = time.monotonic()
+        lc_documents = hybrid_retriever.invoke("query")
+
+        assert [document.metadata["segment_id"] for document in lc_documents] == ["s1", "s2"]
+        assert time.monotonic() - start < 1
+
+    def test_invoke_with_error(self, app):
+        """出现异常的检索器被忽略, 只使用其他检索器的结果"""
+        hybrid_retriever = HybridRetriever(
+            flask_app=app,
+            retrievers=[
+                FakeRetriever(documents=[], error=RuntimeError("检索失败")),
+                FakeRetriever(documents=build_documents("full_text", ["s3", "s4"])),
+            ],
+        )
+
+        lc_documents = hybrid_retriever.invoke("query")
+
+        assert [document.metadata["segment_id"] for document in lc_documents] == ["s3", "s4"]
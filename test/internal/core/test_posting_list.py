@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from internal.core.posting_list import PostingList
+
+
+def random_posting_list(rng: np.random.Generator, size: int, max_ordinal: int) -> PostingList:
+    """生成片段序号升序不重复、词频与片段长度随机的倒排列表"""
+    ordinals = np.sort(rng.choice(max_ordinal, size=min(size, max_ordinal), replace=False))
+    return PostingList(
+        ordinals,
+        rng.integers(1, 50, size=len(ordinals)),
+        rng.integers(0, 5000, size=len(ordinals)),
+    )
+
+
+def to_dict(posting_list: PostingList) -> dict[int, tuple[int, int]]:
+    """将倒排列表转换为{片段序号: (词频, 片段长度)}便于与集合运算的期望结果比较"""
+    return {
+        int(ordinal): (int(frequency), int(segment_length))
+        for ordinal, frequency, segment_length in zip(
+            posting_list.ordinals, posting_list.frequencies, posting_list.segment_lengths,
+        )
+    }
+
+
+class TestPostingList:
+    """倒排列表的测试类, 使用固定随机种子生成的序号集合与Python集合运算的结果比较"""
+
+    @pytest.mark.parametrize("seed", range(20))
+    @pytest.mark.parametrize("max_ordinal", [200, 70000, 2 ** 33])
+    def test_bytes_round_trip(self, seed, max_ordinal):
+        """压缩为字节串后还原的倒排列表与原列表一致, 覆盖不同的整数宽度"""
+        rng = np.random.default_rng(seed)
+        posting_list = random_posting_list(rng, int(rng.integers(0, 300)), max_ordinal)
+
+        restored = PostingList.from_bytes(*posting_list.to_bytes())
+
+        assert np.array_equal(restored.ordinals, posting_list.ordinals)
+        assert np.array_equal(restored.frequencies, posting_list.frequencies)
+        assert np.array_equal(restored.segment_lengths, posting_list.segment_lengths)
+
+    def test_empty_round_trip(self):
+        """空倒排列表压缩为空字节串, 还原后依然为空"""
+        assert PostingList().to_bytes() == (b"", b"", b"")
+        assert len(PostingList.from_bytes(b"", b"", b"")) == 0
+        assert len(PostingList.from_bytes(None, None, None)) == 0
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_union(self, seed):
+        """并集包含两个列表的所有序号且保持升序, 重复的序号使用other中的词频与片段长度"""
+        rng = np.random.default_rng(seed)
+        first = random_posting_list(rng, int(rng.integers(0, 200)), 500)
+        second = random_posting_list(rng, int(rng.integers(0, 200)), 500)
+
+        union = first.union(second)
+
+        assert np.all(np.diff(union.ordinals) > 0)
+        assert to_dict(union) == {**to_dict(first), **to_dict(second)}
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_intersection(self, seed):
+        """交集只保留传递的序号命中的记录"""
+        rng = np.random.default_rng(seed)
+        posting_list = random_posting_list(rng, int(rng.integers(0, 200)), 500)
+        ordinals = np.sort(rng.choice(500, size=int(rng.integers(0, 200)), replace=False))
+
+        intersection = posting_list.intersection(ordinals)
+
+        assert to_dict(intersection) == {
+            ordinal: value for ordinal, value in to_dict(posting_list).items() if ordinal in set(ordinals.tolist())
+        }
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_difference(self, seed):
+        """差集移除传递的序号命中的记录, 序号不在列表中时不影响结果"""
+        rng = np.random.default_rng(seed)
+        posting_list = random_posting_list(rng, int(rng.integers(0, 200)), 500)
+        ordinals = np.sort(rng.choice(500, size=int(rng.integers(0, 200)), replace=False))
+
+        difference = posting_list.difference(ordinals)
+
+        assert to_dict(difference) == {
+            ordinal: value for ordinal, value in to_dict(posting_list).items() if ordinal not in set(ordinals.tolist())
+        }
+
+    def test_merge_round_trip(self):
+        """多次合并与移除后压缩还原, 结果与集合运算一致"""
+        rng = np.random.default_rng(0)
+        posting_list, expected = PostingList(), {}
+        for _ in range(50):
+            added = random_posting_list(rng, int(rng.integers(1, 50)), 1000)
+            removed = np.sort(rng.choice(1000, size=int(rng.integers(0, 50)), replace=False))
+            posting_list = PostingList.from_bytes(*posting_list.difference(removed).union(added).to_bytes())
+            expected = {
+                **{ordinal: value for ordinal, value in expected.items() if ordinal not in set(removed.tolist())},
+                **to_dict(added),
+            }
+
+        assert to_dict(posting_list) == expected
@@ -0,0 +1,87 @@
+import random
+import re
+
+import pytest
+
+from internal.core.text_cleaner import TextCleaner
+
+REMOVE_EXTRA_SPACE = {"id": "remove_extra_space", "enabled": True}
+REMOVE_URL_AND_EMAIL = {"id": "remove_url_and_email", "enabled": True}
+
+# 随机文本的组成片段, 覆盖所有规则的边界: 特殊token、连续空白/换行、邮箱、URL以及它们相互重叠的情况
+TOKENS = [
+    "a", "Z", "1", ".", "@", "-", "+", "_", "h", "t", "p", "s", "http", "https", "://", "/", ":",
+    " ", "  ", "\t", "\r", "\u3000", "\u00a0", "\n", "\n\n\n", "<", "|", ">", "<|", "|>", "中",
+    "x@y.com", "https://e.com/a",
+]
+REMOVED_TOKENS = ["\x00", "\x0b", "\x0c", "\x1f", "\x7f", "\uFFFE", "\xef"]
+
+
+def legacy_clean(text: str, pre_process_rules: list[dict]) -> str:
+    """旧的清洗方式: 先清除多余字符, 再按启用的预处理规则逐条re.sub"""
+    text = re.sub(r'<\|', '<', text)
+    text = re.sub(r'\|>', '>', text)
+    text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F\xEF\xBF\xBE]', '', text)
+    text = re.sub('\uFFFE', '', text)
+    for pre_process_rule in pre_process_rules:
+        if pre_process_rule["id"] == "remove_extra_space" and pre_process_rule["enabled"]:
+            text = re.sub(r'\n{3,}', '\n\n', text)
+            text = re.sub(r'[\t\f\r\x20\u00a0\u1680\u180e\u2000-\u200a\u202f\u205f\u3000]{2,}', ' ', text)
+        if pre_process_rule["id"] == "remove_url_and_email" and pre_process_rule["enabled"]:
+            text = re.sub(r'([a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)', '', text)
+            text = re.sub(r'https?://[^\s]+', '', text)
+    return text
+
+
+def random_texts(tokens: list[str], count: int = 20000) -> list[str]:
+    """使用固定种子生成随机文本"""
+    rand = random.Random(0)
+    return ["".join(rand.choices(tokens, k=rand.randint(1, 16))) for _ in range(count)]
+
+
+class TestTextCleaner:
+    """文本清洗器的测试类, 校验单次扫描的清洗结果与旧的逐条re.sub一致"""
+
+    @pytest.mark.parametrize(
+        "pre_process_rules",
+        [[], [REMOVE_EXTRA_SPACE], [REMOVE_URL_AND_EMAIL], [REMOVE_EXTRA_SPACE, REMOVE_URL_AND_EMAIL]],
+    )
+    def test_same_as_legacy(self, pre_process_rules):
+        text_cleaner = TextCleaner(pre_process_rules)
+        for text in random_texts(TOKENS):
+            assert text_cleaner.clean(text) == legacy_clean(text, pre_process_rules), repr(text)
+
+    @pytest.mark.parametrize("pre_process_rules", [[], [REMOVE_EXTRA_SPACE]])
+    def test_same_as_legacy_with_control_characters(self, pre_process_rules):
+        text_cleaner = TextCleaner(pre_process_rules)
+        for text in random_texts(TOKENS + REMOVED_TOKENS):
+            assert text_cleaner.clean(text) == legacy_clean(text, pre_process_rules), repr(text)
+
+    @pytest.mark.parametrize(
+        "text, expected",
+        [
+            ("a\t\x0cb", "a\tb"),
+            ("联系 https://exa\x0bmple.com/a 获取", "联系  获取"),
+            ("https://\x00\uFFFE", "https://"),
+            ("见 https://user@example.com", "见 https://"),
+            ("x@y.comx@y.comhttps://e.com/a", "@y.com"),
+        ],
+    )
+    def test_same_as_legacy_on_overlapping_rules(self, text, expected):
+        pre_process_rules = [REMOVE_EXTRA_SPACE, REMOVE_URL_AND_EMAIL]
+        assert legacy_clean(text, pre_process_rules) == expected
+        assert TextCleaner(pre_process_rules).clean(text) == expected
+
+    @pytest.mark.parametrize(
+        "text, legacy_expected, expected",
+        [
+            ("ab\x00c@example.com", "", "ab"),
+            ("a@exa\x00mple.com", "", "a@example.com"),
+            ("ht\x00tps://example.com", "", "https://example.com"),
+        ],
+    )
+    def test_control_characters_inside_email_or_scheme(self, text, legacy_expected, expected):
+        """已知差异: 邮箱或URL协议头中间夹杂的控制字符会截断匹配, 旧方式会先删除控制字符再匹配"""
+        pre_process_rules = [REMOVE_URL_AND_EMAIL]
+        assert legacy_clean(text, pre_process_rules) == legacy_expected
+        assert TextCleaner(pre_process_rules).clean(text) == expected
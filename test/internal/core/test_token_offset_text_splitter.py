@@ -0,0 +1,83 @@
+import random
+
+import pytest
+import tiktoken
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from internal.core.text_splitter import TokenOffsetTextSplitter
+from internal.entity.dataset_entity import DEFAULT_PROCESS_RULE
+
+# cl100k_base的预分词正则
+CL100K_PATTERN = (
+    r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+)
+
+# 用于构建合并表的常见片段, 以及随机文本的组成片段
+MERGE_WORDS = [
+    "the", " the", "and", " and", "ing", "tion", "he", "th", " t", "er", " a", "123",
+    "中", "国", "中国", "你好", "世界", "\n\n", "  ", "..", "，", "。",
+]
+TEXT_TOKENS = [
+    "the ", "and ", "中国", "你好", "世界", " ", "  ", "\n", "\n\n", "。", "，", ".", ". ",
+    "a", "b", "x", "123", "4", "'s", "!", "! ", "\t", "é", "😀", "ing",
+]
+
+
+@pytest.fixture(scope="module")
+def encoding() -> tiktoken.Encoding:
+    """构建一个使用cl100k预分词规则的小型BPE编码器, 不依赖下载编码文件"""
+    ranks = {bytes([i]): i for i in range(256)}
+    for word in MERGE_WORDS:
+        word_bytes = word.encode("utf-8")
+        for end in range(2, len(word_bytes) + 1):
+            ranks.setdefault(word_bytes[:end], len(ranks))
+    return tiktoken.Encoding(
+        "test",
+        pat_str=CL100K_PATTERN,
+        mergeable_ranks=ranks,
+        special_tokens={"<|endoftext|>": len(ranks)},
+    )
+
+
+def build_splitters(encoding: tiktoken.Encoding, **kwargs) -> tuple[RecursiveCharacterTextSplitter, TokenOffsetTextSplitter]:
+    """构建使用相同编码器计算长度的LangChain分割器与token偏移分割器"""
+    kwargs = {
+        "separators": DEFAULT_PROCESS_RULE["rule"]["segment"]["separators"],
+        "is_separator_regex": True,
+        "length_function": lambda text: len(encoding.encode(text)),
+        **kwargs,
+    }
+    return RecursiveCharacterTextSplitter(**kwargs), TokenOffsetTextSplitter(encoding, **kwargs)
+
+
+class TestTokenOffsetTextSplitter:
+    """token偏移分割器的测试类, 校验分割结果与RecursiveCharacterTextSplitter一致"""
+
+    @pytest.mark.parametrize("chunk_size, chunk_overlap", [(5, 0), (10, 3), (20, 10), (40, 5)])
+    def test_same_as_recursive_character_text_splitter(self, encoding, chunk_size, chunk_overlap):
+        text_splitter, token_offset_text_splitter = build_splitters(
+            encoding, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+        )
+        rand = random.Random(chunk_size)
+        for _ in range(500):
+            text = "".join(rand.choices(TEXT_TOKENS, k=rand.randint(0, 200)))
+            assert token_offset_text_splitter.split_text(text) == text_splitter.split_text(text), repr(text)
+
+    @pytest.mark.parametrize("keep_separator", [False, "end"])
+    def test_same_as_recursive_character_text_splitter_with_keep_separator(self, encoding, keep_separator):
+        text_splitter, token_offset_text_splitter = build_splitters(
+            encoding, chunk_size=10, chunk_overlap=2, keep_separator=keep_separator,
+        )
+        rand = random.Random(0)
+        for _ in range(200):
+            text = "".join(rand.choices(TEXT_TOKENS, k=rand.randint(0, 200)))
+            assert token_offset_text_splitter.split_text(text) == text_splitter.split_text(text), repr(text)
+
+    def test_text_with_special_token(self, encoding):
+        text_splitter, token_offset_text_splitter = build_splitters(encoding, chunk_size=10, chunk_overlap=2)
+        text = "the 中国\n\nand <|endoftext|> 你好。世界 " * 5
+
+        with pytest.raises(ValueError):
+            text_splitter.split_text(text)
+        with pytest.raises(ValueError):
+            token_offset_text_splitter.split_text(text)
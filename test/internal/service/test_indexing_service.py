@@ -0,0 +1,178 @@
+import threading
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from internal.entity.cache_entity import LOCK_DOCUMENT_INDEXING
+from internal.entity.dataset_entity import DocumentEnabledMode, DocumentStatus
+from internal.model import Document
+from internal.service import DisabledDocumentService, IndexService, RetrievalCacheService
+
+
+def build_index_service(db, redis_client) -> IndexService:
+    """构建只依赖数据库、Redis与缓存服务的文档构建服务, 其余依赖在测试中不会被调用"""
+    return IndexService(
+        db=db,
+        file_extractor=None,
+        process_rule_service=None,
+        embedding_service=None,
+        token_count_service=None,
+        jieba_service=None,
+        keyword_table_service=None,
+        vector_database_service=None,
+        retrieval_cache_service=RetrievalCacheService(redis_client=redis_client),
+        disabled_document_service=DisabledDocumentService(db=db, redis_client=redis_client),
+        redis_client=redis_client,
+    )
+
+
+class TestIndexService:
+    """文档构建服务的测试类, 校验流水线在阶段出错时依然能正常结束"""
+
+    @pytest.fixture
+    def index_service(self, app, fake_db, redis_client, monkeypatch):
+        """构建只依赖数据库会话、Redis与缓存服务的文档构建服务, 文档从内存字典中读取"""
+        monkeypatch.setitem(app.config, "INDEXING_QUEUE_SIZE", 1)
+        index_service = build_index_service(fake_db, redis_client)
+        index_service.documents = {}
+        index_service.errors = {}
+        monkeypatch.setattr(index_service, "get", lambda model, id: index_service.documents.get(id))
+
+        def update(document, **kwargs):
+            index_service.errors[document.id] = kwargs["error"]
+
+        monkeypatch.setattr(index_service, "update", update)
+        return index_service
+
+    @staticmethod
+    def run_pipeline(app, index_service: IndexService, document_ids: list, stages: list) -> None:
+        """在独立线程中执行流水线, 超时未结束说明流水线阻塞"""
+        def target():
+            with app.app_context():
+                index_service._run_pipeline(document_ids, stages)
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+        assert not thread.is_alive(), "流水线未能结束"
+
+    @staticmethod
+    def add_documents(index_service: IndexService, count: int) -> list:
+        """向内存字典中添加指定数量的文档, 并返回文档id列表"""
+        document_ids = [uuid4() for _ in range(count)]
+        for document_id in document_ids:
+            index_service.documents[document_id] = SimpleNamespace(id=document_id, dataset_id=uuid4())
+            index_service.redis_client.set(LOCK_DOCUMENT_INDEXING.format(document_id=document_id), 1)
+        return document_ids
+
+    @staticmethod
+    def get_locked_document_ids(index_service: IndexService, document_ids: list) -> list:
+        """获取仍持有构建锁的文档id列表"""
+        return [
+            document_id for document_id in document_ids
+            if index_service.redis_client.get(LOCK_DOCUMENT_INDEXING.format(document_id=document_id)) is not None
+        ]
+
+    def test_pipeline_finishes_when_stage_raises(self, app, index_service):
+        document_ids = self.add_documents(index_service, 10)
+        completed_ids = []
+
+        def parse(document, _):
+            if document.id in document_ids[:5]:
+                raise ValueError("解析失败")
+            return document.id
+
+        stages = [
+            (parse, 1),
+            (lambda document, payload: payload, 1),
+            (lambda document, payload: completed_ids.append(payload), 1),
+        ]
+        self.run_pipeline(app, index_service, document_ids, stages)
+
+        assert completed_ids == document_ids[5:]
+        assert set(index_service.errors) == set(document_ids[:5])
+        assert self.get_locked_document_ids(index_service, document_ids) == []
+
+    def test_pipeline_finishes_when_document_deleted(self, app, index_service):
+        document_ids = self.add_documents(index_service, 4)
+        deleted_id = document_ids[0]
+        del index_service.documents[deleted_id]
+        completed_ids = []
+
+        stages = [(lambda document, _: document.id, 1), (lambda document, payload: completed_ids.append(payload), 1)]
+        self.run_pipeline(app, index_service, document_ids, stages)
+
+        assert completed_ids == document_ids[1:]
+        assert deleted_id not in index_service.errors
+
+    def test_pipeline_finishes_when_error_bookkeeping_fails(self, app, index_service, monkeypatch):
+        document_ids = self.add_documents(index_service, 6)
+        completed_ids = []
+
+        def update(document, **kwargs):
+            raise RuntimeError("数据库会话需要回滚")
+
+        def parse(document, _):
+            if document.id in document_ids[:3]:
+                raise ValueError("解析失败")
+            return document.id
+
+        monkeypatch.setattr(index_service, "update", update)
+        stages = [(parse, 1), (lambda document, payload: completed_ids.append(payload), 1)]
+        self.run_pipeline(app, index_service, document_ids, stages)
+
+        assert completed_ids == document_ids[3:]
+        assert index_service.db.session.rollback_count == 3
+
+    def test_heartbeat_renews_lock_during_long_stage(self, app, index_service, monkeypatch):
+        """单个阶段耗时超过中断超时时间时, 心跳线程持续续期构建锁并刷新文档更新时间, 文档结束后不再续期"""
+        monkeypatch.setitem(app.config, "INDEXING_STALLED_TIMEOUT", 0.3)
+        document_ids = self.add_documents(index_service, 2)
+        renewed_keys = []
+        redis_set = index_service.redis_client.set
+
+        def set(key, value, ex=None, nx=False):
+            renewed_keys.append((key, ex))
+            return redis_set(key, value, ex=ex, nx=nx)
+
+        def parse(document, _):
+            if document.id == document_ids[1]:
+                time.sleep(1)
+            return document.id
+
+        monkeypatch.setattr(index_service.redis_client, "set", set)
+        self.run_pipeline(app, index_service, document_ids, [(parse, 1), (lambda document, payload: payload, 1)])
+
+        # 流水线开始时续期一次, 每个阶段开始时各续期一次, 之后的续期都来自心跳
+        slow_key = LOCK_DOCUMENT_INDEXING.format(document_id=document_ids[1])
+        fast_key = LOCK_DOCUMENT_INDEXING.format(document_id=document_ids[0])
+        assert renewed_keys.count((slow_key, 0.3)) >= 3 + 2
+        assert renewed_keys.count((fast_key, 0.3)) <= 3 + 1
+        assert len(index_service.db.session.statements) >= 2
+        assert self.get_locked_document_ids(index_service, document_ids) == []
+
+    def test_completed_document_leaves_disabled_set(self, app, db, redis_client, monkeypatch):
+        """查询时排除模式下, 构建期间缓存的禁用文档集合在文档完成构建后失效, 文档不再被排除"""
+        monkeypatch.setitem(app.config, "DOCUMENT_ENABLED_MODE", DocumentEnabledMode.EXCLUSION)
+        index_service = build_index_service(db, redis_client)
+        disabled_document_service = index_service.disabled_document_service
+        document = index_service.create(
+            Document,
+            account_id=uuid4(),
+            dataset_id=uuid4(),
+            upload_file_id=uuid4(),
+            process_rule_id=uuid4(),
+            name="test.md",
+            status=DocumentStatus.WAITING,
+            enabled=False,
+        )
+
+        # 构建期间的检索会将等待中的文档写入禁用文档集合缓存
+        assert disabled_document_service.get_disabled_document_ids([document.dataset_id]) == [str(document.id)]
+
+        index_service._completed(document, [])
+
+        assert document.enabled is True
+        assert disabled_document_service.get_disabled_document_ids([document.dataset_id]) == []
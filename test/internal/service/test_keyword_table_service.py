@@ -0,0 +1,39 @@
+from uuid import uuid4
+
+from internal.service import KeywordTableService
+
+
+class TestKeywordTableService:
+    """关键词表服务的测试类, 校验BM25使用的词频与片段长度来自同一次分词"""
+
+    def test_build_keyword_segments(self, app):
+        """关键词只按完整分词计数, 不会命中其他单词中的子串, 片段长度为分词数"""
+        segment_id = uuid4()
+        with app.app_context():
+            keyword_segments = KeywordTableService._build_keyword_segments([
+                (segment_id, ["ai", "said", "ai"], "AI said: ai is said to help again."),
+            ])
+
+        # 分词结果为ai/said/ai/is/said/to/help/again, 标点与空白不计入片段长度
+        assert keyword_segments == [{
+            "segment_id": str(segment_id),
+            "keywords": ["ai", "said"],
+            "frequencies": [2, 2],
+            "segment_length": 8,
+        }]
+
+    def test_build_keyword_segments_without_match(self, app):
+        """没有关键词的片段被忽略, 手动设置且未出现在内容中的关键词词频至少为1"""
+        segment_id = uuid4()
+        with app.app_context():
+            keyword_segments = KeywordTableService._build_keyword_segments([
+                (uuid4(), [], "没有关键词的片段"),
+                (segment_id, ["ai"], "said again"),
+            ])
+
+        assert keyword_segments == [{
+            "segment_id": str(segment_id),
+            "keywords": ["ai"],
+            "frequencies": [1],
+            "segment_length": 2,
+        }]
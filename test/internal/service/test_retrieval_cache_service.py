@@ -0,0 +1,86 @@
+from uuid import uuid4
+
+import pytest
+from langchain_core.documents import Document as LCDocument
+
+from internal.service import RetrievalCacheService
+
+
+class TestRetrievalCacheService:
+    """检索结果缓存服务的测试类, 校验缓存键随知识库版本号变化以及命中统计"""
+
+    @pytest.fixture
+    def retrieval_cache_service(self, app, redis_client, monkeypatch):
+        """构建使用内存Redis的检索结果缓存服务, 并在应用上下文中执行"""
+        monkeypatch.setitem(app.config, "RETRIEVAL_CACHE_EXPIRE", 300)
+        with app.app_context():
+            yield RetrievalCacheService(redis_client=redis_client)
+
+    def test_miss_then_hit(self, retrieval_cache_service):
+        """首次读取未命中, 写入后使用相同参数构建的缓存键命中, 并还原文档内容与元数据"""
+        dataset_ids = [uuid4(), uuid4()]
+        cache_key = retrieval_cache_service.get_cache_key(dataset_ids, "hybrid", 4, 0.5, "什么是 LLM")
+        assert retrieval_cache_service.get_documents(cache_key, dataset_ids) is None
+
+        retrieval_cache_service.set_documents(cache_key, [
+            LCDocument(page_content="LLM是大语言模型", metadata={"segment_id": "1", "score": 0.9}),
+        ])
+        # 知识库顺序与query中的多余空白不影响缓存键
+        same_cache_key = retrieval_cache_service.get_cache_key(
+            list(reversed(dataset_ids)), "hybrid", 4, 0.5, " 什么是  LLM ",
+        )
+        lc_documents = retrieval_cache_service.get_documents(same_cache_key, dataset_ids)
+
+        assert same_cache_key == cache_key
+        assert [(document.page_content, document.metadata) for document in lc_documents] == [
+            ("LLM是大语言模型", {"segment_id": "1", "score": 0.9}),
+        ]
+
+    def test_version_bump_misses(self, retrieval_cache_service):
+        """任意一个知识库的版本号递增后缓存键发生变化, 旧的检索结果不再命中, 其他知识库不受影响"""
+        dataset_ids = [uuid4(), uuid4()]
+        other_dataset_id = uuid4()
+        cache_key = retrieval_cache_service.get_cache_key(dataset_ids, "semantic", 4, 0, "query")
+        other_cache_key = retrieval_cache_service.get_cache_key([other_dataset_id], "semantic", 4, 0, "query")
+        retrieval_cache_service.set_documents(cache_key, [])
+        retrieval_cache_service.set_documents(other_cache_key, [])
+
+        retrieval_cache_service.bump_dataset_versions([dataset_ids[1]])
+        new_cache_key = retrieval_cache_service.get_cache_key(dataset_ids, "semantic", 4, 0, "query")
+
+        assert new_cache_key != cache_key
+        assert retrieval_cache_service.get_documents(new_cache_key, dataset_ids) is None
+        assert retrieval_cache_service.get_cache_key([other_dataset_id], "semantic", 4, 0, "query") == other_cache_key
+        assert retrieval_cache_service.get_documents(other_cache_key, [other_dataset_id]) == []
+
+    def test_cache_key_depends_on_parameters(self, retrieval_cache_service):
+        """检索策略与检索参数不同的请求使用不同的缓存键"""
+        dataset_ids = [uuid4()]
+        cache_keys = {
+            retrieval_cache_service.get_cache_key(dataset_ids, "semantic", 4, 0, "query"),
+            retrieval_cache_service.get_cache_key(dataset_ids, "full_text", 4, 0, "query"),
+            retrieval_cache_service.get_cache_key(dataset_ids, "semantic", 5, 0, "query"),
+            retrieval_cache_service.get_cache_key(dataset_ids, "semantic", 4, 0.5, "query"),
+            retrieval_cache_service.get_cache_key(dataset_ids, "semantic", 4, 0, "other query"),
+        }
+
+        assert len(cache_keys) == 5
+
+    def test_disabled_cache(self, retrieval_cache_service, app, monkeypatch):
+        """缓存过期时间不大于0时不启用缓存"""
+        monkeypatch.setitem(app.config, "RETRIEVAL_CACHE_EXPIRE", 0)
+
+        assert retrieval_cache_service.get_cache_key([uuid4()], "semantic", 4, 0, "query") is None
+
+    def test_cache_stats(self, retrieval_cache_service):
+        """每次读取为涉及的每个知识库累加命中或未命中次数"""
+        dataset_id, other_dataset_id = uuid4(), uuid4()
+        cache_key = retrieval_cache_service.get_cache_key([dataset_id, other_dataset_id], "semantic", 4, 0, "query")
+        retrieval_cache_service.get_documents(cache_key, [dataset_id, other_dataset_id])
+        retrieval_cache_service.set_documents(cache_key, [])
+        retrieval_cache_service.get_documents(cache_key, [dataset_id, other_dataset_id])
+        retrieval_cache_service.get_documents(cache_key, [dataset_id])
+
+        assert retrieval_cache_service.get_cache_stats(dataset_id) == {"hits": 2, "misses": 1, "hit_rate": 2 / 3}
+        assert retrieval_cache_service.get_cache_stats(other_dataset_id) == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+        assert retrieval_cache_service.get_cache_stats(uuid4()) == {"hits": 0, "misses": 0, "hit_rate": 0}
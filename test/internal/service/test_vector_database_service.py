@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from app.http.module import injector
+from internal.core.vector_database import weaviate_vector_database
+from internal.service import IndexService, RetrievalService, SegmentService, VectorDatabaseService
+from internal.service import embeddings_service
+
+
+class TestVectorDatabaseService:
+    """向量数据库服务的测试类, 校验嵌入模型与向量数据库连接在进程内只创建一次"""
+
+    @pytest.fixture
+    def counters(self, app, monkeypatch):
+        """替换嵌入模型与Weaviate连接, 记录模型加载、连接创建与关闭的次数"""
+        counters = {"model": 0, "connection": 0, "close": 0}
+
+        class FakeEmbeddings:
+            def __init__(self, **kwargs):
+                counters["model"] += 1
+
+        class FakeClient:
+            def __init__(self, **kwargs):
+                counters["connection"] += 1
+
+            def close(self):
+                counters["close"] += 1
+
+        monkeypatch.setattr(embeddings_service, "HuggingFaceEmbeddings", FakeEmbeddings)
+        monkeypatch.setattr(embeddings_service, "_embedding_model", None)
+        monkeypatch.setattr(weaviate_vector_database.weaviate, "connect_to_weaviate_cloud", FakeClient)
+        monkeypatch.setitem(app.config, "VECTOR_DATABASE_BACKEND", "weaviate")
+        VectorDatabaseService.close()
+        with app.app_context():
+            yield counters
+        VectorDatabaseService.close()
+
+    def test_one_model_and_connection_serve_many_requests(self, counters):
+        for _ in range(20):
+            index_service = injector.get(IndexService)
+            segment_service = injector.get(SegmentService)
+            retrieval_service = injector.get(RetrievalService)
+            assert index_service.embedding_service.embeddings is not None
+            assert index_service.vector_database_service.vector_database is not None
+            assert segment_service.vector_base_service.vector_database is not None
+            assert retrieval_service.vector_database_service.embeddings_service.embeddings is not None
+
+        assert counters["model"] == 1
+        assert counters["connection"] == 1
+
+    def test_close_releases_connection(self, counters):
+        vector_database_service = injector.get(VectorDatabaseService)
+        vector_database = vector_database_service.vector_database
+
+        VectorDatabaseService.close()
+        assert counters["close"] == 1
+        assert vector_database_service.vector_database is not vector_database
+        assert counters["connection"] == 2
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="当前平台不支持fork")
+    def test_reconnect_after_fork(self, counters):
+        vector_database_service = injector.get(VectorDatabaseService)
+        vector_database = vector_database_service.vector_database
+        embeddings = vector_database_service.embeddings_service.embeddings
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # 子进程需要新建连接, 嵌入模型直接复用父进程已加载的实例
+            result = (
+                vector_database_service.vector_database is not vector_database
+                and vector_database_service.embeddings_service.embeddings is embeddings
+                and counters == {"model": 1, "connection": 2, "close": 0}
+            )
+            os.write(write_fd, b"1" if result else b"0")
+            os._exit(0)
+
+        os.close(write_fd)
+        result = os.read(read_fd, 1)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+
+        assert result == b"1"
+        assert vector_database_service.vector_database is vector_database
+        assert counters == {"model": 1, "connection": 1, "close": 0}